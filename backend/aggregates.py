@@ -0,0 +1,219 @@
+"""SQL-side attendance aggregation shared by the dashboard and reports.
+
+Day-level counts come from the daily_attendance_summary rollup (see rollups.py),
+so a query costs O(days × departments) rather than O(members × days). Per-member
+statistics need the individual marks and are computed in one windowed query.
+
+The helpers take a sync Session; async endpoints call them through
+``AsyncSession.run_sync``.
+"""
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional, Sequence
+from sqlalchemy import String, case, cast, delete, func, insert, or_, select, union_all
+from sqlalchemy.orm import Session
+from archive import ArchivedMark, archived_marks
+from models import Attendance, AttendanceStatus, DailyAttendanceSummary, Department, Student
+
+
+class DayCounts(NamedTuple):
+    day: date
+    present: int
+    absent: int
+
+    @property
+    def total(self) -> int:
+        return self.present + self.absent
+
+
+def daily_counts(
+    db: Session,
+    company_id: int,
+    start: date,
+    end: date,
+    department_id: Optional[int] = None,
+) -> List[DayCounts]:
+    """Present/absent counts for every day in [start, end], zero-filled, in one query."""
+    summary = DailyAttendanceSummary
+    query = db.query(summary.date, func.sum(summary.present), func.sum(summary.absent)).filter(
+        summary.company_id == company_id,
+        summary.date >= start,
+        summary.date <= end,
+    )
+    if department_id is not None:
+        query = query.filter(summary.department_id == department_id)
+    rows = {day: (p or 0, a or 0) for day, p, a in query.group_by(summary.date)}
+
+    result = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        p, a = rows.get(day, (0, 0))
+        result.append(DayCounts(day, p, a))
+    return result
+
+
+def member_count(db: Session, company_id: int, department_id: Optional[int] = None) -> int:
+    query = db.query(func.count(Student.id)).filter(Student.company_id == company_id)
+    if department_id is not None:
+        query = query.filter(Student.department_id == department_id)
+    return query.scalar()
+
+
+class MemberStats(NamedTuple):
+    student_id: int
+    name: str
+    roll_number: str
+    department_id: Optional[int]
+    department_name: Optional[str]
+    present: int
+    absent: int
+    attendance_rate: Optional[float]  # percent of marked days; None when never marked
+    current_absence_streak: int
+    longest_absence_streak: int
+    last_seen: Optional[date]  # last day marked present
+
+
+# Sort keys accepted by member_stats; ties break on student id
+MEMBER_STATS_SORTS = (
+    "attendance_rate", "current_absence_streak", "longest_absence_streak",
+    "last_seen", "name", "roll_number",
+)
+
+
+def member_stats(
+    db: Session,
+    company_id: int,
+    start: date,
+    end: date,
+    department_id: Optional[int] = None,
+    sort: str = "attendance_rate",
+    descending: bool = False,
+    limit: Optional[int] = None,
+    archived: Sequence[ArchivedMark] = (),
+) -> List[MemberStats]:
+    """Attendance rate and absence streaks for every member over [start, end], in one query.
+
+    Streaks count consecutive marks, so unmarked days (weekends, holidays) neither
+    break nor extend them. Members without marks in the range are included with
+    zero counts and a None rate, sorted last.
+
+    ``archived`` holds the range's marks from the archive (see archive.py); they
+    are loaded into a temporary table for the query and counted like hot ones.
+    """
+    if not archived:
+        return _member_stats(db, company_id, start, end, department_id, sort, descending, limit, False)
+    # The temporary table lives as long as the pooled connection; empty it around each use
+    archived_marks.create(db.connection(), checkfirst=True)
+    db.execute(delete(archived_marks))
+    try:
+        db.execute(insert(archived_marks), [
+            {"student_id": m.student_id, "date": m.date, "status": m.status.value} for m in archived
+        ])
+        return _member_stats(db, company_id, start, end, department_id, sort, descending, limit, True)
+    finally:
+        db.execute(delete(archived_marks))
+
+
+def _member_stats(
+    db: Session,
+    company_id: int,
+    start: date,
+    end: date,
+    department_id: Optional[int],
+    sort: str,
+    descending: bool,
+    limit: Optional[int],
+    with_archived: bool,
+) -> List[MemberStats]:
+    present = AttendanceStatus.present
+    hot = (Attendance.company_id == company_id, Attendance.date >= start, Attendance.date <= end)
+    if with_archived:
+        # The enum column is compared as text so both sides of the union share a type
+        a = union_all(
+            select(Attendance.student_id, Attendance.date, cast(Attendance.status, String).label("status")).where(*hot),
+            select(archived_marks.c.student_id, archived_marks.c.date, archived_marks.c.status),
+        ).subquery("a").c
+        where = ()
+    else:
+        a, where = Attendance, hot
+    present_date = case((a.status == present, a.date))
+    marks = select(
+        a.student_id,
+        a.status,
+        # Every absence belongs to the run that follows the latest present mark
+        # before it, so the running max of present dates identifies the run. Both
+        # windows follow the (company_id, student_id, date) index order.
+        func.max(present_date).over(partition_by=a.student_id, order_by=a.date).label("after"),
+        func.max(present_date).over(partition_by=a.student_id).label("last_seen"),
+    ).where(*where)
+    if department_id is not None:
+        marks = marks.join(Student, Student.id == a.student_id).where(Student.department_id == department_id)
+    marks = marks.cte("marks")
+
+    is_absent = marks.c.status == AttendanceStatus.absent
+    runs = (
+        select(
+            marks.c.student_id,
+            func.count(case((is_absent, 1))).label("length"),
+            func.count(case((marks.c.status == present, 1))).label("present"),
+            # NULL-safe "after == last_seen": the run after the last present mark
+            # (or every absence, when never present) is the current streak
+            func.max(case(
+                (or_(marks.c.after == marks.c.last_seen, marks.c.last_seen.is_(None)), 1), else_=0,
+            )).label("is_current"),
+            func.max(marks.c.last_seen).label("last_seen"),
+        )
+        .group_by(marks.c.student_id, marks.c.after)
+        .cte("runs")
+    )
+
+    per_member = (
+        select(
+            runs.c.student_id,
+            func.sum(runs.c.present).label("present"),
+            func.sum(runs.c.length).label("absent"),
+            func.max(runs.c.length).label("longest"),
+            func.max(case((runs.c.is_current == 1, runs.c.length), else_=0)).label("current"),
+            func.max(runs.c.last_seen).label("last_seen"),
+        )
+        .group_by(runs.c.student_id)
+        .subquery()
+    )
+
+    rate = (per_member.c.present * 100.0 / func.nullif(per_member.c.present + per_member.c.absent, 0))
+    columns = {
+        "attendance_rate": rate,
+        "current_absence_streak": func.coalesce(per_member.c.current, 0),
+        "longest_absence_streak": func.coalesce(per_member.c.longest, 0),
+        "last_seen": per_member.c.last_seen,
+        "name": Student.name,
+        "roll_number": Student.roll_number,
+    }
+    key = columns[sort]
+    query = (
+        select(
+            Student.id,
+            Student.name,
+            Student.roll_number,
+            Student.department_id,
+            Department.name,
+            func.coalesce(per_member.c.present, 0),
+            func.coalesce(per_member.c.absent, 0),
+            rate,
+            columns["current_absence_streak"],
+            columns["longest_absence_streak"],
+            per_member.c.last_seen,
+        )
+        .outerjoin(per_member, per_member.c.student_id == Student.id)
+        .outerjoin(Department, Department.id == Student.department_id)
+        .where(Student.company_id == company_id)
+        .order_by((key.desc() if descending else key.asc()).nulls_last(), Student.id)
+    )
+    if department_id is not None:
+        query = query.where(Student.department_id == department_id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [
+        MemberStats(*row[:7], None if row[7] is None else round(row[7], 1), *row[8:])
+        for row in db.execute(query)
+    ]
@@ -0,0 +1,372 @@
+"""Cold storage for old attendance: per-company, per-year archive files.
+
+Marks older than ARCHIVE_AFTER_DAYS (rounded down to the first of a month) are
+moved out of the attendance table into ``<ARCHIVE_DIR>/<company_id>/<year>.sqlite``,
+one compact file per company and year: integer-encoded marks, indexed for the
+history, export and analytics reads, vacuumed after every append. The hot table
+keeps only recent marks, so its indexes stay small.
+
+attendance_archives records, per company, the dates below which marks live in
+the archive (``archived_before``, used by readers) and below which the sheet is
+read-only (``frozen_before``, checked by writers). Archiving runs in three steps
+so readers never see a mark twice or not at all:
+
+1. freeze: writes to dates before the new cutoff are refused from now on;
+2. copy: hot marks before the cutoff are appended to the year files;
+3. swap: in one transaction the copied marks leave the hot table and
+   ``archived_before`` moves up to the cutoff.
+
+Writers hold a shared lock on their company's row from check_writable to
+commit, and the freeze takes it exclusively, so a write that passed the check
+has committed before the copy starts. Nothing before the cutoff changes after
+the copy, and the swap leaves no hot marks behind it.
+
+Rollups (daily_attendance_summary, attendance_months) are kept for archived
+dates, so dashboards and heatmaps are unaffected.
+
+    python archive.py [--company-id ID] [--before YYYY-MM-DD] [--dry-run]
+
+Run it from cron (daily is plenty); ARCHIVE_DIR must be on persistent storage.
+It defaults to ``archive/`` beside the SQLite database file (for PostgreSQL, in
+the working directory), so a volume that keeps the database keeps the archive.
+"""
+import argparse
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from contextlib import closing
+from datetime import date, timedelta
+from typing import Collection, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import Column, Date, Integer, MetaData, String, Table, make_url, select
+from sqlalchemy.orm import Session
+from models import Attendance, AttendanceArchive, AttendanceSheet, AttendanceStatus, Company
+
+load_dotenv()
+
+
+def _default_dir() -> str:
+    """``archive`` beside the SQLite database file, which is on persistent storage by necessity."""
+    url = make_url(os.getenv("DATABASE_URL") or "sqlite:///./attendance.db")
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.join(os.path.dirname(url.database), "archive")
+    return "archive"
+
+
+# --- Config ---
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or _default_dir()
+# Marks older than this many days are archived (by archive.py, not by the API)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+# Marks copied or deleted per statement
+ARCHIVE_BATCH_SIZE = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS marks (
+    id INTEGER PRIMARY KEY,          -- the attendance row's id
+    student_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,            -- date.toordinal()
+    present INTEGER NOT NULL         -- 1 present, 0 absent
+);
+CREATE INDEX IF NOT EXISTS ix_marks_day ON marks (day, id);
+CREATE INDEX IF NOT EXISTS ix_marks_student_day ON marks (student_id, day);
+"""
+
+
+class ArchivedMark(NamedTuple):
+    id: int
+    student_id: int
+    date: date
+    status: AttendanceStatus
+
+
+# Archived marks for member_stats, loaded into a temporary table for one query
+archived_marks = Table(
+    "archived_marks", MetaData(),
+    Column("student_id", Integer, nullable=False),
+    Column("date", Date, nullable=False),
+    Column("status", String(8), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+def horizon(today: Optional[date] = None) -> date:
+    """The default cutoff: ARCHIVE_AFTER_DAYS ago, rounded down to the first of the month."""
+    return ((today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)).replace(day=1)
+
+
+# --- State ---
+def archived_before(db: Session, company_id: int) -> Optional[date]:
+    """Marks before this date are read from the archive; None when nothing is archived."""
+    return db.query(AttendanceArchive.archived_before).filter(
+        AttendanceArchive.company_id == company_id
+    ).scalar()
+
+
+def _lock_company(db: Session, company_id: int, shared: bool):
+    """Row lock on the company until commit (a no-op on SQLite, whose writers are already serial)."""
+    db.query(Company.id).filter(Company.id == company_id).with_for_update(read=shared).scalar()
+
+
+def check_writable(db: Session, company_id: int, day: date):
+    """Refuse writes to frozen dates; the caller's transaction then holds off a freeze until it commits."""
+    _lock_company(db, company_id, shared=True)
+    frozen = db.query(AttendanceArchive.frozen_before).filter(
+        AttendanceArchive.company_id == company_id
+    ).scalar()
+    if frozen is not None and day < frozen:
+        raise HTTPException(
+            status_code=409, detail=f"Attendance before {frozen} is archived and read-only"
+        )
+
+
+# --- Files ---
+def _path(company_id: int, year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, str(company_id), f"{year}.sqlite")
+
+
+def _years(company_id: int) -> List[int]:
+    try:
+        names = os.listdir(os.path.join(ARCHIVE_DIR, str(company_id)))
+    except FileNotFoundError:
+        return []
+    return sorted(int(n[:-7]) for n in names if n.endswith(".sqlite") and n[:-7].isdigit())
+
+
+def _open(path: str) -> sqlite3.Connection:
+    """Read-only connection; the files are only written by the archiver and member deletes."""
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+
+
+def _open_for_write(company_id: int, year: int) -> sqlite3.Connection:
+    path = _path(company_id, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _mark(row) -> ArchivedMark:
+    mark_id, student_id, day, present = row
+    status = AttendanceStatus.present if present else AttendanceStatus.absent
+    return ArchivedMark(mark_id, student_id, date.fromordinal(day), status)
+
+
+def _filters(
+    before: date,
+    start: Optional[date],
+    end: Optional[date],
+    student_ids: Optional[Collection[int]],
+    status: Optional[AttendanceStatus],
+) -> Tuple[List[str], list]:
+    where, params = ["day < ?"], [before.toordinal()]
+    if start:
+        where.append("day >= ?")
+        params.append(start.toordinal())
+    if end:
+        where.append("day <= ?")
+        params.append(end.toordinal())
+    if student_ids is not None:
+        # One bound JSON array instead of a variable per id
+        where.append("student_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(student_ids)))
+    if status is not None:
+        where.append("present = ?")
+        params.append(int(status == AttendanceStatus.present))
+    return where, params
+
+
+def _years_between(company_id: int, before: date, start: Optional[date], end: Optional[date]) -> List[int]:
+    last = min(before - timedelta(days=1), end) if end else before - timedelta(days=1)
+    return [y for y in _years(company_id) if (not start or y >= start.year) and y <= last.year]
+
+
+# --- Reads (blocking file I/O: async endpoints call these through anyio.to_thread) ---
+def page(
+    company_id: int,
+    before: date,
+    limit: int,
+    after: Optional[Tuple[date, int]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    student_ids: Optional[Collection[int]] = None,
+    status: Optional[AttendanceStatus] = None,
+) -> List[ArchivedMark]:
+    """Archived marks before ``before``, newest first on (date, id), after the keyset ``after``."""
+    where, params = _filters(before, start, end, student_ids, status)
+    # A cursor from the hot table (on or after ``before``) starts at the newest archived mark
+    if after is not None and after[0] >= before:
+        after = None
+    if after is not None:
+        where.append("(day, id) < (?, ?)")
+        params += [after[0].toordinal(), after[1]]
+    sql = f"SELECT id, student_id, day, present FROM marks WHERE {' AND '.join(where)} ORDER BY day DESC, id DESC LIMIT ?"
+    found: List[ArchivedMark] = []
+    for year in reversed(_years_between(company_id, before, start, end)):
+        if after is not None and year > after[0].year:
+            continue
+        with closing(_open(_path(company_id, year))) as conn:
+            found.extend(_mark(r) for r in conn.execute(sql, params + [limit - len(found)]))
+        if len(found) >= limit:
+            break
+    return found
+
+
+def marks_on(company_id: int, day: date) -> List[ArchivedMark]:
+    """Every archived mark of one date, newest id first."""
+    if not os.path.exists(_path(company_id, day.year)):
+        return []
+    with closing(_open(_path(company_id, day.year))) as conn:
+        rows = conn.execute(
+            "SELECT id, student_id, day, present FROM marks WHERE day = ? ORDER BY id DESC", (day.toordinal(),)
+        )
+        return [_mark(r) for r in rows]
+
+
+def batches(
+    company_id: int,
+    before: date,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    student_ids: Optional[Collection[int]] = None,
+    status: Optional[AttendanceStatus] = None,
+    size: int = ARCHIVE_BATCH_SIZE,
+) -> Iterator[List[ArchivedMark]]:
+    """Archived marks before ``before``, oldest first on (date, id), ``size`` at a time."""
+    where, params = _filters(before, start, end, student_ids, status)
+    sql = f"SELECT id, student_id, day, present FROM marks WHERE {' AND '.join(where)} ORDER BY day, id"
+    for year in _years_between(company_id, before, start, end):
+        with closing(_open(_path(company_id, year))) as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield [_mark(r) for r in rows]
+
+
+def read_all(company_id: int, before: date, start: date, end: date) -> List[ArchivedMark]:
+    return [m for batch in batches(company_id, before, start, end) for m in batch]
+
+
+def student_history(company_id: int, student_id: int, before: date) -> Dict[Tuple[date, AttendanceStatus], int]:
+    """A member's archived marks counted per (date, status)."""
+    counts: Dict[Tuple[date, AttendanceStatus], int] = defaultdict(int)
+    for batch in batches(company_id, before, student_ids=[student_id]):
+        for m in batch:
+            counts[(m.date, m.status)] += 1
+    return counts
+
+
+# --- Writes ---
+def delete_students(company_id: int, student_ids: Collection[int]):
+    """Purge deleted members' archived marks (their hot marks cascade in the database)."""
+    if not student_ids:
+        return
+    ids = json.dumps(list(student_ids))
+    for year in _years(company_id):
+        with closing(_open_for_write(company_id, year)) as conn, conn:
+            conn.execute("DELETE FROM marks WHERE student_id IN (SELECT value FROM json_each(?))", (ids,))
+
+
+def _append(company_id: int, rows: List[tuple]) -> set:
+    """Append (id, student_id, date, status) rows to their year files; returns the years touched."""
+    by_year: Dict[int, List[tuple]] = defaultdict(list)
+    for mark_id, student_id, day, status in rows:
+        by_year[day.year].append((mark_id, student_id, day.toordinal(), int(status == AttendanceStatus.present)))
+    for year, values in by_year.items():
+        with closing(_open_for_write(company_id, year)) as conn, conn:
+            # A rerun after an interrupted archive copies the same ids again
+            conn.executemany("INSERT OR REPLACE INTO marks VALUES (?, ?, ?, ?)", values)
+    return set(by_year)
+
+
+def archive_company(company_id: int, cutoff: date) -> int:
+    """Move the company's marks before ``cutoff`` into the archive; returns the number moved."""
+    from database import SessionLocal, write_session
+
+    # 1. Freeze: no new marks before the cutoff from here on. The exclusive lock
+    # waits for writes that already passed check_writable to commit
+    with write_session() as db:
+        _lock_company(db, company_id, shared=False)
+        state = db.query(AttendanceArchive).filter(AttendanceArchive.company_id == company_id).first()
+        if state is None:
+            state = AttendanceArchive(company_id=company_id, frozen_before=cutoff, rows=0)
+            db.add(state)
+        elif state.archived_before is not None and state.archived_before >= cutoff:
+            return 0
+        else:
+            state.frozen_before = max(state.frozen_before, cutoff)
+        db.commit()
+
+    # 2. Copy, oldest first
+    copied: List[int] = []
+    years = set()
+    with closing(SessionLocal()) as db:
+        stmt = (
+            select(Attendance.id, Attendance.student_id, Attendance.date, Attendance.status)
+            .where(Attendance.company_id == company_id, Attendance.date < cutoff)
+            .order_by(Attendance.date, Attendance.id)
+            .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+        )
+        for rows in db.execute(stmt).partitions():
+            years |= _append(company_id, [tuple(r) for r in rows])
+            copied.extend(r[0] for r in rows)
+
+    # 3. Swap. Readers take every mark before archived_before from the archive, so
+    # none may stay hot; the freeze makes that so, and a leftover aborts the swap
+    with write_session() as db:
+        for i in range(0, len(copied), ARCHIVE_BATCH_SIZE):
+            db.query(Attendance).filter(
+                Attendance.id.in_(copied[i:i + ARCHIVE_BATCH_SIZE])
+            ).delete(synchronize_session=False)
+        left = db.query(Attendance.id).filter(
+            Attendance.company_id == company_id, Attendance.date < cutoff
+        ).limit(1).scalar()
+        if left is not None:
+            db.rollback()
+            raise RuntimeError(f"company {company_id}: marks before {cutoff} changed while archiving; rerun")
+        db.query(AttendanceSheet).filter(
+            AttendanceSheet.company_id == company_id, AttendanceSheet.date < cutoff
+        ).delete(synchronize_session=False)
+        state = db.query(AttendanceArchive).filter(AttendanceArchive.company_id == company_id).one()
+        state.archived_before = cutoff
+        state.rows += len(copied)
+        db.commit()
+
+    for year in years:
+        with closing(_open_for_write(company_id, year)) as conn:
+            conn.execute("VACUUM")
+    return len(copied)
+
+
+def main():
+    from database import SessionLocal, company_scope, engine
+    from migrations import upgrade_primary
+    import tenants
+
+    parser = argparse.ArgumentParser(description="Move old attendance into the per-company archive")
+    parser.add_argument("--company-id", type=int, default=None, help="only archive this company")
+    parser.add_argument("--before", type=date.fromisoformat, default=None,
+                        help=f"archive marks before this date (default: {ARCHIVE_AFTER_DAYS} days ago, "
+                             "rounded down to the first of the month)")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would move")
+    args = parser.parse_args()
+    cutoff = args.before.replace(day=1) if args.before else horizon()
+
+    upgrade_primary(engine)
+    company_ids = [args.company_id] if args.company_id is not None else tenants.company_ids()
+    for cid in company_ids:
+        # Selects the company's database when each company has its own
+        with company_scope(cid):
+            if args.dry_run:
+                with closing(SessionLocal()) as db:
+                    n = db.query(Attendance).filter(Attendance.company_id == cid, Attendance.date < cutoff).count()
+                print(f"company {cid}: {n} marks before {cutoff}")
+            else:
+                print(f"company {cid}: archived {archive_company(cid, cutoff)} marks before {cutoff}")
+
+
+if __name__ == "__main__":
+    main()
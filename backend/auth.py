@@ -1,13 +1,16 @@
 import os
 from datetime import datetime, timedelta
-from typing import Optional
-from fastapi import Depends, HTTPException, status
+from typing import NamedTuple, Optional
+from fastapi import Depends, HTTPException, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-import bcrypt
-from sqlalchemy.orm import Session
-from database import get_db
-from models import User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+import metrics
+from database import SHARDED, AsyncSessionLocal, get_async_db, open_company
+from models import User, UserRole
+from passwords import hash_password, hash_passwords, verify_password, verify_and_update  # noqa: F401 (re-exported)
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,44 +19,128 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "attendtrack-dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
-
-# --- Password hashing (direct bcrypt — avoids passlib version conflicts) ---
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+# Stream tokens travel in URLs (and so into access logs): they only open an
+# event stream, and only for this long after they are issued
+STREAM_TOKEN_EXPIRE_SECONDS = 60
+STREAM_SCOPE = "stream"
+# Authenticated principals are cached per process; other workers see a
+# deleted user or changed role at most this many seconds late
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
 
 # --- JWT ---
+def token_claims(user: User) -> dict:
+    """Subject plus company: the company picks the user's database when sharded."""
+    return {"sub": str(user.id), "cid": user.company_id}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def create_stream_token(principal: "Principal") -> str:
+    """A short-lived token accepted only by get_stream_user's query parameter."""
+    return create_access_token(
+        {"sub": str(principal.id), "cid": principal.company_id, "scope": STREAM_SCOPE},
+        timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS),
+    )
+
+# --- Principal cache ---
+class Principal(NamedTuple):
+    """The slice of a User that authorization and tenant scoping need."""
+    id: int
+    company_id: int
+    role: UserRole
+    department_id: Optional[int]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.company_id, user.role, user.department_id)
+
+
+_principals = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+def _cache_key(company_id: Optional[int], user_id: int):
+    # User ids are per database, so only unique within a company when sharded
+    return (company_id, user_id) if SHARDED else user_id
+
+def remember_user(user: User) -> Principal:
+    principal = Principal.from_user(user)
+    _principals.set(_cache_key(user.company_id, user.id), principal)
+    return principal
+
+def forget_user(company_id: int, user_id: int):
+    """Call after deleting a user or changing their role or department."""
+    _principals.pop(_cache_key(company_id, user_id))
+
+def forget_company_users(company_id: int):
+    """Call after a change that touches many users of a company (e.g. a department delete)."""
+    _principals.discard_where(lambda _, p: p.company_id == company_id)
+
 # --- Dependencies ---
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
-    token = credentials.credentials
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    """Resolve the bearer token to a Principal; the database is only read on a cache miss.
+
+    Async so that a cache hit costs no threadpool hop, for sync and async endpoints alike.
+    """
+    return await _principal_for_token(credentials.credentials, db)
+
+async def get_stream_user(
+    token: Optional[str] = Query(
+        default=None, description="Stream token from POST /api/events/token, for clients like EventSource that cannot send headers",
+    ),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+) -> Principal:
+    """get_current_user for long-lived streams: a bearer header, or a stream token in the query string.
+
+    Login tokens are refused in the query string, where proxies and access logs record them.
+    """
+    if token:
+        scope = STREAM_SCOPE
+    elif credentials:
+        token, scope = credentials.credentials, None
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # A request-scoped session would stay open for the life of the stream
+    async with AsyncSessionLocal() as db:
+        return await _principal_for_token(token, db, scope)
+
+async def _principal_for_token(token: str, db: AsyncSession, scope: Optional[str] = None) -> Principal:
+    """Resolve a token; ``scope`` must match its scope claim (None for login tokens)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         sub = payload.get("sub")
-        if sub is None:
+        if sub is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Invalid token")
         user_id = int(sub)
-    except (JWTError, ValueError):
+        company_id = payload.get("cid")
+        company_id = None if company_id is None else int(company_id)
+    except (JWTError, ValueError, TypeError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if company_id is not None:
+        await open_company(company_id)
+    elif SHARDED:
+        # Issued before sharding was turned on; the user has to log in again
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    principal = _principals.get(_cache_key(company_id, user_id))
+    if principal is None:
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = remember_user(user)
+    await open_company(principal.company_id)
+    metrics.set_principal(principal.company_id, principal.role == UserRole.admin)
+    return principal
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
+async def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
@@ -0,0 +1,10 @@
+"""Load tests and benchmarks: a synthetic data generator and scripted scenarios.
+
+    python -m benchmarks --json before.json
+    (change something)
+    python -m benchmarks --json after.json --compare before.json
+
+Scenarios (scenarios.py) run against the FastAPI app in-process through
+httpx, so results measure the app and the database, not a network. Compare
+runs made with the same shape, on the same machine.
+"""
@@ -0,0 +1,148 @@
+"""Run the benchmark scenarios in-process and report latency, throughput and query counts.
+
+    python -m benchmarks                              # all scenarios, default shape
+    python -m benchmarks --students 1000 --days 180 --only roll_call dashboard_polling
+    python -m benchmarks --json after.json --compare before.json --fail-over 20
+
+The data lives in a scratch SQLite file unless --database-url names another
+database, where the generated companies are added under a unique prefix.
+DATABASE_URL and .env are ignored, so a real database is never written by
+accident. With --tenant-database-url each company gets a database of its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import perf_counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_scenario(app, scenario, ctx, rounds: int, concurrency: int) -> tuple:
+    """Run every round's jobs with at most `concurrency` in flight; returns (recorder, seconds)."""
+    import httpx
+    from benchmarks.scenarios import Recorder
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        recorder = Recorder(client)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def run(job):
+            async with limit:
+                await job(recorder)
+
+        seconds = 0.0
+        for round_no in range(rounds):
+            jobs = scenario(ctx, round_no)
+            start = perf_counter()
+            await asyncio.gather(*(run(job) for job in jobs))
+            seconds += perf_counter() - start
+    return recorder, seconds
+
+
+def main() -> int:
+    # The app opens ./attendance.db on import, so work inside a scratch directory
+    invoked_from = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="benchmarks-"))
+    sys.path.insert(0, BACKEND_DIR)
+
+    from benchmarks.datagen import add_database_arguments, add_shape_arguments, use_databases
+    from benchmarks.report import format_report, load, regressions, summarize
+
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process")
+    add_database_arguments(parser, required=False)
+    add_shape_arguments(parser)
+    parser.add_argument("--rounds", type=int, default=3, help="times each scenario runs")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO", help="run only these scenarios")
+    parser.add_argument("--json", metavar="PATH", help="write the results here")
+    parser.add_argument("--compare", metavar="PATH", help="results of an earlier run to compare against")
+    parser.add_argument("--fail-over", type=float, metavar="PERCENT",
+                        help="with --compare: exit 1 if a metric is this much worse")
+    args = parser.parse_args()
+    baseline = load(os.path.join(invoked_from, args.compare)) if args.compare else None
+    output = os.path.join(invoked_from, args.json) if args.json else None
+    use_databases(args.database_url or "sqlite:///./attendance.db", args.tenant_database_url)
+
+    from database import SQLALCHEMY_DATABASE_URL, TENANT_DATABASE_URL, SessionLocal
+    from querycount import QueryCounter
+    from benchmarks.datagen import generate, shape_from_args
+    from benchmarks.scenarios import SCENARIOS, make_context
+    from sqlalchemy.engine import Engine, make_url
+    import main as app_main
+
+    names = args.only or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {sorted(unknown)}; choose from {list(SCENARIOS)}")
+
+    shape = shape_from_args(args)
+    password = "benchmark"
+    database = make_url(TENANT_DATABASE_URL.format(company_id="N") or SQLALCHEMY_DATABASE_URL)
+    database = database.render_as_string(hide_password=True)
+    print(f"generating {shape.companies} companies in {database} ...", file=sys.stderr)
+    db = SessionLocal()
+    try:
+        tenants = generate(db, shape, password, prefix=f"Bench {secrets.token_hex(3)}")
+    finally:
+        db.close()
+    ctx = make_context(tenants, password)
+
+    results = {
+        "meta": {
+            "commit": _commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": make_url(TENANT_DATABASE_URL or SQLALCHEMY_DATABASE_URL).get_backend_name()
+            + (" per company" if TENANT_DATABASE_URL else ""),
+            "python": platform.python_version(),
+            "shape": shape._asdict(),
+            "rounds": args.rounds,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": {},
+    }
+
+    # One event loop for every scenario: the async engine's pooled connections belong to it
+    async def run_all():
+        for name in names:
+            print(f"running {name} ...", file=sys.stderr)
+            # The Engine class: every engine, company databases opened mid-run included
+            with QueryCounter(Engine) as counter:
+                recorder, seconds = await run_scenario(
+                    app_main.app, SCENARIOS[name], ctx, args.rounds, args.concurrency
+                )
+            results["scenarios"][name] = summarize(recorder.latencies, recorder.errors, seconds, counter.count)
+
+    asyncio.run(run_all())
+
+    print(format_report(results, baseline))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    if baseline and args.fail_over is not None:
+        worse = regressions(results, baseline, args.fail_over)
+        for line in worse:
+            print(f"REGRESSION {line}")
+        return 1 if worse else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
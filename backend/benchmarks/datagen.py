@@ -0,0 +1,178 @@
+"""Synthetic multi-tenant data for benchmarks and manual load tests.
+
+    python -m benchmarks.datagen --database-url sqlite:///./load-test.db --companies 5 --students 500 --days 90
+
+fills the database named by --database-url; DATABASE_URL and .env are ignored,
+so a real database is never written by accident. Runs are reproducible: the
+same arguments and --seed give the same rows. Every user's password is
+--password; rollups are rebuilt at the end, as after a restore.
+
+The app's modules read their configuration on import, so they are imported
+only after use_databases().
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+from typing import List, NamedTuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+# Rows per INSERT
+CHUNK_SIZE = 5000
+
+
+class Shape(NamedTuple):
+    companies: int = 3
+    departments: int = 5      # per company
+    students: int = 200       # per company, spread over the departments
+    employees: int = 10       # per company, besides the admin
+    days: int = 60            # of history, ending yesterday
+    density: float = 0.95     # share of (member, day) pairs with a mark
+    present_rate: float = 0.9  # share of marks that are "present"
+    seed: int = 1
+
+
+class Tenant(NamedTuple):
+    company_id: int
+    name: str
+    admin_id: int
+    admin_email: str
+    employee_emails: List[str]
+    department_ids: List[int]
+    student_ids: List[int]
+    student_departments: List[int]  # department of each of student_ids
+
+
+def _insert(db: Session, model, rows: list) -> list:
+    """Insert rows in chunks and return their ids, in order."""
+    ids = []
+    for i in range(0, len(rows), CHUNK_SIZE):
+        ids.extend(db.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows[i:i + CHUNK_SIZE]
+        ).scalars())
+    return ids
+
+
+def generate(db: Session, shape: Shape = Shape(), password: str = "benchmark", prefix: str = "Bench") -> List[Tenant]:
+    """Create shape.companies tenants with history and commit them.
+
+    With one database per company, each company goes into its own; ``db`` follows.
+    """
+    from models import Attendance, AttendanceStatus, Department, Student, User, UserRole
+    from passwords import hash_password
+    from rollups import rebuild_month_bits, rebuild_summary
+    from tenants import create_company
+
+    rng = random.Random(shape.seed)
+    hashed = hash_password(password)  # one bcrypt for every user
+    first_day = date.today() - timedelta(days=shape.days)
+    days = [first_day + timedelta(days=n) for n in range(shape.days)]
+
+    tenants = []
+    for c in range(shape.companies):
+        name = f"{prefix} {c + 1}"
+        # Signup emails are unique across companies, so the domain carries the prefix
+        domain = f"company{c + 1}.{prefix.lower().replace(' ', '-')}.bench"
+        admin_email = f"admin@{domain}"
+        company_id = create_company(db, name, admin_email).id
+        department_ids = _insert(db, Department, [
+            {"name": f"Department {d + 1}", "company_id": company_id} for d in range(shape.departments)
+        ])
+        student_departments = [department_ids[s % len(department_ids)] for s in range(shape.students)]
+        student_ids = _insert(db, Student, [
+            {"name": f"Member {s + 1}", "roll_number": f"R{s + 1:05d}", "company_id": company_id, "department_id": dept}
+            for s, dept in enumerate(student_departments)
+        ])
+        employee_emails = [f"employee{e + 1}@{domain}" for e in range(shape.employees)]
+        admin_id = _insert(db, User, [{
+            "name": "Admin", "email": admin_email, "hashed_password": hashed,
+            "role": UserRole.admin, "company_id": company_id,
+        }])[0]
+        _insert(db, User, [
+            {
+                "name": f"Employee {e + 1}", "email": email, "hashed_password": hashed,
+                "role": UserRole.employee, "company_id": company_id,
+                "department_id": department_ids[e % len(department_ids)],
+            }
+            for e, email in enumerate(employee_emails)
+        ])
+
+        marks = []
+        for day in days:
+            for sid in student_ids:
+                if rng.random() < shape.density:
+                    status = AttendanceStatus.present if rng.random() < shape.present_rate else AttendanceStatus.absent
+                    marks.append({"company_id": company_id, "student_id": sid, "date": day, "status": status})
+                if len(marks) >= CHUNK_SIZE:
+                    db.execute(insert(Attendance), marks)
+                    marks = []
+        if marks:
+            db.execute(insert(Attendance), marks)
+
+        rebuild_summary(db, company_id)
+        rebuild_month_bits(db, company_id)
+        db.commit()
+        tenants.append(Tenant(
+            company_id, name, admin_id, admin_email, employee_emails,
+            department_ids, student_ids, student_departments,
+        ))
+    return tenants
+
+
+def add_database_arguments(parser: argparse.ArgumentParser, required: bool):
+    parser.add_argument("--database-url", required=required, help="database to fill (DATABASE_URL is ignored)")
+    parser.add_argument("--tenant-database-url", default="",
+                        help="one database per company: a URL with a {company_id} placeholder")
+
+
+def use_databases(database_url: str, tenant_database_url: str = ""):
+    """Point the app at these databases, whatever the environment and .env say.
+
+    Call before anything imports database.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["ASYNC_DATABASE_URL"] = ""  # derived from DATABASE_URL
+    os.environ["TENANT_DATABASE_URL"] = tenant_database_url
+
+
+def add_shape_arguments(parser: argparse.ArgumentParser):
+    defaults = Shape()
+    parser.add_argument("--companies", type=int, default=defaults.companies)
+    parser.add_argument("--departments", type=int, default=defaults.departments, help="per company")
+    parser.add_argument("--students", type=int, default=defaults.students, help="per company")
+    parser.add_argument("--employees", type=int, default=defaults.employees, help="per company")
+    parser.add_argument("--days", type=int, default=defaults.days, help="days of history")
+    parser.add_argument("--density", type=float, default=defaults.density, help="share of member-days marked")
+    parser.add_argument("--present-rate", type=float, default=defaults.present_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def shape_from_args(args: argparse.Namespace) -> Shape:
+    return Shape(**{field: getattr(args, field) for field in Shape._fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic tenants")
+    add_database_arguments(parser, required=True)
+    add_shape_arguments(parser)
+    parser.add_argument("--password", default="benchmark", help="password of every generated user")
+    parser.add_argument("--prefix", default="Bench", help="company names are '<prefix> <n>'")
+    args = parser.parse_args()
+
+    use_databases(args.database_url, args.tenant_database_url)
+    from database import SessionLocal, engine
+    from migrations import upgrade_primary
+
+    upgrade_primary(engine)
+    db = SessionLocal()
+    try:
+        tenants = generate(db, shape_from_args(args), args.password, args.prefix)
+    finally:
+        db.close()
+    for t in tenants:
+        print(f"{t.name}: {len(t.student_ids)} members, admin {t.admin_email} / {args.password}")
+
+
+if __name__ == "__main__":
+    main()
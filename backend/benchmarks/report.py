@@ -0,0 +1,93 @@
+"""Benchmark results: per-scenario summaries, the text report and baseline comparison."""
+import json
+import statistics
+from typing import Dict, List, Optional
+
+# Reported per scenario; "lower" metrics are better when they go down
+METRICS = [
+    ("p50_ms", "p50 ms", "lower"),
+    ("p95_ms", "p95 ms", "lower"),
+    ("p99_ms", "p99 ms", "lower"),
+    ("throughput", "req/s", "higher"),
+    ("queries_per_request", "queries/req", "lower"),
+]
+# Changes smaller than this are reported as noise
+NOISE_PERCENT = 5.0
+
+
+def _percentile(sorted_values: List[float], q: int) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[q - 1]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float, queries: int) -> dict:
+    values = sorted(latencies)
+    n = len(values)
+    return {
+        "requests": n,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput": round(n / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(_percentile(values, 50) * 1000, 2) if n else None,
+        "p95_ms": round(_percentile(values, 95) * 1000, 2) if n else None,
+        "p99_ms": round(_percentile(values, 99) * 1000, 2) if n else None,
+        "queries_per_request": round(queries / n, 2) if n else None,
+    }
+
+
+def format_report(results: dict, baseline: Optional[dict] = None) -> str:
+    meta = results["meta"]
+    lines = [f"commit {meta['commit']}  database {meta['database']}  shape {json.dumps(meta['shape'])}"]
+    if baseline:
+        lines.append(f"baseline commit {baseline['meta']['commit']}  shape {json.dumps(baseline['meta']['shape'])}")
+    header = f"{'scenario':<20} {'requests':>8} {'errors':>6}" + "".join(f" {label:>12}" for _, label, _ in METRICS)
+    lines += ["", header, "-" * len(header)]
+    for name, s in results["scenarios"].items():
+        lines.append(
+            f"{name:<20} {s['requests']:>8} {s['errors']:>6}"
+            + "".join(f" {_fmt(s[key]):>12}" for key, _, _ in METRICS)
+        )
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before:
+            lines.append(f"{'  vs baseline':<36}" + "".join(
+                f" {_change(before[key], s[key], better):>12}" for key, _, better in METRICS
+            ))
+    return "\n".join(lines)
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than threshold percent."""
+    found = []
+    for name, s in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        for key, label, better in METRICS if before else ():
+            change = _percent(before[key], s[key])
+            if change is not None and (change if better == "lower" else -change) > threshold:
+                found.append(f"{name} {label}: {_fmt(before[key])} -> {_fmt(s[key])} ({change:+.1f}%)")
+    return found
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def _percent(before, after) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before * 100
+
+
+def _change(before, after, better: str) -> str:
+    change = _percent(before, after)
+    if change is None:
+        return "-"
+    if abs(change) < NOISE_PERCENT:
+        return f"{change:+.0f}% same"
+    improved = change < 0 if better == "lower" else change > 0
+    return f"{change:+.0f}% {'better' if improved else 'worse'}"
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,125 @@
+"""Benchmark scenarios: the request mixes that matter in production.
+
+A scenario turns the generated tenants into a list of jobs for one round; the
+runner executes the jobs concurrently against the app and times every request.
+A job is an async function of a Recorder, so it may issue several dependent
+requests (walking history pages, say).
+"""
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, NamedTuple
+import httpx
+from auth import create_access_token
+from benchmarks.datagen import Tenant
+
+
+class Recorder:
+    """Wraps the client; records each request's latency and whether it failed."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        start = perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies.append(perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+
+Job = Callable[[Recorder], Awaitable[None]]
+
+
+class Context(NamedTuple):
+    tenants: List[Tenant]
+    password: str
+    headers: Dict[int, dict]  # company_id -> admin Authorization header
+
+
+def make_context(tenants: List[Tenant], password: str) -> Context:
+    headers = {
+        t.company_id: {
+            "Authorization": f"Bearer {create_access_token({'sub': str(t.admin_id), 'cid': t.company_id})}"
+        }
+        for t in tenants
+    }
+    return Context(tenants, password, headers)
+
+
+def roll_call(ctx: Context, round_no: int) -> List[Job]:
+    """Morning burst: every department of every company saves a fresh day's sheet at once."""
+    day = str(date.today() + timedelta(days=round_no))
+    jobs = []
+    for t in ctx.tenants:
+        for dept in t.department_ids:
+            records = [
+                {"student_id": sid, "status": "present" if (sid + round_no) % 10 else "absent"}
+                for sid, d in zip(t.student_ids, t.student_departments) if d == dept
+            ]
+            body = {"date": day, "department_id": dept, "records": records}
+
+            async def job(rec: Recorder, body=body, headers=ctx.headers[t.company_id]):
+                await rec.request("POST", "/api/attendance/", json=body, headers=headers)
+            jobs.append(job)
+    return jobs
+
+
+# Open dashboards per company; each polls stats and the weekly chart once per round
+DASHBOARD_VIEWERS = 10
+
+
+def dashboard_polling(ctx: Context, round_no: int) -> List[Job]:
+    """Open dashboards refreshing: stats plus the weekly chart, many viewers per company."""
+    jobs = []
+    for t in ctx.tenants:
+        async def job(rec: Recorder, headers=ctx.headers[t.company_id]):
+            await rec.request("GET", "/api/dashboard/stats", headers=headers)
+            await rec.request("GET", "/api/dashboard/weekly", headers=headers)
+        jobs.extend([job] * DASHBOARD_VIEWERS)
+    return jobs
+
+
+def login_storm(ctx: Context, round_no: int) -> List[Job]:
+    """Start of shift: every employee of every company logs in at once (bcrypt-bound)."""
+    jobs = []
+    for t in ctx.tenants:
+        for email in t.employee_emails:
+            body = {"email": email, "password": ctx.password, "company_name": t.name}
+
+            async def job(rec: Recorder, body=body):
+                await rec.request("POST", "/api/auth/login", json=body)
+            jobs.append(job)
+    return jobs
+
+
+def history_export(ctx: Context, round_no: int) -> List[Job]:
+    """Reports: a full CSV export and a walk over every history page, per company."""
+    jobs = []
+    for t in ctx.tenants:
+        headers = ctx.headers[t.company_id]
+
+        async def export(rec: Recorder, headers=headers):
+            await rec.request("GET", "/api/attendance/export", params={"format": "csv"}, headers=headers)
+
+        async def walk(rec: Recorder, headers=headers):
+            params = {"limit": 500}
+            while True:
+                response = await rec.request("GET", "/api/attendance/history", params=params, headers=headers)
+                cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+                if not cursor:
+                    break
+                params["cursor"] = cursor
+        jobs.extend([export, walk])
+    return jobs
+
+
+# name -> scenario, in the order they run
+SCENARIOS: Dict[str, Callable[[Context, int], List[Job]]] = {
+    "roll_call": roll_call,
+    "dashboard_polling": dashboard_polling,
+    "login_storm": login_storm,
+    "history_export": history_export,
+}
@@ -0,0 +1,293 @@
+"""Slow-query log and on-demand request profiling, for admins chasing a slow page.
+
+Slow queries: every statement slower than SLOW_QUERY_MS is logged (logger
+"diagnostics.slow_query") with its SQL, duration and the route and company of
+the request that ran it; bound parameters too with SLOW_QUERY_PARAMETERS. The
+latest SLOW_QUERY_LOG_SIZE entries are kept in memory for
+GET /api/diagnostics/slow-queries. Statements are timed by metrics.py.
+
+Profiles: a request sent with ``X-Profile: 1`` by an admin (or picked at
+random, PROFILE_SAMPLE_RATE) runs under a sampling profiler. The response
+carries ``X-Profile-Id``; GET /api/diagnostics/profiles/{id} returns the
+samples as folded stacks ("frame;frame;frame count" lines), which
+flamegraph.pl, speedscope and most flame-graph viewers read directly.
+
+Each PROFILE_INTERVAL_MS the sampler records where the request is: down its
+chain of awaits, then into the sync code it is running on the event loop or
+in a worker thread (sync endpoints, to_thread calls). Time spent waiting, for
+the database or a lock, is counted where it waits. Only the request's own
+frames are read, so concurrent requests never appear in its profile. One
+request per worker is profiled at a time. Both stores are per process.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Deque, List, NamedTuple, Optional
+import anyio
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# --- Config ---
+# Statements slower than this are logged; 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+# Bound parameters hold emails, names and password hashes; log them only when asked to
+SLOW_QUERY_PARAMETERS = os.getenv("SLOW_QUERY_PARAMETERS", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Share of authenticated requests profiled without being asked (0 = only on X-Profile)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "50"))
+# Also write each profile to <PROFILE_DIR>/<id>.folded
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+PROFILE_HEADER = b"x-profile"
+MAX_STATEMENT_CHARS = 4000
+MAX_PARAMETER_CHARS = 1000
+MAX_STACK_DEPTH = 64
+
+logger = logging.getLogger("diagnostics.slow_query")
+
+
+# --- Slow-query log ---
+class SlowQuery(NamedTuple):
+    at: datetime
+    duration_ms: float
+    statement: str
+    parameters: Optional[str]
+    engine: str
+    method: Optional[str]
+    route: Optional[str]
+    company_id: Optional[int]
+
+
+_slow_queries: Deque[SlowQuery] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + f"... ({len(text) - limit} more chars)"
+
+
+def _record_slow(statement: str, parameters, elapsed: float, label: str):
+    ctx = metrics.current()
+    entry = SlowQuery(
+        at=datetime.now(timezone.utc),
+        duration_ms=round(elapsed * 1000, 2),
+        statement=_truncate(statement, MAX_STATEMENT_CHARS),
+        parameters=_truncate(repr(parameters), MAX_PARAMETER_CHARS) if SLOW_QUERY_PARAMETERS else None,
+        engine=label,
+        method=ctx.method if ctx else None,
+        route=ctx.route if ctx else None,
+        company_id=ctx.company_id if ctx else None,
+    )
+    _slow_queries.append(entry)
+    logger.warning(json.dumps({**entry._asdict(), "at": entry.at.isoformat()}))
+
+
+def slow_queries(company_id: int, limit: int) -> List[SlowQuery]:
+    """The company's latest slow statements, newest first."""
+    found = [q for q in reversed(list(_slow_queries)) if q.company_id == company_id]
+    return found[:limit]
+
+
+def _on_query(statement: str, parameters, elapsed: float, label: str):
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _record_slow(statement, parameters, elapsed, label)
+
+
+if SLOW_QUERY_MS > 0:
+    metrics.on_query(_on_query)
+
+
+# --- Sampling profiler ---
+def _frame_label(code) -> str:
+    # ';' separates frames in the folded format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _step(awaitable):
+    """(frame, running, what it awaits) of one link in a chain of awaits."""
+    if inspect.iscoroutine(awaitable):
+        return awaitable.cr_frame, awaitable.cr_running, awaitable.cr_await
+    if inspect.isasyncgen(awaitable):
+        return awaitable.ag_frame, awaitable.ag_running, awaitable.ag_await
+    if inspect.isgenerator(awaitable):
+        return awaitable.gi_frame, awaitable.gi_running, awaitable.gi_yieldfrom
+    if isinstance(awaitable, asyncio.Task):
+        return None, False, awaitable.get_coro()
+    return None, False, None  # a future: the chain ends here
+
+
+def _thread_stack(ident: int) -> list:
+    frame, stack = sys._current_frames().get(ident), []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def _request_stack(root, loop_thread: int) -> list:
+    """The frames the request is in right now, outermost first."""
+    stack, running, awaitable = [], False, root
+    while awaitable is not None:
+        frame, frame_running, awaitable = _step(awaitable)
+        if frame is not None:
+            stack.append(frame)
+            running = frame_running
+    if not stack:
+        return stack
+    innermost = stack[-1]
+    if running:
+        # Sync code called on the event loop: the loop thread's frames above the innermost coroutine
+        callees = _thread_stack(loop_thread)
+        if innermost in callees:
+            stack.extend(callees[callees.index(innermost) + 1:])
+    elif innermost.f_code.co_name == "run_sync_in_worker_thread":
+        # anyio handed a call to a worker thread and awaits its future. Until the
+        # future is done the worker takes no other work, so its frames are ours.
+        local = innermost.f_locals
+        worker, future = local.get("worker"), local.get("future")
+        if worker is not None and future is not None and worker.ident is not None:
+            callees = _thread_stack(worker.ident)
+            if not future.done():
+                stack.extend(callees)
+    return stack
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval: float, root, loop_thread: int):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.root = root  # the request's coroutine
+        self.loop_thread = loop_thread
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.samples += 1
+            stack = _request_stack(self.root, self.loop_thread)
+            if stack:
+                self.stacks[";".join(_frame_label(f.f_code) for f in stack[-MAX_STACK_DEPTH:])] += 1
+
+    def finish(self):
+        """Stop sampling; returns at once."""
+        self._done.set()
+
+    def folded(self) -> str:
+        """The samples in folded format, once the sampler has stopped (blocks until it has)."""
+        self.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profile(NamedTuple):
+    id: str
+    company_id: int
+    at: datetime
+    method: str
+    route: str
+    status: int
+    duration_ms: float
+    samples: int
+    folded: str
+
+
+_profiles: "OrderedDict[str, Profile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+_profiling = threading.Lock()  # one profiled request per worker at a time
+
+
+def _store(profile: Profile):
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > PROFILE_STORE_SIZE:
+            _profiles.popitem(last=False)
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{profile.id}.folded"), "w") as f:
+            f.write(profile.folded)
+
+
+def profiles(company_id: int) -> List[Profile]:
+    """The company's stored profiles, newest first."""
+    with _profiles_lock:
+        return [p for p in reversed(_profiles.values()) if p.company_id == company_id]
+
+
+def get_profile(company_id: int, profile_id: str) -> Optional[Profile]:
+    with _profiles_lock:
+        profile = _profiles.get(profile_id)
+    return profile if profile is not None and profile.company_id == company_id else None
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it; keeps the result only if an admin asked.
+
+    Must run inside MetricsMiddleware, which tracks who the request authenticated as.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in scope["headers"])
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        # Anyone can send the header, so profiling is bounded to one request at a time
+        if not (requested or sampled) or not _profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        ctx = metrics.current()
+        profile_id: Optional[str] = None
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal profile_id, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Authentication has happened by now; only admins' requests are kept
+                if ctx is not None and ctx.company_id is not None and (ctx.is_admin or not requested):
+                    profile_id = secrets.token_hex(8)
+                    if requested:
+                        headers = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+                        message = {**message, "headers": headers}
+            await send(message)
+
+        request = self.app(scope, receive, send_with_profile_id)
+        sampler = _Sampler(PROFILE_INTERVAL_MS / 1000, request, threading.get_ident())
+        start = perf_counter()
+        sampler.start()
+        try:
+            await request
+        finally:
+            sampler.finish()
+            elapsed = perf_counter() - start
+            _profiling.release()
+            if profile_id is not None:
+                # Waiting for the sampler's last round would block the event loop
+                folded = await anyio.to_thread.run_sync(sampler.folded)
+                _store(Profile(
+                    id=profile_id,
+                    company_id=ctx.company_id,
+                    at=datetime.now(timezone.utc),
+                    method=ctx.method,
+                    route=ctx.route,
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 2),
+                    samples=sampler.samples,
+                    folded=folded,
+                ))
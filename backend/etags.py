@@ -0,0 +1,72 @@
+"""ETags and conditional GETs backed by per-company resource version counters.
+
+Writers call bump() inside their transaction, so the counters change exactly
+when the data does, in every worker. A read endpoint builds its ETag from the
+versions of everything its response embeds (a student list also shows
+department names, so it depends on both), answers a matching If-None-Match
+with 304 before running its main query, and otherwise sends the ETag along.
+Reading the versions before the data means a write landing in between can only
+make a body newer than its tag, which costs the client one extra full response.
+
+Responses carry ``Cache-Control: private, no-cache``: browsers keep them but
+revalidate on every use, which turns a repeat load into an empty 304.
+"""
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import ResourceVersion
+
+# Resources with a version counter
+STUDENTS = "students"
+DEPARTMENTS = "departments"
+SETTINGS = "settings"
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump(db: Session, company_id: int, *resources: str):
+    """Advance the resources' versions within the caller's write transaction."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    table = ResourceVersion.__table__
+    stmt = dialect.insert(table).values(
+        [{"company_id": company_id, "resource": r, "version": 1} for r in resources]
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["company_id", "resource"],
+        set_={"version": table.c.version + 1},
+    ))
+
+
+def current(db: Session, company_id: int, *resources: str, extra: tuple = ()) -> str:
+    """The strong ETag for a response built from ``resources`` (plus any ``extra`` parts)."""
+    versions = dict(
+        db.query(ResourceVersion.resource, ResourceVersion.version).filter(
+            ResourceVersion.company_id == company_id,
+            ResourceVersion.resource.in_(resources),
+        )
+    )
+    parts: tuple = (company_id, *(versions.get(r, 0) for r in resources), *extra)
+    return '"' + "-".join((*resources, *map(str, parts))) + '"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """The 304 to send instead of the body when the client's copy is current, else None."""
+    if not _matches(request, etag):
+        return None
+    return tag(Response(status_code=304), etag)
+
+
+def tag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
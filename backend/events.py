@@ -0,0 +1,173 @@
+"""Per-company event channel behind GET /api/events (server-sent events).
+
+Writers call publish() after they commit; every open stream of that company
+receives the event as one JSON line. Events are compact deltas:
+
+    {"type": "attendance", "date": "2026-10-18", "version": 4,
+     "counts": [[department_id, "2026-10-18", d_present, d_absent], ...]}
+    {"type": "members", "counts": [[department_id, d_members], ...]}
+    {"type": "refresh"}    # too much changed; refetch
+
+("date" and "version" are only present for a saved attendance sheet.)
+
+Fan-out to the streams of a worker is in-process. With several workers, set
+EVENTS_BROKER_URL=redis://... (pip install redis): events are then published
+through Redis and each worker fans them out to its own streams.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import AsyncIterator, Dict, Iterable, Optional, Protocol, Tuple
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# Events a slow stream may have waiting before it is told to refresh instead
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_BROKER_URL = os.getenv("EVENTS_BROKER_URL", "")
+
+REFRESH = json.dumps({"type": "refresh"})
+
+logger = logging.getLogger("events")
+
+
+class Broker(Protocol):
+    def publish(self, company_id: int, event: dict): ...
+
+    def subscribe(self, company_id: int) -> "AsyncIterator[asyncio.Queue]": ...
+
+    def subscriber_count(self) -> int: ...
+
+
+class LocalBroker:
+    """Fans events out to this process's subscribers. publish() is thread-safe, so sync
+    endpoints running in the threadpool can call it."""
+
+    def __init__(self):
+        # company_id -> {queue: the loop its consumer runs on}
+        self._subscribers: Dict[int, Dict[asyncio.Queue, asyncio.AbstractEventLoop]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, company_id: int) -> AsyncIterator[asyncio.Queue]:
+        """A queue of JSON strings for one stream, registered for as long as the context is open."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[company_id][queue] = asyncio.get_running_loop()
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers[company_id].pop(queue, None)
+                if not self._subscribers[company_id]:
+                    del self._subscribers[company_id]
+
+    def publish(self, company_id: int, event: dict):
+        self._deliver(company_id, json.dumps(event, separators=(",", ":")))
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def _deliver(self, company_id: int, data: str):
+        with self._lock:
+            targets = list(self._subscribers.get(company_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_put, queue, data)
+            except RuntimeError:  # the consumer's loop has closed
+                pass
+
+
+def _put(queue: asyncio.Queue, data: str):
+    try:
+        queue.put_nowait(data)
+    except asyncio.QueueFull:
+        # The stream is not keeping up: drop its backlog and have it refetch instead
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(REFRESH)
+
+
+class RedisBroker(LocalBroker):
+    """Publishes through Redis pub/sub; a listener thread feeds this worker's subscribers."""
+
+    CHANNEL_PREFIX = "attendance-events:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        threading.Thread(target=self._listen, name="events-listener", daemon=True).start()
+
+    def publish(self, company_id: int, event: dict):
+        self._redis.publish(f"{self.CHANNEL_PREFIX}{company_id}", json.dumps(event, separators=(",", ":")))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.CHANNEL_PREFIX + "*")
+                for message in pubsub.listen():
+                    channel = message["channel"].decode()
+                    self._deliver(int(channel[len(self.CHANNEL_PREFIX):]), message["data"].decode())
+            except Exception:
+                # Connection lost; streams miss events until it is back, then carry on
+                logger.warning("event listener lost its Redis connection; retrying", exc_info=True)
+                time.sleep(1)
+
+
+def _make_broker() -> Broker:
+    if not EVENTS_BROKER_URL:
+        return LocalBroker()
+    try:
+        return RedisBroker(EVENTS_BROKER_URL)
+    except ImportError:
+        raise RuntimeError("EVENTS_BROKER_URL is set but the redis package is not installed")
+
+
+broker: Broker = _make_broker()
+metrics.Gauge("event_streams", "Open /api/events streams", source=lambda: broker.subscriber_count())
+PUBLISH_FAILURES = metrics.Counter("event_publish_failures_total", "Events lost because publishing failed")
+
+
+def publish(company_id: int, event: dict):
+    """Call after committing; publishing never fails the request that made the change."""
+    try:
+        broker.publish(company_id, event)
+    except Exception:
+        # Streams miss this event (and their dashboards drift until the next refetch)
+        PUBLISH_FAILURES.inc()
+        logger.exception("could not publish %s event for company %s", event.get("type"), company_id)
+
+
+def attendance_event(
+    counts: Dict[Tuple[Optional[int], date], Tuple[int, int]],
+    day: Optional[date] = None,
+    version: Optional[int] = None,
+) -> dict:
+    """An attendance event from applied SummaryDelta counts."""
+    event = {
+        "type": "attendance",
+        "counts": [[dept, d.isoformat(), p, a] for (dept, d), (p, a) in counts.items()],
+    }
+    if day is not None:
+        event.update(date=day.isoformat(), version=version)
+    return event
+
+
+def members_event(added: Iterable[Optional[int]] = (), removed: Iterable[Optional[int]] = ()) -> dict:
+    """A member-count event: the department ids of members added and removed."""
+    counts: Dict[Optional[int], int] = defaultdict(int)
+    for dept in added:
+        counts[dept] += 1
+    for dept in removed:
+        counts[dept] -= 1
+    return {"type": "members", "counts": [[dept, n] for dept, n in counts.items() if n]}
@@ -0,0 +1,82 @@
+"""Roster file parsing shared by the student and employee import endpoints.
+
+Accepts a CSV file with a header row, or a JSON array of objects. Column names
+are case-insensitive; values are stripped. Departments may be given by
+``department`` (name) or ``department_id``.
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from models import Department
+
+# Rows per INSERT / transaction
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ROWS = 50_000
+# Each employee needs a bcrypt hash (see passwords.py); keep one import to well under a minute
+MAX_EMPLOYEE_IMPORT_ROWS = 200
+
+T = TypeVar("T")
+
+
+def read_rows(upload: UploadFile, max_rows: int = MAX_IMPORT_ROWS) -> List[Dict[str, str]]:
+    raw = upload.file.read()
+    try:
+        text = raw.decode("utf-8-sig")  # tolerate the BOM spreadsheet apps write
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
+    is_json = (upload.filename or "").lower().endswith(".json") or upload.content_type == "application/json"
+    if is_json:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise HTTPException(status_code=400, detail="JSON import must be an array of objects")
+        records = data
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+
+    if len(records) > max_rows:
+        raise HTTPException(status_code=400, detail=f"At most {max_rows} rows per import")
+    return [
+        {
+            str(k).strip().lower(): "" if v is None else str(v).strip()
+            for k, v in record.items() if k is not None
+        }
+        for record in records
+    ]
+
+
+class DepartmentLookup:
+    """A company's departments, fetched once, resolved by id or (case-insensitive) name."""
+
+    def __init__(self, db: Session, company_id: int):
+        rows = db.query(Department.id, Department.name).filter(Department.company_id == company_id).all()
+        self.names = {dept_id: name for dept_id, name in rows}
+        self._by_name = {name.lower(): dept_id for dept_id, name in rows}
+
+    def resolve(self, row: Dict[str, str]) -> Tuple[Optional[int], Optional[str]]:
+        """Return (department_id, error) for a row; both None when no department is given."""
+        if row.get("department_id"):
+            try:
+                dept_id = int(row["department_id"])
+            except ValueError:
+                return None, f"Invalid department_id {row['department_id']!r}"
+            if dept_id not in self.names:
+                return None, f"Department {dept_id} not found"
+            return dept_id, None
+        if row.get("department"):
+            dept_id = self._by_name.get(row["department"].lower())
+            if dept_id is None:
+                return None, f"Department {row['department']!r} not found"
+            return dept_id, None
+        return None, None
+
+
+def batches(items: Sequence[T], size: int = IMPORT_BATCH_SIZE) -> Iterator[Sequence[T]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
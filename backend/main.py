@@ -1,11 +1,20 @@
-from fastapi import FastAPI
+import secrets
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine
-import models
-from routers import students, attendance, dashboard, auth, departments, settings, employees
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+from database import DatabaseBusy, engine
+import metrics
+import migrations
+import passwords
+import response_cache
+from diagnostics import ProfilingMiddleware
+from events import broker as events_broker
+from routers import students, attendance, dashboard, auth, departments, settings, employees, analytics, events, diagnostics
 
-# Create all database tables
-models.Base.metadata.create_all(bind=engine)
+# Create tables and apply pending schema migrations (company databases upgrade as they open)
+migrations.upgrade_primary(engine)
 
 app = FastAPI(
     title="Attendance Tracker API",
@@ -20,8 +29,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Attendance-Version", "Content-Disposition", "X-Profile-Id"],
 )
 
+# Compress larger JSON / export bodies (heatmaps, history pages, CSV)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Profiles requests sent with X-Profile (see diagnostics.py); inside metrics, which knows the principal
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so request latency includes compression
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(students.router)
@@ -30,6 +49,25 @@ app.include_router(dashboard.router)
 app.include_router(departments.router)
 app.include_router(settings.router)
 app.include_router(employees.router)
+app.include_router(analytics.router)
+app.include_router(events.router)
+app.include_router(diagnostics.router)
+
+
+@app.exception_handler(DatabaseBusy)
+async def database_busy(request: Request, exc: DatabaseBusy):
+    return JSONResponse(
+        status_code=503, content={"detail": "Database busy, please retry"}, headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(passwords.PasswordQueueFull)
+async def password_queue_full(request: Request, exc: passwords.PasswordQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins in progress, please retry"},
+        headers={"Retry-After": "1"},
+    )
 
 
 @app.get("/")
@@ -39,4 +77,18 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "password_pool": passwords.stats(),
+        "response_cache": response_cache.stats(),
+        "event_streams": events_broker.subscriber_count(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(authorization: Optional[str] = Header(default=None)):
+    if metrics.METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {metrics.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
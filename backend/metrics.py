@@ -0,0 +1,320 @@
+"""Prometheus metrics, served in the text exposition format on GET /metrics.
+
+MetricsMiddleware times every request by route template (``/api/students/{student_id}``,
+never the raw path) and, once a request has authenticated, by company.
+Engine events add the SQL statements each request ran and how long they took;
+pool instrumentation records how long requests waited for a connection.
+Modules declare their own metrics next to the code they measure (bcrypt time
+in passwords.py, cache hits in response_cache.py, ...).
+
+Metrics are per process. With several workers, each scrape sees one worker;
+add the worker's address or pid as a scrape target label, or scrape each one.
+
+Keep this module to the standard library and SQLAlchemy: passwords.py imports
+it, and so do the hashing pool's child processes.
+"""
+import os
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+# --- Config ---
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Latency by company; turn off when there are too many companies to keep a series each
+METRICS_PER_TENANT = os.getenv("METRICS_PER_TENANT", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+# --- Metric types ---
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A running total; or, given ``source``, a total kept elsewhere and read at scrape time.
+
+    ``source`` returns a number, or a mapping of label-value tuples to numbers.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), source: Optional[Callable] = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+        self._source = source
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        if self._source is None:
+            with self._lock:
+                items = list(self._values.items())
+        else:
+            values = self._source()
+            items = values.items() if isinstance(values, dict) else [((), values)]
+        for label_values, value in items:
+            yield f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values: Dict[Tuple, list] = {}  # labels -> [count per bucket..., sum]
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(k, list(v)) for k, v in self._values.items()]
+        for label_values, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}"
+            labels = _labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_number(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# --- HTTP ---
+REQUESTS = Counter("http_requests_total", "Requests by route and status", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route", ["method", "route"])
+# A separate family: route x company x buckets would be too many series
+TENANT_REQUEST_SECONDS = Histogram(
+    "http_tenant_request_duration_seconds", "Latency of authenticated requests by company", ["company_id"]
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being served")
+
+# --- Database ---
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Time per SQL statement", ["engine"])
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements per request by route", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_QUERY_SECONDS = Counter(
+    "db_request_query_seconds_total", "Time spent in SQL by route", ["route"]
+)
+CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+_pools: Dict[str, list] = {}  # engine label -> pools (tenant shards share a label)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Pooled connections in use", ["engine"],
+    source=lambda: {
+        (label,): sum(pool.checkedout() for pool in pools if hasattr(pool, "checkedout"))
+        for label, pools in list(_pools.items())
+    },
+)
+
+
+class RequestContext:
+    """What is known about the request being served; see current()."""
+    __slots__ = ("scope", "company_id", "is_admin", "queries", "query_seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.company_id: Optional[int] = None
+        self.is_admin = False
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    @property
+    def method(self) -> str:
+        return self.scope["method"]
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the scope; unmatched paths share one label
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+
+# Shared by the request's task and the threads it hands work to (contexts are copied, the object is not)
+_current: ContextVar[Optional[RequestContext]] = ContextVar("metrics_request", default=None)
+
+
+def current() -> Optional[RequestContext]:
+    """The request this code runs for, or None outside requests (startup, CLIs)."""
+    return _current.get()
+
+
+def set_principal(company_id: int, is_admin: bool):
+    """Record who the current request authenticated as (called by auth)."""
+    ctx = _current.get()
+    if ctx is not None:
+        ctx.company_id = company_id
+        ctx.is_admin = is_admin
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are not buffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        ctx = RequestContext(scope)
+        token = _current.set(ctx)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            IN_FLIGHT.dec()
+            _current.reset(token)
+            route = ctx.route
+            REQUESTS.inc(ctx.method, route, status)
+            REQUEST_SECONDS.observe(elapsed, ctx.method, route)
+            if METRICS_PER_TENANT and ctx.company_id is not None:
+                TENANT_REQUEST_SECONDS.observe(elapsed, ctx.company_id)
+            REQUEST_QUERIES.observe(ctx.queries, route)
+            if ctx.queries:
+                REQUEST_QUERY_SECONDS.inc(route, amount=ctx.query_seconds)
+
+
+# Called as listener(statement, parameters, seconds, engine label) after each statement
+_query_listeners: List[Callable[[str, Any, float, str], None]] = []
+
+
+def on_query(listener: Callable[[str, Any, float, str], None]):
+    """Have listener see every statement of the instrumented engines, with its duration."""
+    _query_listeners.append(listener)
+
+
+def instrument_engine(engine: Engine, label: str):
+    """Time the engine's statements (for metrics and on_query listeners) and its pool checkouts."""
+
+    def _record(conn, statement, parameters):
+        elapsed = perf_counter() - conn.info["metrics_query_start"].pop()
+        QUERY_SECONDS.observe(elapsed, label)
+        ctx = _current.get()
+        if ctx is not None:
+            ctx.queries += 1
+            ctx.query_seconds += elapsed
+        for listener in _query_listeners:
+            listener(statement, parameters, elapsed, label)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _record(conn, statement, parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        # A failed statement skips after_cursor_execute; without this its start time
+        # would stay on the pooled connection and the statement would go unrecorded
+        conn = exception_context.connection
+        if conn is None or conn.invalidated:
+            return  # an invalidated connection's info is discarded with it
+        if conn.info.get("metrics_query_start"):
+            _record(conn, exception_context.statement, exception_context.parameters)
+
+    _time_checkouts(engine.pool, label)
+    _pools.setdefault(label, []).append(engine.pool)
+
+
+def _time_checkouts(pool, label: str):
+    """Time the pool's wait for a connection, where the pool allows it.
+
+    Pools have no event for the start of a checkout, so this wraps Pool._do_get,
+    the private method that waits for one (checked against SQLAlchemy 2.1.4). A
+    pool without it keeps working, just without the wait histogram.
+    (engine.dispose() replaces the pool; instrument engines that are never disposed.)
+    """
+    do_get = getattr(pool, "_do_get", None)
+    if not callable(do_get):
+        return
+
+    def _timed_do_get():
+        start = perf_counter()
+        try:
+            return do_get()
+        finally:
+            CHECKOUT_WAIT_SECONDS.observe(perf_counter() - start, label)
+
+    pool._do_get = _timed_do_get
+
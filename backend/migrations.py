@@ -0,0 +1,213 @@
+"""Versioned schema migrations.
+
+`Base.metadata.create_all` only creates missing tables, so anything that changes
+an existing table (indexes, constraints, backfills) lives here as a numbered
+migration. A fresh database gets the current schema from the models and is
+stamped at the latest version; an existing one runs every migration it has not
+seen yet, in order, each in its own transaction.
+
+Migrations must be safe to run against a schema that already has the change
+(create indexes with checkfirst, etc.), because create_all runs first.
+
+When each company has its own database (TENANT_DATABASE_URL), DATABASE_URL
+holds only the tenant catalog, and every company database is upgraded the first
+time a process opens it; `python migrations.py` upgrades them all at once.
+
+    python migrations.py            # upgrade to the latest version
+    python migrations.py --status   # list applied / pending migrations
+"""
+import argparse
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.orm import Session
+from database import SHARDED, Base, CatalogBase
+from models import SchemaMigration
+from rollups import rebuild_month_bits, rebuild_summary
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(fn: Callable[[Connection], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1].version < version, "migrations must be added in order"
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+
+def _create_indexes(conn: Connection, *names: str):
+    """Create the named model indexes if the database does not have them yet."""
+    wanted = set(names)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in wanted:
+                index.create(conn, checkfirst=True)
+                wanted.discard(index.name)
+    assert not wanted, f"unknown indexes: {sorted(wanted)}"
+
+
+def _assert_unique(conn: Connection, table: str, *columns: str):
+    cols = ", ".join(columns)
+    dupes = conn.execute(
+        text(f"SELECT {cols}, COUNT(*) FROM {table} GROUP BY {cols} HAVING COUNT(*) > 1 LIMIT 5")
+    ).fetchall()
+    if dupes:
+        raise RuntimeError(
+            f"Cannot add unique index on {table}({cols}); resolve these duplicates first: {dupes}"
+        )
+
+
+# --- Migrations (append only; never renumber) ---
+
+@migration(1, "Unique (company_id, student_id, date) key on attendance")
+def _attendance_unique_key(conn: Connection):
+    # Keep the newest mark where a student was submitted twice for one day
+    conn.execute(text(
+        "DELETE FROM attendance WHERE id NOT IN "
+        "(SELECT MAX(id) FROM attendance GROUP BY company_id, student_id, date)"
+    ))
+    _create_indexes(conn, "uq_attendance_company_student_date")
+
+
+@migration(2, "Backfill daily_attendance_summary from raw attendance")
+def _backfill_attendance_summary(conn: Connection):
+    with Session(bind=conn) as db:
+        rebuild_summary(db)
+        db.flush()
+
+
+@migration(3, "Composite and unique indexes for tenant-scoped lookups")
+def _tenant_indexes(conn: Connection):
+    _assert_unique(conn, "students", "company_id", "roll_number")
+    _assert_unique(conn, "departments", "company_id", "name")
+    _create_indexes(
+        conn,
+        "ix_attendance_company_date",
+        "ix_attendance_student_date",
+        "uq_students_company_roll_number",
+        "ix_students_department_id",
+        "uq_departments_company_name",
+        "ix_users_company_id_email",
+        "ix_users_department_id",
+    )
+
+
+@migration(4, "Student directory pagination and search indexes")
+def _student_directory_indexes(conn: Connection):
+    _create_indexes(
+        conn,
+        "ix_students_company_id",
+        "ix_students_company_name_lower",
+        "ix_students_company_roll_number_lower",
+    )
+
+
+@migration(5, "Backfill attendance_months bitmaps from raw attendance")
+def _backfill_attendance_months(conn: Connection):
+    with Session(bind=conn) as db:
+        rebuild_month_bits(db)
+        db.flush()
+
+
+@migration(6, "Unique case-insensitive (company_id, email) on users")
+def _unique_user_emails(conn: Connection):
+    _assert_unique(conn, "users", "company_id", "lower(email)")
+    _create_indexes(conn, "uq_users_company_email_lower")
+
+
+# --- Runner ---
+
+# Arbitrary constant identifying the migration lock among PostgreSQL advisory locks
+_PG_LOCK_KEY = 74_211_001
+
+
+@contextmanager
+def _upgrade_lock(engine: Engine):
+    """Serialize upgrades when several API workers start against one PostgreSQL database."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _PG_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _PG_LOCK_KEY})
+
+
+def applied_versions(engine: Engine) -> List[int]:
+    with engine.connect() as conn:
+        return [v for (v,) in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+
+def upgrade(engine: Engine) -> List[Migration]:
+    """Bring the database up to the latest version; returns the migrations that ran."""
+    with _upgrade_lock(engine):
+        fresh = not inspect(engine).has_table("companies")
+        Base.metadata.create_all(bind=engine)
+
+        done = set(applied_versions(engine))
+        pending = [m for m in MIGRATIONS if m.version not in done]
+        for m in pending:
+            with engine.begin() as conn:
+                if not fresh:
+                    m.apply(conn)
+                conn.execute(
+                    SchemaMigration.__table__.insert().values(version=m.version, description=m.description)
+                )
+    return [] if fresh else pending
+
+
+def upgrade_primary(engine: Engine) -> List[Migration]:
+    """Upgrade DATABASE_URL: the whole schema, or only the tenant catalog when sharded."""
+    if SHARDED:
+        CatalogBase.metadata.create_all(bind=engine)
+        return []
+    return upgrade(engine)
+
+
+def main():
+    from database import engine, get_shard, shard_url
+    import tenants
+
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="show migration state and exit")
+    args = parser.parse_args()
+
+    if SHARDED:
+        upgrade_primary(engine)
+        company_ids = tenants.company_ids()
+        if args.status:
+            for company_id in company_ids:
+                print(f"company {company_id}: {make_url(shard_url(company_id)).render_as_string(hide_password=True)}")
+            return
+        # Opening a company's database upgrades it
+        for company_id in company_ids:
+            get_shard(company_id)
+        print(f"Catalog and {len(company_ids)} company databases are up to date")
+        return
+
+    if args.status:
+        done = set(applied_versions(engine)) if inspect(engine).has_table("schema_migrations") else set()
+        for m in MIGRATIONS:
+            print(f"[{'x' if m.version in done else ' '}] {m.version:03d} {m.description}")
+        return
+
+    ran = upgrade(engine)
+    for m in ran:
+        print(f"Applied {m.version:03d} {m.description}")
+    if not ran:
+        print("Database is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime, Enum, Text
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime, Enum, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from database import Base
+from database import Base, CatalogBase
 import enum
 
+# Loading policy: many-to-one relationships that every API response renders
+# (a member's department, an attendance row's member, a user's company and
+# department) load eagerly with a JOIN, so serialising a list never issues a
+# query per row. Collections stay lazy and are only touched by ORM cascades.
+
 
 class UserRole(str, enum.Enum):
     admin = "admin"
@@ -31,6 +36,9 @@ class Company(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_company_id_email", "company_id", "email"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -38,15 +46,18 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), nullable=False, default=UserRole.employee)
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
-    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    company = relationship("Company", back_populates="users")
-    department = relationship("Department", back_populates="users")
+    company = relationship("Company", back_populates="users", lazy="joined")
+    department = relationship("Department", back_populates="users", lazy="joined")
 
 
 class Department(Base):
     __tablename__ = "departments"
+    __table_args__ = (
+        Index("uq_departments_company_name", "company_id", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -60,21 +71,40 @@ class Department(Base):
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        Index("uq_students_company_roll_number", "company_id", "roll_number", unique=True),
+        Index("ix_students_company_id", "company_id"),  # (company_id, rowid): id-ordered pages
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     roll_number = Column(String, nullable=False)
-    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    department = relationship("Department", back_populates="students")
+    department = relationship("Department", back_populates="students", lazy="joined")
     company = relationship("Company", back_populates="students")
     attendances = relationship("Attendance", back_populates="student", cascade="all, delete-orphan")
+    attendance_months = relationship("AttendanceMonth", cascade="all, delete-orphan")
+
+
+# One account per email within a company, whatever its case
+Index("uq_users_company_email_lower", User.company_id, func.lower(User.email), unique=True)
+
+# Case-insensitive prefix search on the member directory
+Index("ix_students_company_name_lower", Student.company_id, func.lower(Student.name))
+Index("ix_students_company_roll_number_lower", Student.company_id, func.lower(Student.roll_number))
 
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One mark per member per day — backs the bulk upsert in mark_attendance
+        Index("uq_attendance_company_student_date", "company_id", "student_id", "date", unique=True),
+        Index("ix_attendance_company_date", "company_id", "date"),
+        Index("ix_attendance_student_date", "student_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -83,4 +113,101 @@ class Attendance(Base):
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    student = relationship("Student", back_populates="attendances")
+    student = relationship("Student", back_populates="attendances", lazy="joined")
+
+
+class AttendanceSheet(Base):
+    """Per-company, per-date version counter for optimistic concurrency on attendance saves."""
+    __tablename__ = "attendance_sheets"
+    __table_args__ = (
+        Index("uq_attendance_sheets_company_date", "company_id", "date", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class AttendanceArchive(Base):
+    """Per-company archive state: marks before archived_before live in the archive files (see archive.py)."""
+    __tablename__ = "attendance_archives"
+    __table_args__ = (
+        Index("uq_attendance_archives_company", "company_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    archived_before = Column(Date, nullable=True)  # NULL until the first archive run completes
+    frozen_before = Column(Date, nullable=False)  # writes to earlier dates are refused
+    rows = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DailyAttendanceSummary(Base):
+    """Rollup of attendance counts per company, department and date, maintained on write."""
+    __tablename__ = "daily_attendance_summary"
+    __table_args__ = (
+        Index("ix_daily_attendance_summary_company_date", "company_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)  # NULL = unassigned
+    date = Column(Date, nullable=False)
+    present = Column(Integer, nullable=False, default=0)
+    absent = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceMonth(Base):
+    """One member's month of marks as bitmaps: bit d-1 is set when day d was marked.
+
+    A day set in neither bitmap is unmarked. Maintained on write alongside Attendance.
+    """
+    __tablename__ = "attendance_months"
+    __table_args__ = (
+        Index("uq_attendance_months_student_month", "student_id", "month", unique=True),
+        Index("ix_attendance_months_company_month", "company_id", "month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    month = Column(Date, nullable=False)  # first day of the month
+    present_bits = Column(Integer, nullable=False, default=0)
+    absent_bits = Column(Integer, nullable=False, default=0)
+
+
+class ResourceVersion(Base):
+    """Per-company change counter for a resource, bumped by its writers; backs ETags."""
+    __tablename__ = "resource_versions"
+    __table_args__ = (
+        Index("uq_resource_versions_company_resource", "company_id", "resource", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    resource = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class Tenant(CatalogBase):
+    """Catalog entry for a company when each company has its own database (see tenants.py)."""
+    __tablename__ = "tenants"
+
+    id = Column(Integer, primary_key=True)  # the company's id, in its own database too
+    name = Column(String, unique=True, nullable=False, index=True)
+    owner_email = Column(String, nullable=False, index=True)  # the signup admin; unique across tenants
+    database_url = Column(String, nullable=True)  # set when moved; NULL = TENANT_DATABASE_URL
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SchemaMigration(Base):
+    """Applied migrations — see migrations.py."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
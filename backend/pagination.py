@@ -0,0 +1,29 @@
+"""Opaque keyset cursors shared by the paginated list endpoints.
+
+A cursor encodes the sort key of the last row on a page; the next page asks for
+rows strictly after it, so every page is an index range scan no matter how deep.
+"""
+import base64
+from datetime import date
+from typing import Any, Callable, Sequence, Tuple
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = "|".join(v.isoformat() if isinstance(v, date) else str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[str], Any]]) -> Tuple[Any, ...]:
+    """Decode a cursor into typed values; pass e.g. (date.fromisoformat, int)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        if len(parts) != len(types):
+            raise ValueError(cursor)
+        return tuple(t(p) for t, p in zip(types, parts))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
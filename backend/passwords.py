@@ -0,0 +1,175 @@
+"""bcrypt hashing on a bounded process pool.
+
+A bcrypt round takes a few hundred milliseconds of CPU. Run in the request
+thread it holds the GIL for all of that, so a burst of logins stalls every other
+request in the worker. Here the work runs in a small pool of child processes;
+the request thread only waits on the result (without the GIL).
+
+At most PASSWORD_HASH_QUEUE_LIMIT operations may be running or waiting at once.
+Past that, callers get PasswordQueueFull (a 503, see main.py) instead of piling
+up behind the pool.
+
+Keep this module light: the pool's child processes import it.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import List, Optional, Tuple
+import bcrypt
+import metrics
+
+# --- Config ---
+# Cost factor for new hashes. Existing hashes with a different cost are
+# rehashed the next time their owner logs in.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Child processes per API worker; 0 hashes inline in the calling thread
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Operations running plus waiting before new ones are turned away
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+
+class PasswordQueueFull(Exception):
+    """Too many hash operations running or waiting; the caller should retry shortly."""
+
+
+# --- Work done in the pool ---
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _cost(hashed: str) -> Optional[int]:
+    # "$2b$12$<salt+hash>"
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _verify(plain: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Check a password; on success also return a new hash if the cost factor changed."""
+    if not bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8")):
+        return False, None
+    if _cost(hashed) != rounds:
+        return True, _hash(plain, rounds)
+    return True, None
+
+
+# --- Pool ---
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0   # submitted and not finished (running + queued)
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+
+_stats = _Stats()
+
+# Wall time per operation as the caller sees it: waiting for a pool slot plus bcrypt
+HASH_SECONDS = metrics.Histogram(
+    "password_hash_duration_seconds", "bcrypt hash / verify time, including queueing", ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+metrics.Gauge("password_hash_in_flight", "bcrypt operations running or queued", source=lambda: _stats.in_flight)
+metrics.Counter("password_hash_rejected_total", "bcrypt operations turned away with a 503", source=lambda: _stats.rejected)
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the API process already runs threads
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _admit(n: int = 1):
+    with _stats.lock:
+        if _stats.in_flight + n > PASSWORD_HASH_QUEUE_LIMIT:
+            _stats.rejected += n
+            raise PasswordQueueFull()
+        _stats.in_flight += n
+
+
+def _done(n: int = 1):
+    with _stats.lock:
+        _stats.in_flight -= n
+        _stats.completed += n
+
+
+def _run(fn, *args):
+    _admit()
+    start = perf_counter()
+    try:
+        if PASSWORD_HASH_WORKERS <= 0:
+            return fn(*args)
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _done()
+        HASH_SECONDS.observe(perf_counter() - start, fn.__name__.lstrip("_"))
+
+
+def stats() -> dict:
+    """Queue depth and counters for this API worker's pool."""
+    with _stats.lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+            "in_flight": _stats.in_flight,
+            "queued": max(0, _stats.in_flight - PASSWORD_HASH_WORKERS),
+            "completed": _stats.completed,
+            "rejected": _stats.rejected,
+            "rehashed": _stats.rehashed,
+            "rounds": BCRYPT_ROUNDS,
+        }
+
+
+# --- Public API ---
+def hash_password(password: str) -> str:
+    return _run(_hash, password, BCRYPT_ROUNDS)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords (bulk imports).
+
+    Work is submitted one pool-width at a time, so a login arriving mid-import
+    waits behind at most one slice rather than the whole batch.
+    """
+    width = max(1, PASSWORD_HASH_WORKERS)
+    hashes: List[str] = []
+    for i in range(0, len(passwords), width):
+        chunk = passwords[i:i + width]
+        _admit(len(chunk))
+        start = perf_counter()
+        try:
+            if PASSWORD_HASH_WORKERS <= 0:
+                hashes.extend(_hash(p, BCRYPT_ROUNDS) for p in chunk)
+            else:
+                pool = _get_pool()
+                futures = [pool.submit(_hash, p, BCRYPT_ROUNDS) for p in chunk]
+                hashes.extend(f.result() for f in futures)
+        finally:
+            _done(len(chunk))
+            HASH_SECONDS.observe(perf_counter() - start, "bulk_hash")
+    return hashes
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return verify_and_update(plain, hashed)[0]
+
+
+def verify_and_update(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Like verify_password, plus a replacement hash when the stored one uses an old cost factor."""
+    ok, new_hash = _run(_verify, plain, hashed, BCRYPT_ROUNDS)
+    if new_hash is not None:
+        with _stats.lock:
+            _stats.rehashed += 1
+    return ok, new_hash
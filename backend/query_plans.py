@@ -0,0 +1,180 @@
+"""EXPLAIN QUERY PLAN check for the router queries.
+
+Drives every endpoint once against a throwaway SQLite database, then runs
+EXPLAIN QUERY PLAN for each SELECT/UPDATE/DELETE the routers issued and fails
+if any of them scans a whole table instead of searching an index.
+
+    python query_plans.py       # exit status 1 and a report on failure
+
+pytest runs it too (tests/test_query_checks.py).
+
+Needs httpx (requirements-dev.txt) for FastAPI's TestClient.
+"""
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from datetime import date, timedelta
+
+# The app opens ./attendance.db on import, so work inside a scratch directory
+os.chdir(tempfile.mkdtemp(prefix="query-plans-"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Only SQL is measured here; hash passwords inline instead of spawning a pool
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from database import Base, async_engine, engine  # noqa: E402
+import main  # noqa: E402
+
+CHECKED_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT INTO daily_attendance_summary")
+
+_route = None
+# (route, sql) -> parameters of the first execution
+_statements = OrderedDict()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if _route is None or executemany or not statement.lstrip().upper().startswith(CHECKED_PREFIXES):
+        return
+    _statements.setdefault((_route, statement), parameters)
+
+
+def _call(client, method, path, headers=None, **kwargs):
+    global _route
+    _route = f"{method} {path.split('?')[0]}"
+    try:
+        response = client.request(method, path, headers=headers, **kwargs)
+    finally:
+        _route = None
+    assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text}"
+    # Exports stream CSV / NDJSON; only JSON bodies are parsed
+    if response.content and response.headers.get("content-type", "").startswith("application/json"):
+        return response.json()
+    return None
+
+
+def run_scenario(client):
+    token = _call(client, "POST", "/api/auth/signup", json={
+        "name": "Admin", "email": "admin@plans.test", "password": "secret", "company_name": "Plans Inc",
+    })["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    depts = [_call(client, "POST", "/api/departments/", auth, json={"name": f"Dept {i}"})["id"] for i in range(2)]
+    students = [
+        _call(client, "POST", "/api/students/", auth, json={
+            "name": f"Member {i}", "roll_number": f"R{i:03d}", "department_id": depts[i % 2],
+        })["id"]
+        for i in range(6)
+    ]
+    employee = _call(client, "POST", "/api/employees/", auth, json={
+        "name": "Clerk", "email": "clerk@plans.test", "department_id": depts[0],
+    })
+
+    today = date.today()
+    for offset in range(3):
+        _call(client, "POST", "/api/attendance/", auth, json={
+            "date": str(today - timedelta(days=offset)),
+            "records": [{"student_id": s, "status": "present" if s % 2 else "absent"} for s in students],
+        })
+    _call(client, "POST", "/api/attendance/", auth, json={
+        "date": str(today), "department_id": depts[0],
+        "records": [{"student_id": students[0], "status": "present"}],
+    })
+    _call(client, "PATCH", "/api/attendance/", auth, json={
+        "date": str(today), "expected_version": 2,
+        "changes": [{"student_id": students[1], "status": "present"}, {"student_id": students[3], "status": None}],
+    })
+    _call(client, "GET", f"/api/attendance/?date={today}", auth)
+    _call(client, "GET", "/api/attendance/", auth)
+    page = _call(client, "GET", "/api/attendance/history?limit=4", auth)
+    _call(client, "GET", f"/api/attendance/history?limit=4&cursor={page['next_cursor']}", auth)
+    _call(client, "GET", f"/api/attendance/history?start={today - timedelta(days=1)}&end={today}"
+                         f"&department_id={depts[1]}&status=present", auth)
+    _call(client, "GET", f"/api/attendance/history?student_id={students[0]}", auth)
+    _call(client, "GET", "/api/attendance/export", auth)
+    _call(client, "GET", f"/api/attendance/export?format=ndjson&start={today - timedelta(days=1)}"
+                         f"&end={today}&department_id={depts[1]}&status=absent", auth)
+
+    _call(client, "GET", "/api/dashboard/stats", auth)
+    _call(client, "GET", f"/api/dashboard/stats?department_id={depts[0]}", auth)
+    _call(client, "GET", "/api/dashboard/weekly?days=30", auth)
+    _call(client, "GET", "/api/analytics/students", auth)
+    _call(client, "GET", f"/api/analytics/students?department_id={depts[0]}&sort=current_absence_streak"
+                         f"&order=desc&limit=2", auth)
+    _call(client, "GET", "/api/analytics/heatmap/month", auth)
+    _call(client, "GET", f"/api/analytics/heatmap/month?month={today:%Y-%m}&department_id={depts[0]}", auth)
+    _call(client, "GET", f"/api/analytics/heatmap/students/{students[0]}", auth)
+    _call(client, "GET", f"/api/analytics/heatmap/year?department_id={depts[0]}", auth)
+
+    page = _call(client, "GET", "/api/students/?limit=2", auth)
+    _call(client, "GET", f"/api/students/?limit=2&cursor={page['next_cursor']}", auth)
+    _call(client, "GET", "/api/students/?q=mem", auth)
+    _call(client, "GET", f"/api/students/?department_id={depts[0]}", auth)
+    _call(client, "PUT", f"/api/students/{students[2]}", auth, json={
+        "name": "Moved", "roll_number": "R002", "department_id": depts[1],
+    })
+    _call(client, "DELETE", f"/api/students/{students[4]}", auth)
+
+    _call(client, "POST", "/api/students/import", auth, files={"file": (
+        "roster.csv", "name,roll_number,department\nImported,R900,Dept 0\nDuplicate,R000,\n", "text/csv",
+    )})
+    _call(client, "POST", "/api/employees/import", auth, files={"file": (
+        "staff.json", f'[{{"name": "Temp", "email": "temp@plans.test", "department_id": {depts[1]}}}]',
+        "application/json",
+    )})
+
+    _call(client, "GET", "/api/departments/", auth)
+    _call(client, "PUT", f"/api/departments/{depts[0]}", auth, json={"name": "Renamed"})
+
+    _call(client, "GET", "/api/employees/", auth)
+    _call(client, "DELETE", f"/api/employees/{employee['id']}", auth)
+
+    _call(client, "GET", "/api/settings/", auth)
+    _call(client, "PUT", "/api/settings/", auth, json={"theme_id": "medical"})
+
+    _call(client, "POST", "/api/auth/login", json={
+        "email": "admin@plans.test", "password": "secret", "company_name": "Plans Inc",
+    })
+    _call(client, "GET", "/api/auth/me", auth)
+
+    _call(client, "DELETE", f"/api/departments/{depts[1]}", auth)
+
+
+def full_scans(sql, parameters):
+    """Return the plan lines that scan an application table without an index."""
+    tables = set(Base.metadata.tables)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    bad = []
+    for row in plan:
+        detail = row[-1]
+        words = detail.split()
+        if words[:1] == ["SCAN"] and len(words) > 1 and words[1] in tables:
+            bad.append(detail)
+    return bad
+
+
+def main_check() -> int:
+    if engine.dialect.name != "sqlite":
+        print("query_plans.py only understands SQLite plans")
+        return 2
+
+    with TestClient(main.app) as client:
+        run_scenario(client)
+
+    failures = 0
+    for (route, sql), parameters in _statements.items():
+        bad = full_scans(sql, parameters)
+        if bad:
+            failures += 1
+            print(f"FULL SCAN  {route}\n    {' '.join(sql.split())}\n    -> {'; '.join(bad)}\n")
+    checked = len(_statements)
+    print(f"{checked - failures}/{checked} router queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_check())
@@ -0,0 +1,123 @@
+"""Query-count scaling check for the API endpoints.
+
+Runs each endpoint for a small and a large tenant and fails if the number of
+SQL statements differs between them — the signature of a per-row (N+1) load.
+
+    python query_scaling.py       # exit status 1 and a report on failure
+
+pytest runs it too (tests/test_query_checks.py).
+
+Needs httpx (requirements-dev.txt) for FastAPI's TestClient.
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+# The app opens ./attendance.db on import, so work inside a scratch directory
+os.chdir(tempfile.mkdtemp(prefix="query-scaling-"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Only SQL is measured here; hash passwords inline instead of spawning a pool
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from auth import hash_password  # noqa: E402
+from database import SessionLocal, async_engine, engine  # noqa: E402
+from models import Department, Student, User, UserRole  # noqa: E402
+from querycount import QueryCounter  # noqa: E402
+import main  # noqa: E402
+
+SMALL, LARGE = 3, 40
+TODAY = date.today()
+
+
+def seed_tenant(client, name: str, size: int) -> dict:
+    """A company with `size` members and employees and three days of attendance."""
+    email = f"admin@{name}.test"
+    token = client.post("/api/auth/signup", json={
+        "name": "Admin", "email": email, "password": "secret", "company_name": name,
+    }).json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    db = SessionLocal()
+    company_id = db.query(User.company_id).filter(User.email == email).scalar()
+    # One department per member, so a per-row department load cannot hide in the identity map
+    depts = [Department(name=f"Dept {i}", company_id=company_id) for i in range(size)]
+    db.add_all(depts)
+    db.flush()
+    students = [
+        Student(name=f"Member {i}", roll_number=f"R{i:04d}", company_id=company_id,
+                department_id=depts[i].id)
+        for i in range(size)
+    ]
+    employee_hash = hash_password("secret")
+    db.add_all(students)
+    db.add_all(
+        User(name=f"Employee {i}", email=f"e{i}@{name}.test", hashed_password=employee_hash,
+             role=UserRole.employee, company_id=company_id, department_id=depts[i].id)
+        for i in range(size)
+    )
+    db.commit()
+    ids = [s.id for s in students]
+    db.close()
+
+    for offset in range(1, 4):
+        client.post("/api/attendance/", headers=auth, json={
+            "date": str(TODAY - timedelta(days=offset)),
+            "records": [{"student_id": s, "status": "present"} for s in ids],
+        })
+    return {"name": name, "email": email, "auth": auth, "ids": ids}
+
+
+def _mark_all(t, status, day):
+    return {"date": str(day), "records": [{"student_id": s, "status": status} for s in t["ids"]]}
+
+
+# (label, method, path, json body factory)
+ENDPOINTS = [
+    ("mark attendance", "POST", "/api/attendance/", lambda t: _mark_all(t, "present", TODAY)),
+    ("re-mark attendance", "POST", "/api/attendance/", lambda t: _mark_all(t, "absent", TODAY)),
+    ("apply changes", "PATCH", "/api/attendance/", lambda t: {
+        "date": str(TODAY), "changes": [{"student_id": s, "status": "present"} for s in t["ids"]],
+    }),
+    ("attendance by date", "GET", f"/api/attendance/?date={TODAY}", None),
+    ("attendance latest", "GET", "/api/attendance/", None),
+    ("attendance history", "GET", "/api/attendance/history?limit=1000", None),
+    ("attendance export", "GET", "/api/attendance/export", None),
+    ("students", "GET", "/api/students/?limit=1000", None),
+    ("departments", "GET", "/api/departments/", None),
+    ("employees", "GET", "/api/employees/", None),
+    ("dashboard stats", "GET", "/api/dashboard/stats", None),
+    ("dashboard weekly", "GET", "/api/dashboard/weekly?days=30", None),
+    ("student analytics", "GET", "/api/analytics/students", None),
+    ("month heatmap", "GET", "/api/analytics/heatmap/month", None),
+    ("year heatmap", "GET", "/api/analytics/heatmap/year", None),
+    ("settings", "GET", "/api/settings/", None),
+    ("me", "GET", "/api/auth/me", None),
+]
+
+
+def count_queries(client, tenant, method, path, body) -> int:
+    with QueryCounter(engine, async_engine.sync_engine) as counter:
+        response = client.request(method, path, headers=tenant["auth"], json=body(tenant) if body else None)
+    assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text}"
+    return counter.count
+
+
+def main_check() -> int:
+    failures = 0
+    with TestClient(main.app) as client:
+        small = seed_tenant(client, "small", SMALL)
+        large = seed_tenant(client, "large", LARGE)
+        for label, method, path, body in ENDPOINTS:
+            few = count_queries(client, small, method, path, body)
+            many = count_queries(client, large, method, path, body)
+            ok = few == many
+            failures += not ok
+            print(f"{'ok   ' if ok else 'GROWS'} {label:<22} {few:>3} queries @ {SMALL} rows, {many:>3} @ {LARGE}")
+    print(f"{len(ENDPOINTS) - failures}/{len(ENDPOINTS)} endpoints have a constant query count")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_check())
@@ -0,0 +1,29 @@
+"""Count the SQL statements engines execute — for spotting N+1 queries.
+
+    with QueryCounter(engine, async_engine.sync_engine) as counter:
+        client.get("/api/students/")
+    assert counter.count <= 3, counter.statements
+"""
+from typing import List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self, *engines: Engine):
+        self.engines = engines
+        self.count = 0
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
@@ -0,0 +1,127 @@
+"""Per-company cache of serialized JSON responses for frequently polled endpoints.
+
+Entries are keyed by company, scope and the request's parameters, plus a
+generation counter per (company, scope). Writers call invalidate() after they
+commit, which bumps the generation: every older entry becomes unreachable at
+once, and a reader that loaded data before the commit stores it under the old
+generation, where nobody looks any more.
+
+The backend only needs ``get``, ``set(name, value, ex=seconds)`` and ``incr`` —
+the redis-py subset — so setting RESPONSE_CACHE_URL=redis://... shares the
+cache (and invalidations) between workers. Without it each worker keeps its own
+in-process cache, and a write made through another worker shows up after at
+most RESPONSE_CACHE_TTL_SECONDS.
+"""
+import itertools
+import json
+import os
+import threading
+from typing import Any, Hashable, Optional, Protocol, Tuple
+from dotenv import load_dotenv
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from cache import TTLCache
+import metrics
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+
+# Scopes: a write invalidates every cached response in the scopes it affects
+DASHBOARD = "dashboard"
+SETTINGS = "settings"
+
+
+class CacheBackend(Protocol):
+    def get(self, name: str) -> Optional[bytes]: ...
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None) -> Any: ...
+
+    def incr(self, name: str) -> int: ...
+
+
+class MemoryBackend:
+    """In-process backend: one bounded LRU holds the entries and the generation counters.
+
+    A counter is read before every entry it guards and expires with them, so
+    eviction drops the stale entries first. Counter values come from a single
+    sequence: a counter that was dropped comes back at a value no entry uses.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self._entries = TTLCache(maxsize=maxsize, ttl=RESPONSE_CACHE_TTL_SECONDS)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        return self._entries.get(name)
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None):
+        self._entries.set(name, value, ttl=ex)
+
+    def incr(self, name: str) -> int:
+        with self._lock:
+            value = next(self._sequence)
+            self._entries.set(name, str(value).encode())
+            return value
+
+
+def _make_backend() -> CacheBackend:
+    if not RESPONSE_CACHE_URL:
+        return MemoryBackend()
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("RESPONSE_CACHE_URL is set but the redis package is not installed")
+    return redis.Redis.from_url(RESPONSE_CACHE_URL)
+
+
+backend: CacheBackend = _make_backend()
+
+
+class _Stats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+_stats = _Stats()
+
+
+metrics.Counter("response_cache_hits_total", "Cached responses served", source=lambda: _stats.hits)
+metrics.Counter("response_cache_misses_total", "Cacheable requests that missed", source=lambda: _stats.misses)
+
+
+def stats() -> dict:
+    return {"hits": _stats.hits, "misses": _stats.misses}
+
+
+def _generation_key(company_id: int, scope: str) -> str:
+    return f"rc:gen:{company_id}:{scope}"
+
+
+def lookup(company_id: int, scope: str, *params: Hashable) -> Tuple[str, Optional[Response]]:
+    """Return (key, cached response or None). Pass the key to store() on a miss."""
+    generation = int(backend.get(_generation_key(company_id, scope)) or 0)
+    key = f"rc:{company_id}:{scope}:{generation}:" + ":".join(map(str, params))
+    body = backend.get(key)
+    if body is None:
+        _stats.misses += 1
+        return key, None
+    _stats.hits += 1
+    return key, Response(content=body, media_type="application/json")
+
+
+def store(key: str, data: Any) -> Response:
+    """Serialize a response model (or list of them), cache it and return it as a response."""
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode()
+    backend.set(key, body, ex=RESPONSE_CACHE_TTL_SECONDS)
+    return Response(content=body, media_type="application/json")
+
+
+def invalidate(company_id: int, *scopes: str):
+    """Call after committing a write that changes what the scopes' endpoints return."""
+    for scope in scopes:
+        backend.incr(_generation_key(company_id, scope))
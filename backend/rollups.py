@@ -0,0 +1,233 @@
+"""Maintenance of the attendance rollups.
+
+daily_attendance_summary holds counts per (department, date): writers describe
+count changes with a SummaryDelta and apply it inside their own transaction.
+attendance_months holds each member's month as present/absent bitmaps: writers
+call apply_day_bits for the date they changed. rebuild_summary() and
+rebuild_month_bits() recompute the tables from raw attendance; rows for dates
+already moved to the archive (see archive.py) are kept as they are.
+
+    python rollups.py [--company-id ID]    # backfill / repair
+"""
+import argparse
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, case, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import (
+    Attendance, AttendanceArchive, AttendanceMonth, AttendanceStatus, DailyAttendanceSummary, Student,
+)
+import archive
+
+# Rows per multi-row INSERT into attendance_months
+MONTH_CHUNK_SIZE = 1000
+
+
+class SummaryDelta:
+    """Accumulates present/absent count changes per (department, date) bucket."""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[Optional[int], date], List[int]] = defaultdict(lambda: [0, 0])
+
+    def add(self, department_id: Optional[int], day: date, status, n: int = 1):
+        self._counts[(department_id, day)][0 if status == AttendanceStatus.present else 1] += n
+
+    def remove(self, department_id: Optional[int], day: date, status, n: int = 1):
+        self.add(department_id, day, status, -n)
+
+    def add_student_history(
+        self, db: Session, company_id: int, student_id: int, department_id: Optional[int], sign: int = 1,
+    ):
+        """Add (or with sign=-1, remove) all of a student's marks, archived ones too, to a department's buckets."""
+        rows = (
+            db.query(Attendance.date, Attendance.status, func.count(Attendance.id))
+            .filter(Attendance.student_id == student_id)
+            .group_by(Attendance.date, Attendance.status)
+        )
+        for day, status, n in rows:
+            self.add(department_id, day, status, sign * n)
+        archived_before = archive.archived_before(db, company_id)
+        if archived_before is not None:
+            for (day, status), n in archive.student_history(company_id, student_id, archived_before).items():
+                self.add(department_id, day, status, sign * n)
+
+    def apply(self, db: Session, company_id: int) -> Dict[Tuple[Optional[int], date], List[int]]:
+        """Merge the accumulated changes into the summary within the caller's transaction.
+
+        Counts are incremented in SQL, so concurrent writers cannot lose each other's
+        updates; a bucket that happens to be inserted twice still sums correctly.
+        Returns the non-zero [present, absent] changes per (department, date).
+        """
+        deltas = {key: c for key, c in self._counts.items() if c[0] or c[1]}
+        self._counts.clear()
+        if not deltas:
+            return deltas
+        summary = DailyAttendanceSummary.__table__
+        existing = {
+            (department_id, day): row_id
+            for row_id, department_id, day in db.query(
+                DailyAttendanceSummary.id, DailyAttendanceSummary.department_id, DailyAttendanceSummary.date
+            ).filter(
+                DailyAttendanceSummary.company_id == company_id,
+                DailyAttendanceSummary.date.in_({day for _, day in deltas}),
+            )
+        }
+        updates, inserts = [], []
+        for (department_id, day), (present, absent) in deltas.items():
+            row_id = existing.get((department_id, day))
+            if row_id is not None:
+                updates.append({"row_id": row_id, "d_present": present, "d_absent": absent})
+            else:
+                inserts.append({
+                    "company_id": company_id, "department_id": department_id, "date": day,
+                    "present": present, "absent": absent, "total": present + absent,
+                })
+        if updates:
+            db.execute(
+                update(summary)
+                .where(summary.c.id == bindparam("row_id"))
+                .values(
+                    present=summary.c.present + bindparam("d_present"),
+                    absent=summary.c.absent + bindparam("d_absent"),
+                    total=summary.c.total + bindparam("d_present") + bindparam("d_absent"),
+                ),
+                updates,
+            )
+        if inserts:
+            db.execute(insert(summary), inserts)
+        return deltas
+
+
+def _not_archived(company_id_column, date_column):
+    """Dates a rebuild may recompute: those at or after the company's archive cutoff."""
+    archived_before = (
+        select(AttendanceArchive.archived_before)
+        .where(AttendanceArchive.company_id == company_id_column)
+        .scalar_subquery()
+    )
+    return or_(archived_before.is_(None), date_column >= archived_before)
+
+
+def rebuild_summary(db: Session, company_id: Optional[int] = None) -> int:
+    """Recompute the rollup from raw attendance rows; returns the number of summary rows."""
+    purge = db.query(DailyAttendanceSummary).filter(
+        _not_archived(DailyAttendanceSummary.company_id, DailyAttendanceSummary.date)
+    )
+    if company_id is not None:
+        purge = purge.filter(DailyAttendanceSummary.company_id == company_id)
+    purge.delete(synchronize_session=False)
+
+    present = func.sum(case((Attendance.status == AttendanceStatus.present, 1), else_=0))
+    absent = func.sum(case((Attendance.status == AttendanceStatus.absent, 1), else_=0))
+    source = (
+        select(Attendance.company_id, Student.department_id, Attendance.date, present, absent, func.count(Attendance.id))
+        .join(Student, Student.id == Attendance.student_id)
+        .where(_not_archived(Attendance.company_id, Attendance.date))
+        .group_by(Attendance.company_id, Student.department_id, Attendance.date)
+    )
+    if company_id is not None:
+        source = source.where(Attendance.company_id == company_id)
+    result = db.execute(
+        insert(DailyAttendanceSummary).from_select(
+            ["company_id", "department_id", "date", "present", "absent", "total"], source
+        )
+    )
+    return result.rowcount
+
+
+def day_bit(day: date) -> int:
+    return 1 << (day.day - 1)
+
+
+def apply_day_bits(
+    db: Session,
+    company_id: int,
+    day: date,
+    changed: Dict[int, AttendanceStatus],
+    removed: Iterable[int] = (),
+):
+    """Set one day's bit in each member's month row, within the caller's transaction.
+
+    ``changed`` maps student_id to its new status; ``removed`` student_ids have their
+    mark cleared. Bits are merged in SQL (clear the day, then OR the new bit), so
+    concurrent writers to other days of the same month do not overwrite each other.
+    """
+    bit = day_bit(day)
+    month = day.replace(day=1)
+    rows = [
+        {
+            "company_id": company_id, "student_id": sid, "month": month,
+            "present_bits": bit if st == AttendanceStatus.present else 0,
+            "absent_bits": bit if st == AttendanceStatus.absent else 0,
+        }
+        for sid, st in [*changed.items(), *((sid, None) for sid in removed)]
+    ]
+    months = AttendanceMonth.__table__
+    keep = ~bit  # every other day's bits
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for i in range(0, len(rows), MONTH_CHUNK_SIZE):
+        stmt = dialect.insert(months).values(rows[i:i + MONTH_CHUNK_SIZE])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["student_id", "month"],
+            set_={
+                "present_bits": months.c.present_bits.bitwise_and(keep).bitwise_or(stmt.excluded.present_bits),
+                "absent_bits": months.c.absent_bits.bitwise_and(keep).bitwise_or(stmt.excluded.absent_bits),
+            },
+        ))
+
+
+def rebuild_month_bits(db: Session, company_id: Optional[int] = None) -> int:
+    """Recompute attendance_months from raw attendance rows; returns the number of rows."""
+    purge = db.query(AttendanceMonth).filter(_not_archived(AttendanceMonth.company_id, AttendanceMonth.month))
+    if company_id is not None:
+        purge = purge.filter(AttendanceMonth.company_id == company_id)
+    purge.delete(synchronize_session=False)
+
+    # Month truncation differs per database, so fold the days in Python while streaming
+    source = select(Attendance.company_id, Attendance.student_id, Attendance.date, Attendance.status).where(
+        _not_archived(Attendance.company_id, Attendance.date)
+    )
+    if company_id is not None:
+        source = source.where(Attendance.company_id == company_id)
+    bits: Dict[Tuple[int, int, date], List[int]] = defaultdict(lambda: [0, 0])
+    for cid, sid, day, status in db.execute(source.execution_options(yield_per=10_000)):
+        bits[(cid, sid, day.replace(day=1))][0 if status == AttendanceStatus.present else 1] |= day_bit(day)
+
+    rows = [
+        {"company_id": cid, "student_id": sid, "month": month, "present_bits": p, "absent_bits": a}
+        for (cid, sid, month), (p, a) in bits.items()
+    ]
+    for i in range(0, len(rows), MONTH_CHUNK_SIZE):
+        db.execute(insert(AttendanceMonth), rows[i:i + MONTH_CHUNK_SIZE])
+    return len(rows)
+
+
+def main():
+    from database import SHARDED, SessionLocal, company_scope, engine
+    from migrations import upgrade_primary
+    import tenants
+
+    parser = argparse.ArgumentParser(description="Rebuild the attendance rollups from raw attendance")
+    parser.add_argument("--company-id", type=int, default=None, help="only rebuild this company")
+    args = parser.parse_args()
+
+    upgrade_primary(engine)
+    # With one database per company, rebuild each one in turn
+    company_ids = tenants.company_ids() if SHARDED and args.company_id is None else [args.company_id]
+    count = months = 0
+    for company_id in company_ids:
+        with company_scope(company_id):
+            db = SessionLocal()
+            try:
+                count += rebuild_summary(db, company_id)
+                months += rebuild_month_bits(db, company_id)
+                db.commit()
+            finally:
+                db.close()
+    print(f"Rebuilt {count} summary rows and {months} month bitmap rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import calendar
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import AttendanceMonth, Student
+from schemas import MonthBits, MonthHeatmap, StudentAnalytics, StudentYearHeatmap, YearHeatmap
+from auth import get_current_user, Principal
+from aggregates import MEMBER_STATS_SORTS, daily_counts, member_stats
+import archive
+from datetime import date, timedelta
+from typing import List, Optional
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366  # cost grows with the number of marks in the range
+
+
+@router.get("/students", response_model=List[StudentAnalytics])
+async def get_student_analytics(
+    start: Optional[date] = Query(default=None, description=f"Defaults to {DEFAULT_RANGE_DAYS} days before end"),
+    end: Optional[date] = Query(default=None, description="Defaults to today"),
+    department_id: Optional[int] = Query(default=None),
+    sort: str = Query(default="attendance_rate", pattern=f"^({'|'.join(MEMBER_STATS_SORTS)})$"),
+    order: str = Query(default="asc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(default=None, ge=1),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Attendance rate, absence streaks and last-seen date per member.
+
+    Sort by attendance_rate ascending or current_absence_streak descending to
+    surface chronic absentees.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+    company_id = current_user.company_id
+    archived = []
+    cutoff = await db.run_sync(archive.archived_before, company_id)
+    if cutoff is not None and start < cutoff:
+        archived = await anyio.to_thread.run_sync(archive.read_all, company_id, cutoff, start, end)
+    stats = await db.run_sync(
+        member_stats, company_id, start, end, department_id, sort, order == "desc", limit, archived,
+    )
+    return [StudentAnalytics(**s._asdict()) for s in stats]
+
+
+# Heatmaps read the attendance_months bitmaps (see rollups.py) rather than raw marks
+
+@router.get("/heatmap/month", response_model=MonthHeatmap)
+async def get_month_heatmap(
+    month: Optional[str] = Query(default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="YYYY-MM, default this month"),
+    department_id: Optional[int] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Every member's month as present/absent bitmaps, in one indexed read."""
+    first = date.fromisoformat(f"{month}-01") if month else date.today().replace(day=1)
+    stmt = (
+        select(AttendanceMonth.student_id, AttendanceMonth.present_bits, AttendanceMonth.absent_bits)
+        .where(AttendanceMonth.company_id == current_user.company_id, AttendanceMonth.month == first)
+        .order_by(AttendanceMonth.student_id)
+    )
+    if department_id is not None:
+        stmt = stmt.join(Student, Student.id == AttendanceMonth.student_id).where(
+            Student.department_id == department_id
+        )
+    rows = (await db.execute(stmt)).all()
+    return MonthHeatmap(
+        month=first,
+        days=calendar.monthrange(first.year, first.month)[1],
+        student_ids=[r[0] for r in rows],
+        present_bits=[r[1] for r in rows],
+        absent_bits=[r[2] for r in rows],
+    )
+
+
+@router.get("/heatmap/students/{student_id}", response_model=StudentYearHeatmap)
+async def get_student_year_heatmap(
+    student_id: int,
+    year: Optional[int] = Query(default=None, ge=1900, le=9999, description="Default this year"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    year = year or date.today().year
+    found = await db.scalar(
+        select(Student.id).where(Student.id == student_id, Student.company_id == current_user.company_id)
+    )
+    if found is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    rows = await db.execute(
+        select(AttendanceMonth.month, AttendanceMonth.present_bits, AttendanceMonth.absent_bits)
+        .where(
+            AttendanceMonth.company_id == current_user.company_id,
+            AttendanceMonth.student_id == student_id,
+            AttendanceMonth.month >= date(year, 1, 1),
+            AttendanceMonth.month <= date(year, 12, 1),
+        )
+        .order_by(AttendanceMonth.month)
+    )
+    return StudentYearHeatmap(
+        student_id=student_id,
+        year=year,
+        months=[MonthBits(month=m, present_bits=p, absent_bits=a) for m, p, a in rows],
+    )
+
+
+@router.get("/heatmap/year", response_model=YearHeatmap)
+async def get_year_heatmap(
+    year: Optional[int] = Query(default=None, ge=1900, le=9999, description="Default this year"),
+    department_id: Optional[int] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Per-day present/absent counts for a year, for the company or one department."""
+    year = year or date.today().year
+    counts = await db.run_sync(
+        daily_counts, current_user.company_id, date(year, 1, 1), date(year, 12, 31), department_id,
+    )
+    return YearHeatmap(
+        year=year,
+        department_id=department_id,
+        present=[c.present for c in counts],
+        absent=[c.absent for c in counts],
+    )
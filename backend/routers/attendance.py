@@ -1,10 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import csv
+import io
+import json
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Attendance, Student, User
-from schemas import AttendanceBulkCreate, AttendanceResponse, StudentResponse
-from auth import get_current_user
-from typing import List, Optional
+from database import AsyncSessionLocal, get_async_db, get_async_write_db
+from models import Attendance, AttendanceSheet, AttendanceStatus, Department, Student
+from schemas import (
+    AttendanceBulkCreate,
+    AttendanceChangeResult,
+    AttendanceChangeSet,
+    AttendancePage,
+    AttendanceResponse,
+    StudentResponse,
+)
+from auth import get_current_user, Principal
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from rollups import SummaryDelta, apply_day_bits
+import archive
+import etags
+import events
+import response_cache
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
 from datetime import date
 
 router = APIRouter(prefix="/api/attendance", tags=["attendance"])
@@ -24,96 +46,516 @@ def _student_resp(s):
     )
 
 
-@router.post("/", response_model=List[AttendanceResponse], status_code=201)
-def mark_attendance(
-    payload: AttendanceBulkCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    company_id = current_user.company_id
+# Rows per multi-row INSERT; 4 bound params each keeps us well under SQLite's variable limit
+UPSERT_CHUNK_SIZE = 1000
 
-    # Delete existing records for that date within this company
-    db.query(Attendance).filter(
-        Attendance.date == payload.date,
-        Attendance.company_id == company_id,
-    ).delete()
-    db.commit()
-
-    records = []
-    for rec in payload.records:
-        student = (
-            db.query(Student)
-            .filter(Student.id == rec.student_id, Student.company_id == company_id)
-            .first()
-        )
+# Carries the sheet version so clients can send it back as expected_version
+VERSION_HEADER = "X-Attendance-Version"
+
+
+def _upsert_stmt(db: Session, rows: List[dict]):
+    """Multi-row INSERT ... ON CONFLICT (company_id, student_id, date) DO UPDATE."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(Attendance).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["company_id", "student_id", "date"],
+        set_={"status": stmt.excluded.status},
+    ).returning(Attendance.id, Attendance.student_id)
+
+
+def _load_students(db: Session, company_id: int, student_ids, department_id: Optional[int]) -> Dict[int, Student]:
+    """Fetch and validate every referenced student in one query."""
+    if not student_ids:
+        return {}
+    students = {
+        s.id: s
+        for s in db.query(Student)
+        .filter(Student.company_id == company_id, Student.id.in_(student_ids))
+        .all()
+    }
+    for student_id in student_ids:
+        student = students.get(student_id)
         if not student:
-            raise HTTPException(status_code=404, detail=f"Student {rec.student_id} not found")
-        att = Attendance(
-            student_id=rec.student_id,
+            raise HTTPException(status_code=404, detail=f"Student {student_id} not found")
+        if department_id is not None and student.department_id != department_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Student {student_id} is not in department {department_id}",
+            )
+    return students
+
+
+class _Mark(NamedTuple):
+    id: int
+    status: AttendanceStatus
+    department_id: Optional[int]
+
+
+def _existing_marks(
+    db: Session,
+    company_id: int,
+    day: date,
+    student_ids=None,
+    department_id: Optional[int] = None,
+) -> Dict[int, _Mark]:
+    """Current marks for a date, keyed by student_id."""
+    query = (
+        db.query(Attendance.student_id, Attendance.id, Attendance.status, Student.department_id)
+        .join(Student, Student.id == Attendance.student_id)
+        .filter(Attendance.company_id == company_id, Attendance.date == day)
+    )
+    if department_id is not None:
+        query = query.filter(Student.department_id == department_id)
+    if student_ids is not None:
+        query = query.filter(Attendance.student_id.in_(student_ids))
+    return {student_id: _Mark(*mark) for student_id, *mark in query}
+
+
+def _sheet_version(db: Session, company_id: int, day: date) -> int:
+    version = (
+        db.query(AttendanceSheet.version)
+        .filter(AttendanceSheet.company_id == company_id, AttendanceSheet.date == day)
+        .scalar()
+    )
+    return version or 0
+
+
+def _version_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Attendance for this date was changed by someone else — reload and try again",
+    )
+
+
+def _bump_version(db: Session, company_id: int, day: date, expected_version: Optional[int]) -> int:
+    """Atomically advance the sheet version, enforcing expected_version when given."""
+    stmt = (
+        update(AttendanceSheet)
+        .where(AttendanceSheet.company_id == company_id, AttendanceSheet.date == day)
+        .values(version=AttendanceSheet.version + 1)
+        .returning(AttendanceSheet.version)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(AttendanceSheet.version == expected_version)
+    version = db.execute(stmt).scalar()
+    if version is not None:
+        return version
+
+    # No matching row: either the sheet was never saved, or the version moved on
+    if expected_version:
+        raise _version_conflict()
+    try:
+        with db.begin_nested():
+            db.add(AttendanceSheet(company_id=company_id, date=day, version=1))
+    except IntegrityError:
+        # A concurrent first save created the sheet (committed, or the insert would have waited)
+        if expected_version is not None:
+            raise _version_conflict()
+        # An unconditional save simply goes after it
+        return db.execute(stmt).scalar()
+    return 1
+
+
+def _apply_marks(
+    db: Session,
+    company_id: int,
+    day: date,
+    students: Dict[int, Student],
+    existing: Dict[int, _Mark],
+    changed: Dict[int, AttendanceStatus],
+    removed: List[int],
+    expected_version: Optional[int],
+) -> Tuple[Dict[int, int], int, dict]:
+    """Write only the marks that differ and keep the rollups in step.
+
+    ``changed`` maps student_id to its new status, ``removed`` lists student_ids whose
+    mark is cleared. Returns ({student_id: attendance_id}, sheet version, the rollup
+    count changes per (department, date)).
+    """
+    if not changed and not removed:
+        version = _sheet_version(db, company_id, day)
+        if expected_version is not None and expected_version != version:
+            raise _version_conflict()
+        return {}, version, {}
+
+    version = _bump_version(db, company_id, day, expected_version)
+
+    delta = SummaryDelta()
+    for sid in removed:
+        delta.remove(existing[sid].department_id, day, existing[sid].status)
+    for sid, st in changed.items():
+        if sid in existing:
+            delta.remove(existing[sid].department_id, day, existing[sid].status)
+        delta.add(students[sid].department_id, day, st)
+    counts = delta.apply(db, company_id)
+    apply_day_bits(db, company_id, day, changed, removed)
+
+    if removed:
+        db.query(Attendance).filter(
+            Attendance.id.in_([existing[sid].id for sid in removed])
+        ).delete(synchronize_session=False)
+
+    ids = {}
+    rows = [
+        {"student_id": sid, "date": day, "status": st, "company_id": company_id}
+        for sid, st in changed.items()
+    ]
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[i:i + UPSERT_CHUNK_SIZE]
+        ids.update((sid, att_id) for att_id, sid in db.execute(_upsert_stmt(db, chunk)))
+    return ids, version, counts
+
+
+def _overwrite_marks(
+    db: Session, company_id: int, payload: AttendanceBulkCreate
+) -> Tuple[List[AttendanceResponse], int, dict]:
+    archive.check_writable(db, company_id, payload.date)
+    # Last status wins if a student appears twice in the payload
+    statuses = {rec.student_id: rec.status for rec in payload.records}
+    students = _load_students(db, company_id, statuses, payload.department_id)
+
+    # Re-submitting overwrites the date (or just the given department's part of it);
+    # rows whose status is unchanged are left alone
+    existing = _existing_marks(db, company_id, payload.date, department_id=payload.department_id)
+    changed = {
+        sid: st for sid, st in statuses.items()
+        if sid not in existing or existing[sid].status != st
+    }
+    removed = [sid for sid in existing if sid not in statuses]
+    ids = {sid: mark.id for sid, mark in existing.items()}
+    written, version, counts = _apply_marks(
+        db, company_id, payload.date, students, existing, changed, removed,
+        payload.expected_version,
+    )
+    ids.update(written)
+
+    result = [
+        AttendanceResponse(
+            id=ids[sid],
+            student_id=sid,
             date=payload.date,
-            status=rec.status,
-            company_id=company_id,
+            status=st,
+            student=_student_resp(students[sid]),
         )
-        db.add(att)
-        records.append(att)
+        for sid, st in statuses.items()
+    ]
+    return result, version, counts
+
+
+def _change_marks(db: Session, company_id: int, payload: AttendanceChangeSet) -> Tuple[AttendanceChangeResult, dict]:
+    archive.check_writable(db, company_id, payload.date)
+    statuses = {c.student_id: c.status for c in payload.changes}
+    students = _load_students(db, company_id, statuses, payload.department_id)
+
+    existing = _existing_marks(db, company_id, payload.date, student_ids=list(statuses))
+    changed = {
+        sid: st for sid, st in statuses.items()
+        if st is not None and (sid not in existing or existing[sid].status != st)
+    }
+    removed = [sid for sid, st in statuses.items() if st is None and sid in existing]
+    _, version, counts = _apply_marks(
+        db, company_id, payload.date, students, existing, changed, removed,
+        payload.expected_version,
+    )
+    return AttendanceChangeResult(
+        date=payload.date,
+        version=version,
+        updated=len(changed),
+        removed=len(removed),
+    ), counts
+
+
+# The write endpoints are async; the diff-and-upsert logic above is shared sync
+# ORM code, run on the async session's connection through run_sync.
 
-    db.commit()
-    for r in records:
-        db.refresh(r)
+@router.post("/", response_model=List[AttendanceResponse], status_code=201)
+async def mark_attendance(
+    payload: AttendanceBulkCreate,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_write_db),
+):
+    result, version, counts = await db.run_sync(_overwrite_marks, current_user.company_id, payload)
+    await db.commit()
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    if counts:
+        events.publish(current_user.company_id, events.attendance_event(counts, payload.date, version))
+    response.headers[VERSION_HEADER] = str(version)
+    return result
+
+
+@router.patch("/", response_model=AttendanceChangeResult)
+async def apply_attendance_changes(
+    payload: AttendanceChangeSet,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_write_db),
+):
+    """Apply only the edited marks for a date; a null status clears that student's mark."""
+    result, counts = await db.run_sync(_change_marks, current_user.company_id, payload)
+    await db.commit()
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    if counts:
+        events.publish(current_user.company_id, events.attendance_event(counts, payload.date, result.version))
+    response.headers[VERSION_HEADER] = str(result.version)
+    return result
 
+
+def _attendance_resp(r: Attendance) -> AttendanceResponse:
+    return AttendanceResponse(
+        id=r.id,
+        student_id=r.student_id,
+        date=r.date,
+        status=r.status,
+        student=_student_resp(r.student),
+    )
+
+
+# Marks before the company's archive cutoff are read from its archive files (see
+# archive.py); file reads run on a worker thread, member details come from one query
+
+async def _archived_responses(
+    db: AsyncSession, company_id: int, marks: List[archive.ArchivedMark]
+) -> List[AttendanceResponse]:
+    ids = {m.student_id for m in marks}
+    students = {
+        s.id: s for s in await db.scalars(
+            select(Student).where(Student.company_id == company_id, Student.id.in_(ids))
+        )
+    } if ids else {}
+    # A member deleted meanwhile has their archived marks purged right after; skip them
     return [
         AttendanceResponse(
-            id=r.id,
-            student_id=r.student_id,
-            date=r.date,
-            status=r.status,
-            student=_student_resp(r.student),
+            id=m.id, student_id=m.student_id, date=m.date, status=m.status,
+            student=_student_resp(students[m.student_id]),
         )
-        for r in records
+        for m in marks if m.student_id in students
     ]
 
 
+async def _department_student_ids(db: AsyncSession, company_id: int, department_id: int) -> List[int]:
+    return list(await db.scalars(
+        select(Student.id).where(Student.company_id == company_id, Student.department_id == department_id)
+    ))
+
+
+def _sheet_etag(db: Session, company_id: int, day: date) -> Tuple[int, str]:
+    """(sheet version, ETag) for a date; the marks embed member and department details."""
+    version = _sheet_version(db, company_id, day)
+    return version, etags.current(db, company_id, etags.STUDENTS, etags.DEPARTMENTS, extra=(day, version))
+
+
 @router.get("/", response_model=List[AttendanceResponse])
-def get_attendance_by_date(
+async def get_attendance_by_date(
+    request: Request,
+    response: Response,
     date: Optional[date] = Query(default=None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    query = db.query(Attendance).filter(Attendance.company_id == current_user.company_id)
+    """Marks for one date. Without a date, only the most recent page is returned — use /history to page."""
+    company_id = current_user.company_id
+    stmt = (
+        select(Attendance)
+        .where(Attendance.company_id == company_id)
+        .order_by(Attendance.date.desc(), Attendance.id.desc())
+    )
     if date:
-        query = query.filter(Attendance.date == date)
-    records = query.order_by(Attendance.date.desc()).all()
-    return [
-        AttendanceResponse(
-            id=r.id,
-            student_id=r.student_id,
-            date=r.date,
-            status=r.status,
-            student=_student_resp(r.student),
+        version, etag = await db.run_sync(_sheet_etag, company_id, date)
+        not_modified = etags.not_modified(request, etag)
+        if not_modified is not None:
+            not_modified.headers[VERSION_HEADER] = str(version)
+            return not_modified
+        etags.tag(response, etag)
+        response.headers[VERSION_HEADER] = str(version)
+        stmt = stmt.where(Attendance.date == date)
+    else:
+        stmt = stmt.limit(DEFAULT_PAGE_SIZE)
+    records = [_attendance_resp(r) for r in await db.scalars(stmt)]
+
+    cutoff = await db.run_sync(archive.archived_before, company_id)
+    if cutoff is not None and date and date < cutoff:
+        marks = await anyio.to_thread.run_sync(archive.marks_on, company_id, date)
+        records += await _archived_responses(db, company_id, marks)
+    elif cutoff is not None and not date and len(records) < DEFAULT_PAGE_SIZE:
+        marks = await anyio.to_thread.run_sync(
+            archive.page, company_id, cutoff, DEFAULT_PAGE_SIZE - len(records)
         )
-        for r in records
-    ]
+        records += await _archived_responses(db, company_id, marks)
+    return records
 
 
-@router.get("/history", response_model=List[AttendanceResponse])
-def get_attendance_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+@router.get("/history", response_model=AttendancePage)
+async def get_attendance_history(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None),
+    start: Optional[date] = Query(default=None),
+    end: Optional[date] = Query(default=None),
+    department_id: Optional[int] = Query(default=None),
+    student_id: Optional[int] = Query(default=None),
+    status: Optional[AttendanceStatus] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    records = (
-        db.query(Attendance)
-        .filter(Attendance.company_id == current_user.company_id)
-        .order_by(Attendance.date.desc())
-        .limit(200)
-        .all()
-    )
-    return [
-        AttendanceResponse(
-            id=r.id,
-            student_id=r.student_id,
-            date=r.date,
-            status=r.status,
-            student=_student_resp(r.student),
+    """Newest-first attendance, keyset-paginated on (date, id); pages continue into the archive."""
+    company_id = current_user.company_id
+    # Marks before the cutoff are read from the archive only, after every hot page
+    cutoff = await db.run_sync(archive.archived_before, company_id)
+    stmt = select(Attendance).where(Attendance.company_id == company_id)
+    if cutoff is not None:
+        stmt = stmt.where(Attendance.date >= cutoff)
+    if start:
+        stmt = stmt.where(Attendance.date >= start)
+    if end:
+        stmt = stmt.where(Attendance.date <= end)
+    if department_id is not None:
+        stmt = stmt.join(Student, Student.id == Attendance.student_id).where(
+            Student.department_id == department_id
         )
-        for r in records
-    ]
+    if student_id is not None:
+        stmt = stmt.where(Attendance.student_id == student_id)
+    if status is not None:
+        stmt = stmt.where(Attendance.status == status)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, (date.fromisoformat, int))
+        stmt = stmt.where(tuple_(Attendance.date, Attendance.id) < after)
+
+    # Fetch one extra row to learn whether another page exists
+    items = [_attendance_resp(r) for r in await db.scalars(
+        stmt.order_by(Attendance.date.desc(), Attendance.id.desc()).limit(limit + 1)
+    )]
+    if len(items) <= limit:
+        if cutoff is not None and (start is None or start < cutoff):
+            student_ids = None
+            if department_id is not None:
+                student_ids = await _department_student_ids(db, company_id, department_id)
+            if student_id is not None:
+                student_ids = [student_id] if student_ids is None or student_id in student_ids else []
+            marks = await anyio.to_thread.run_sync(
+                lambda: archive.page(
+                    company_id, cutoff, limit + 1 - len(items), after, start, end, student_ids, status,
+                )
+            )
+            items += await _archived_responses(db, company_id, marks)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].date, items[-1].id)
+    return AttendancePage(items=items, next_cursor=next_cursor)
+
+
+# Rows fetched per round trip while exporting; also the unit written to the response
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ("date", "student_id", "name", "roll_number", "department", "status")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def _export_stmt(
+    company_id: int,
+    start: Optional[date],
+    end: Optional[date],
+    department_id: Optional[int],
+    status: Optional[AttendanceStatus],
+):
+    stmt = (
+        select(
+            Attendance.date, Attendance.student_id, Student.name, Student.roll_number,
+            Department.name, Attendance.status,
+        )
+        .join(Student, Student.id == Attendance.student_id)
+        .outerjoin(Department, Department.id == Student.department_id)
+        .where(Attendance.company_id == company_id)
+    )
+    if start:
+        stmt = stmt.where(Attendance.date >= start)
+    if end:
+        stmt = stmt.where(Attendance.date <= end)
+    if department_id is not None:
+        stmt = stmt.where(Student.department_id == department_id)
+    if status is not None:
+        stmt = stmt.where(Attendance.status == status)
+    # yield_per streams from a server-side cursor instead of buffering the result
+    return stmt.order_by(Attendance.date, Attendance.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+async def _archived_export_rows(
+    db: AsyncSession,
+    company_id: int,
+    start: Optional[date],
+    end: Optional[date],
+    department_id: Optional[int],
+    status: Optional[AttendanceStatus],
+) -> AsyncIterator[list]:
+    """Export rows from the archive, oldest first, one batch of member details per batch of marks."""
+    cutoff = await db.run_sync(archive.archived_before, company_id)
+    if cutoff is None or (start is not None and start >= cutoff):
+        return
+    student_ids = None
+    if department_id is not None:
+        student_ids = await _department_student_ids(db, company_id, department_id)
+    batches = archive.batches(company_id, cutoff, start, end, student_ids, status, EXPORT_BATCH_SIZE)
+    while True:
+        marks = await anyio.to_thread.run_sync(next, batches, None)
+        if marks is None:
+            return
+        members = {
+            sid: rest for sid, *rest in await db.execute(
+                select(Student.id, Student.name, Student.roll_number, Department.name)
+                .outerjoin(Department, Department.id == Student.department_id)
+                .where(Student.company_id == company_id, Student.id.in_({m.student_id for m in marks}))
+            )
+        }
+        yield [
+            (m.date, m.student_id, *members[m.student_id], m.status)
+            for m in marks if m.student_id in members
+        ]
+
+
+async def _export_chunks(company_id: int, stmt, archived_filters: tuple, fmt: str) -> AsyncIterator[str]:
+    # The session belongs to the stream, not the request: it must outlive the
+    # endpoint and stay open until the last batch is sent
+    async with AsyncSessionLocal() as db:
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        if fmt == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+            yield buf.getvalue()
+
+        def write(rows: Iterable) -> str:
+            buf.seek(0)
+            buf.truncate()
+            for day, student_id, name, roll_number, department, st in rows:
+                values = (day.isoformat(), student_id, name, roll_number, department or "", st.value)
+                if fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, values))))
+                    buf.write("\n")
+            return buf.getvalue()
+
+        # Archived marks are all older than the hot ones, so they go first
+        async for rows in _archived_export_rows(db, company_id, *archived_filters):
+            yield write(rows)
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            yield write(rows)
+
+
+@router.get("/export")
+async def export_attendance(
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    start: Optional[date] = Query(default=None),
+    end: Optional[date] = Query(default=None),
+    department_id: Optional[int] = Query(default=None),
+    status: Optional[AttendanceStatus] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Stream every matching mark, oldest first, as CSV or NDJSON in constant memory."""
+    stmt = _export_stmt(current_user.company_id, start, end, department_id, status)
+    filename = f"attendance_{start or 'all'}_{end or date.today()}.{format}"
+    return StreamingResponse(
+        _export_chunks(current_user.company_id, stmt, (start, end, department_id, status), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
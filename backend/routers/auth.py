@@ -1,44 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User, Company, UserRole
+from database import get_db, get_write_db, use_company, write_session
+from models import User, UserRole
 from schemas import SignupRequest, LoginRequest, TokenResponse, UserResponse
-from auth import hash_password, verify_password, create_access_token, get_current_user
+from auth import (
+    hash_password, verify_and_update, create_access_token, get_current_user, remember_user, token_claims, Principal,
+)
+import tenants
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/signup", response_model=TokenResponse)
-def signup(data: SignupRequest, db: Session = Depends(get_db)):
-    # Check if company name already exists
-    existing_company = db.query(Company).filter(Company.name == data.company_name).first()
-    if existing_company:
-        raise HTTPException(status_code=400, detail="Company name already registered")
+def signup(data: SignupRequest, db: Session = Depends(get_write_db)):
+    # Hash before the first query so the write transaction is not held open during bcrypt
+    hashed_password = hash_password(data.password)
 
-    # Check if email exists globally
-    existing_user = db.query(User).filter(User.email == data.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    # Create company
-    company = Company(name=data.company_name, theme_id=data.theme_id)
-    db.add(company)
-    db.flush()
-
-    # Create admin user
-    user = User(
-        name=data.name,
-        email=data.email,
-        hashed_password=hash_password(data.password),
-        role=UserRole.admin,
-        company_id=company.id,
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    db.refresh(company)
+    # Company names are unique across tenants; see create_company for the email check
+    company = tenants.create_company(db, data.company_name, data.email, theme_id=data.theme_id)
+    try:
+        # Create admin user
+        user = User(
+            name=data.name,
+            email=data.email,
+            hashed_password=hashed_password,
+            role=UserRole.admin,
+            company_id=company.id,
+        )
+        db.add(user)
+        db.commit()
+    except Exception:
+        tenants.remove_company(company.id)
+        raise
 
-    token = create_access_token({"sub": str(user.id)})
+    token = create_access_token(token_claims(user))
     return TokenResponse(
         access_token=token,
         user=UserResponse(
@@ -54,22 +49,32 @@ def signup(data: SignupRequest, db: Session = Depends(get_db)):
 
 @router.post("/login", response_model=TokenResponse)
 def login(data: LoginRequest, db: Session = Depends(get_db)):
-    # Find company
-    company = db.query(Company).filter(Company.name == data.company_name).first()
-    if not company:
+    # Find company (in the catalog when each company has its own database)
+    company_id = tenants.find_company_id(db, data.company_name)
+    if company_id is None:
         raise HTTPException(status_code=401, detail="Invalid company name")
+    use_company(company_id)
 
-    # Find user within that company
+    # Find user within that company (their company is joined in)
     user = (
         db.query(User)
-        .filter(User.email == data.email, User.company_id == company.id)
+        .filter(User.email == data.email, User.company_id == company_id)
         .first()
     )
-    if not user or not verify_password(data.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    ok, new_hash = verify_and_update(data.password, user.hashed_password)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored hash used an older cost factor; upgrade it while we have the password
+        with write_session() as wdb:
+            wdb.query(User).filter(User.id == user.id).update({User.hashed_password: new_hash})
+            wdb.commit()
 
     dept_name = user.department.name if user.department else None
-    token = create_access_token({"sub": str(user.id)})
+    remember_user(user)
+    token = create_access_token(token_claims(user))
     return TokenResponse(
         access_token=token,
         user=UserResponse(
@@ -77,8 +82,8 @@ def login(data: LoginRequest, db: Session = Depends(get_db)):
             name=user.name,
             email=user.email,
             role=user.role,
-            company_id=company.id,
-            company_name=company.name,
+            company_id=company_id,
+            company_name=user.company.name,
             department_id=user.department_id,
             department_name=dept_name,
         ),
@@ -86,7 +91,15 @@ def login(data: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+def get_me(
+    principal: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # The cached principal has no profile fields; load the full user (company and
+    # department are joined in the same query)
+    current_user = db.query(User).filter(User.id == principal.id).first()
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="User not found")
     company = current_user.company
     dept_name = current_user.department.name if current_user.department else None
     return UserResponse(
@@ -1,67 +1,61 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Student, Attendance, AttendanceStatus, User
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from schemas import DashboardStats, WeeklyData
-from auth import get_current_user
+from auth import get_current_user, Principal
+from aggregates import daily_counts, member_count
+import response_cache
 from datetime import date, timedelta
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
 
 @router.get("/stats", response_model=DashboardStats)
-def get_dashboard_stats(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def get_dashboard_stats(
+    department_id: Optional[int] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     company_id = current_user.company_id
     today = date.today()
-    total_students = db.query(Student).filter(Student.company_id == company_id).count()
+    key, cached = response_cache.lookup(company_id, response_cache.DASHBOARD, "stats", today, department_id)
+    if cached is not None:
+        return cached
+    total_students = await db.run_sync(member_count, company_id, department_id)
+    counts = (await db.run_sync(daily_counts, company_id, today, today, department_id))[0]
 
-    today_records = (
-        db.query(Attendance)
-        .filter(Attendance.date == today, Attendance.company_id == company_id)
-        .all()
-    )
-    present_today = sum(1 for r in today_records if r.status == AttendanceStatus.present)
-    absent_today = sum(1 for r in today_records if r.status == AttendanceStatus.absent)
-
-    attendance_percentage = (present_today / total_students * 100) if total_students > 0 else 0
+    attendance_percentage = (counts.present / total_students * 100) if total_students > 0 else 0
 
-    return DashboardStats(
+    return response_cache.store(key, DashboardStats(
         total_students=total_students,
-        present_today=present_today,
-        absent_today=absent_today,
+        present_today=counts.present,
+        absent_today=counts.absent,
         attendance_percentage=round(attendance_percentage, 1),
-    )
+    ))
 
 
 @router.get("/weekly", response_model=List[WeeklyData])
-def get_weekly_data(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def get_weekly_data(
+    days: int = Query(default=7, ge=1, le=366),
+    department_id: Optional[int] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    company_id = current_user.company_id
     today = date.today()
-    result = []
-
-    for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        records = (
-            db.query(Attendance)
-            .filter(Attendance.date == day, Attendance.company_id == company_id)
-            .all()
-        )
-        present = sum(1 for r in records if r.status == AttendanceStatus.present)
-        absent = sum(1 for r in records if r.status == AttendanceStatus.absent)
-        result.append(
-            WeeklyData(
-                date=day.strftime("%a %d"),
-                present=present,
-                absent=absent,
-                total=present + absent,
-            )
+    key, cached = response_cache.lookup(
+        current_user.company_id, response_cache.DASHBOARD, "weekly", today, days, department_id,
+    )
+    if cached is not None:
+        return cached
+    start = today - timedelta(days=days - 1)
+    counts = await db.run_sync(daily_counts, current_user.company_id, start, today, department_id)
+    return response_cache.store(key, [
+        WeeklyData(
+            date=c.day.strftime("%a %d"),
+            present=c.present,
+            absent=c.absent,
+            total=c.total,
         )
-
-    return result
+        for c in counts
+    ])
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Department, User
+from database import get_db, get_write_db
+from models import DailyAttendanceSummary, Department, Student
 from schemas import DepartmentCreate, DepartmentResponse
-from auth import get_current_user, require_admin
+from auth import get_current_user, require_admin, forget_company_users, Principal
+import archive
+import etags
+import events
+import response_cache
 from typing import List
 
 router = APIRouter(prefix="/api/departments", tags=["departments"])
@@ -11,9 +15,16 @@ router = APIRouter(prefix="/api/departments", tags=["departments"])
 
 @router.get("/", response_model=List[DepartmentResponse])
 def list_departments(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    etag = etags.current(db, current_user.company_id, etags.DEPARTMENTS)
+    not_modified = etags.not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    etags.tag(response, etag)
     return (
         db.query(Department)
         .filter(Department.company_id == current_user.company_id)
@@ -25,8 +36,8 @@ def list_departments(
 @router.post("/", response_model=DepartmentResponse, status_code=201)
 def create_department(
     data: DepartmentCreate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
     # Check duplicate name within company
     existing = (
@@ -42,8 +53,10 @@ def create_department(
 
     dept = Department(name=data.name, company_id=current_user.company_id)
     db.add(dept)
-    db.commit()
+    etags.bump(db, current_user.company_id, etags.DEPARTMENTS)
+    db.flush()
     db.refresh(dept)
+    db.commit()
     return dept
 
 
@@ -51,8 +64,8 @@ def create_department(
 def update_department(
     dept_id: int,
     data: DepartmentCreate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
     dept = (
         db.query(Department)
@@ -76,16 +89,16 @@ def update_department(
         raise HTTPException(status_code=400, detail="Department name already exists")
 
     dept.name = data.name
+    etags.bump(db, current_user.company_id, etags.DEPARTMENTS)
     db.commit()
-    db.refresh(dept)
     return dept
 
 
 @router.delete("/{dept_id}", status_code=204)
 def delete_department(
     dept_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
     dept = (
         db.query(Department)
@@ -94,5 +107,19 @@ def delete_department(
     )
     if not dept:
         raise HTTPException(status_code=404, detail="Department not found")
+
+    # Its students (and their marks) cascade away, so its rollup buckets go too
+    db.query(DailyAttendanceSummary).filter(
+        DailyAttendanceSummary.company_id == current_user.company_id,
+        DailyAttendanceSummary.department_id == dept.id,
+    ).delete(synchronize_session=False)
+    student_ids = [sid for (sid,) in db.query(Student.id).filter(Student.department_id == dept.id)]
     db.delete(dept)
+    etags.bump(db, current_user.company_id, etags.DEPARTMENTS, etags.STUDENTS)
     db.commit()
+    archive.delete_students(current_user.company_id, student_ids)
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    # Its members and their marks went with it; dashboards reload rather than patch
+    events.publish(current_user.company_id, {"type": "refresh"})
+    # Users assigned to the department lost it; refresh their cached principals
+    forget_company_users(current_user.company_id)
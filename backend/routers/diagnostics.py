@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from schemas import ProfileSummary, SlowQueryResponse
+from auth import require_admin, Principal
+import diagnostics
+from typing import List
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+
+@router.get("/slow-queries", response_model=List[SlowQueryResponse])
+async def list_slow_queries(
+    limit: int = Query(default=50, ge=1, le=diagnostics.SLOW_QUERY_LOG_SIZE),
+    current_user: Principal = Depends(require_admin),
+):
+    """This company's latest statements slower than SLOW_QUERY_MS, newest first (this worker only)."""
+    return [q._asdict() for q in diagnostics.slow_queries(current_user.company_id, limit)]
+
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+async def list_profiles(current_user: Principal = Depends(require_admin)):
+    """Profiles of this company's requests; send a request with `X-Profile: 1` to add one."""
+    return [p._asdict() for p in diagnostics.profiles(current_user.company_id)]
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: Principal = Depends(require_admin)):
+    """Folded stacks ("frame;frame count" per line), for flamegraph.pl or speedscope."""
+    profile = diagnostics.get_profile(current_user.company_id, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded, headers={
+        "Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"',
+    })
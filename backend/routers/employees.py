@@ -1,11 +1,15 @@
 import secrets
 import string
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_write_db
 from models import User, UserRole, Department
-from schemas import EmployeeCreate, EmployeeResponse
-from auth import hash_password, get_current_user, require_admin
+from schemas import EmployeeCreate, EmployeeImportResult, EmployeeResponse, ImportRowError
+from auth import hash_password, hash_passwords, get_current_user, require_admin, forget_user, Principal
+from imports import MAX_EMPLOYEE_IMPORT_ROWS, DepartmentLookup, batches, read_rows
 from typing import List
 
 router = APIRouter(prefix="/api/employees", tags=["employees"])
@@ -18,7 +22,7 @@ def generate_password(length: int = 10) -> str:
 
 @router.get("/", response_model=List[EmployeeResponse])
 def list_employees(
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     employees = (
@@ -46,13 +50,17 @@ def list_employees(
 @router.post("/", response_model=EmployeeResponse, status_code=201)
 def create_employee(
     data: EmployeeCreate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
+    # Hash before the first query so the write transaction is not held open during bcrypt
+    raw_password = generate_password()
+    hashed_password = hash_password(raw_password)
+
     # Check email uniqueness within company
     existing = (
         db.query(User)
-        .filter(User.email == data.email, User.company_id == current_user.company_id)
+        .filter(func.lower(User.email) == data.email.lower(), User.company_id == current_user.company_id)
         .first()
     )
     if existing:
@@ -71,18 +79,22 @@ def create_employee(
         if not dept:
             raise HTTPException(status_code=400, detail="Department not found")
 
-    raw_password = generate_password()
     user = User(
         name=data.name,
         email=data.email,
-        hashed_password=hash_password(raw_password),
+        hashed_password=hashed_password,
         role=UserRole.employee,
         company_id=current_user.company_id,
         department_id=data.department_id,
     )
     db.add(user)
-    db.commit()
+    try:
+        db.flush()
+    except IntegrityError:
+        # Added concurrently since the check above
+        raise HTTPException(status_code=400, detail="Email already registered in this company")
     db.refresh(user)
+    db.commit()
 
     dept_name = user.department.name if user.department else None
     return EmployeeResponse(
@@ -96,11 +108,92 @@ def create_employee(
     )
 
 
+@router.post("/import", response_model=EmployeeImportResult)
+def import_employees(
+    file: UploadFile = File(..., description="CSV with a header row, or a JSON array"),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
+):
+    """Bulk-create employees from name, email and department / department_id columns.
+
+    Each created employee gets a generated password, returned once in the response.
+    Throughput is bounded by bcrypt (see passwords.py), not by the database, so
+    files are capped at MAX_EMPLOYEE_IMPORT_ROWS rows. All rows are inserted in
+    one transaction; an email registered meanwhile is reported as a row error.
+    """
+    company_id = current_user.company_id
+    rows = read_rows(file, MAX_EMPLOYEE_IMPORT_ROWS)
+    departments = DepartmentLookup(db, company_id)
+    taken = {
+        email.lower()
+        for (email,) in db.query(User.email).filter(User.company_id == company_id)
+    }
+    # Validation is read-only; end the transaction so hashing does not hold it open
+    db.rollback()
+    seen = {}  # lowercased email -> first row using it in this file
+
+    errors, valid = [], []
+    for n, row in enumerate(rows, start=1):
+        name, email = row.get("name", ""), row.get("email", "")
+        if not name or "@" not in email:
+            errors.append(ImportRowError(row=n, error="name and a valid email are required"))
+            continue
+        department_id, error = departments.resolve(row)
+        if error:
+            errors.append(ImportRowError(row=n, error=error))
+            continue
+        if email.lower() in taken:
+            errors.append(ImportRowError(row=n, error=f"Email {email!r} already registered in this company"))
+            continue
+        if email.lower() in seen:
+            errors.append(ImportRowError(row=n, error=f"Email {email!r} repeats row {seen[email.lower()]}"))
+            continue
+        seen[email.lower()] = n
+        valid.append((n, {"name": name, "email": email, "department_id": department_id}))
+
+    raw_passwords = [generate_password() for _ in valid]
+    hashed = hash_passwords(raw_passwords)
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    created = []
+    for batch in batches(list(zip(valid, raw_passwords, hashed))):
+        # An email registered concurrently since the prefetch is skipped, not fatal
+        stmt = (
+            dialect.insert(User)
+            .values([
+                {**values, "hashed_password": h, "role": UserRole.employee, "company_id": company_id}
+                for (_, values), _, h in batch
+            ])
+            .on_conflict_do_nothing(index_elements=[User.company_id, func.lower(User.email)])
+            .returning(User.id, User.email)
+        )
+        inserted = {email.lower(): user_id for user_id, email in db.execute(stmt)}
+        for (n, values), raw, _ in batch:
+            user_id = inserted.get(values["email"].lower())
+            if user_id is None:
+                errors.append(ImportRowError(
+                    row=n, error=f"Email {values['email']!r} already registered in this company"
+                ))
+                continue
+            created.append(EmployeeResponse(
+                id=user_id,
+                name=values["name"],
+                email=values["email"],
+                role=UserRole.employee,
+                department_id=values["department_id"],
+                department_name=departments.names.get(values["department_id"]),
+                generated_password=raw,
+            ))
+    db.commit()
+    errors.sort(key=lambda e: e.row)
+    return EmployeeImportResult(created=created, errors=errors)
+
+
 @router.delete("/{employee_id}", status_code=204)
 def delete_employee(
     employee_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
     user = (
         db.query(User)
@@ -115,3 +208,4 @@ def delete_employee(
         raise HTTPException(status_code=404, detail="Employee not found")
     db.delete(user)
     db.commit()
+    forget_user(current_user.company_id, employee_id)
@@ -0,0 +1,45 @@
+import asyncio
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from auth import STREAM_TOKEN_EXPIRE_SECONDS, create_stream_token, get_current_user, get_stream_user, Principal
+from schemas import StreamTokenResponse
+import events
+from typing import AsyncIterator
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Comment lines keep idle connections open through proxies
+KEEPALIVE_SECONDS = 15
+# Streams end after this long; the client reconnects with a fresh stream token, which re-checks the user
+STREAM_MAX_SECONDS = 30 * 60
+RECONNECT_MS = 3000
+
+
+async def _event_stream(company_id: int) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_SECONDS
+    async with events.broker.subscribe(company_id) as queue:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        while loop.time() < deadline:
+            try:
+                data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {data}\n\n"
+
+
+@router.post("/token", response_model=StreamTokenResponse)
+async def issue_stream_token(current_user: Principal = Depends(get_current_user)):
+    """A short-lived token for the stream's query string, so the login token stays out of URLs."""
+    return StreamTokenResponse(token=create_stream_token(current_user), expires_in=STREAM_TOKEN_EXPIRE_SECONDS)
+
+
+@router.get("/")
+async def stream_events(current_user: Principal = Depends(get_stream_user)):
+    """Server-sent events with the company's attendance and member changes (see events.py)."""
+    return StreamingResponse(
+        _event_stream(current_user.company_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,34 @@
 import json
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Company, User
+from database import get_async_db, get_write_db
+from models import Company
 from schemas import SettingsUpdate, CompanyResponse, CustomLabels
-from auth import get_current_user, require_admin
+from auth import get_current_user, require_admin, Principal
+import etags
+import response_cache
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
 
 @router.get("/", response_model=CompanyResponse)
-def get_settings(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def get_settings(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
+    etag = await db.run_sync(etags.current, current_user.company_id, etags.SETTINGS)
+    not_modified = etags.not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    # Polled by every open tab; a cache hit skips the query and the label parsing. Keyed
+    # on the ETag too, so a body cached before another worker's write is never reused.
+    key, cached = response_cache.lookup(current_user.company_id, response_cache.SETTINGS, etag)
+    if cached is not None:
+        return etags.tag(cached, etag)
+    company = await db.scalar(select(Company).where(Company.id == current_user.company_id))
     labels = None
     if company.custom_labels:
         try:
@@ -22,19 +36,19 @@ def get_settings(
         except Exception:
             labels = None
 
-    return CompanyResponse(
+    return etags.tag(response_cache.store(key, CompanyResponse(
         id=company.id,
         name=company.name,
         theme_id=company.theme_id,
         custom_labels=labels,
-    )
+    )), etag)
 
 
 @router.put("/", response_model=CompanyResponse)
 def update_settings(
     data: SettingsUpdate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_write_db),
 ):
     company = db.query(Company).filter(Company.id == current_user.company_id).first()
 
@@ -44,8 +58,9 @@ def update_settings(
     if data.custom_labels is not None:
         company.custom_labels = json.dumps(data.custom_labels.model_dump())
 
+    etags.bump(db, current_user.company_id, etags.SETTINGS)
     db.commit()
-    db.refresh(company)
+    response_cache.invalidate(current_user.company_id, response_cache.SETTINGS)
 
     labels = None
     if company.custom_labels:
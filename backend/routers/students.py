@@ -1,10 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Student, User
-from schemas import StudentCreate, StudentUpdate, StudentResponse
-from auth import get_current_user
-from typing import List
+from database import get_async_db, get_write_db
+from models import Student
+from schemas import (
+    ImportRowError,
+    StudentCreate,
+    StudentImportResult,
+    StudentPage,
+    StudentResponse,
+    StudentUpdate,
+)
+from auth import get_current_user, Principal
+from imports import DepartmentLookup, batches, read_rows
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from rollups import SummaryDelta
+import archive
+import etags
+import events
+import response_cache
+from typing import Optional
+import string
 
 router = APIRouter(prefix="/api/students", tags=["students"])
 
@@ -21,25 +39,72 @@ def _student_response(s: Student) -> StudentResponse:
     )
 
 
-@router.get("/", response_model=List[StudentResponse])
-def get_students(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+# SQLite's lower() folds only A-Z; the prefix must be folded the same way to compare as a range
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _prefix_match(column, prefix: str, dialect: str):
+    """Index-friendly case-insensitive prefix test (a range on lower(column))."""
+    prefix = prefix.translate(_ASCII_LOWER) if dialect == "sqlite" else prefix.lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    lowered = func.lower(column)
+    return and_(lowered >= prefix, lowered < upper)
+
+
+@router.get("/", response_model=StudentPage)
+async def get_students(
+    request: Request,
+    response: Response,
+    q: Optional[str] = Query(default=None, description="Name or roll-number prefix"),
+    department_id: Optional[int] = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    students = (
-        db.query(Student)
-        .filter(Student.company_id == current_user.company_id)
-        .order_by(Student.created_at.desc())
-        .all()
+    """Newest-first member directory, keyset-paginated on id."""
+    etag = await db.run_sync(etags.current, current_user.company_id, etags.STUDENTS, etags.DEPARTMENTS)
+    not_modified = etags.not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    etags.tag(response, etag)
+
+    filters = [Student.company_id == current_user.company_id]
+    if department_id is not None:
+        filters.append(Student.department_id == department_id)
+    q = (q or "").strip()
+    if q:
+        dialect = db.get_bind().dialect.name
+        filters.append(or_(
+            _prefix_match(Student.name, q, dialect), _prefix_match(Student.roll_number, q, dialect)
+        ))
+
+    total = None
+    if not cursor:
+        total = await db.scalar(select(func.count(Student.id)).where(*filters))
+    else:
+        (after_id,) = decode_cursor(cursor, (int,))
+        filters.append(Student.id < after_id)
+
+    students = list(await db.scalars(
+        select(Student).where(*filters).order_by(Student.id.desc()).limit(limit + 1)
+    ))
+    next_cursor = None
+    if len(students) > limit:
+        students = students[:limit]
+        next_cursor = encode_cursor(students[-1].id)
+    return StudentPage(
+        items=[_student_response(s) for s in students],
+        next_cursor=next_cursor,
+        total=total,
     )
-    return [_student_response(s) for s in students]
 
 
 @router.post("/", response_model=StudentResponse, status_code=201)
 def create_student(
     student: StudentCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
 ):
     existing = (
         db.query(Student)
@@ -59,17 +124,90 @@ def create_student(
         company_id=current_user.company_id,
     )
     db.add(db_student)
-    db.commit()
+    etags.bump(db, current_user.company_id, etags.STUDENTS)
+    db.flush()
     db.refresh(db_student)
+    db.commit()
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    events.publish(current_user.company_id, events.members_event([student.department_id]))
     return _student_response(db_student)
 
 
+@router.post("/import", response_model=StudentImportResult)
+def import_students(
+    file: UploadFile = File(..., description="CSV with a header row, or a JSON array"),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+):
+    """Bulk-create members from name, roll_number and department / department_id columns.
+
+    Valid rows are inserted in batches; the rest come back as per-row errors.
+    """
+    company_id = current_user.company_id
+    rows = read_rows(file)
+    departments = DepartmentLookup(db, company_id)
+    taken = {
+        roll for (roll,) in db.query(Student.roll_number).filter(Student.company_id == company_id)
+    }
+    seen = {}  # roll_number -> first row using it in this file
+
+    errors, valid = [], []
+    for n, row in enumerate(rows, start=1):
+        name, roll = row.get("name", ""), row.get("roll_number", "")
+        if not name or not roll:
+            errors.append(ImportRowError(row=n, error="name and roll_number are required"))
+            continue
+        department_id, error = departments.resolve(row)
+        if error:
+            errors.append(ImportRowError(row=n, error=error))
+            continue
+        if roll in taken:
+            errors.append(ImportRowError(row=n, error=f"Roll number {roll!r} already exists"))
+            continue
+        if roll in seen:
+            errors.append(ImportRowError(row=n, error=f"Roll number {roll!r} repeats row {seen[roll]}"))
+            continue
+        seen[roll] = n
+        valid.append((n, {
+            "name": name, "roll_number": roll, "department_id": department_id, "company_id": company_id,
+        }))
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    created = 0
+    for batch in batches(valid):
+        # A roll number added concurrently since the prefetch is skipped, not fatal
+        stmt = (
+            dialect.insert(Student)
+            .values([values for _, values in batch])
+            .on_conflict_do_nothing(index_elements=["company_id", "roll_number"])
+            .returning(Student.roll_number)
+        )
+        inserted = {roll for (roll,) in db.execute(stmt)}
+        if inserted:
+            etags.bump(db, company_id, etags.STUDENTS)
+        db.commit()
+        if inserted:
+            events.publish(company_id, events.members_event(
+                values["department_id"] for _, values in batch if values["roll_number"] in inserted
+            ))
+        created += len(inserted)
+        errors.extend(
+            ImportRowError(row=n, error=f"Roll number {values['roll_number']!r} already exists")
+            for n, values in batch if values["roll_number"] not in inserted
+        )
+
+    if created:
+        response_cache.invalidate(company_id, response_cache.DASHBOARD)
+    errors.sort(key=lambda e: e.row)
+    return StudentImportResult(created=created, errors=errors)
+
+
 @router.put("/{student_id}", response_model=StudentResponse)
 def update_student(
     student_id: int,
     data: StudentUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
 ):
     student = (
         db.query(Student)
@@ -91,19 +229,34 @@ def update_student(
     if existing:
         raise HTTPException(status_code=400, detail="Roll number already exists")
 
+    moved_from, counts = student.department_id, {}
+    if moved_from != data.department_id:
+        # Move the student's existing marks to the new department's rollup buckets
+        delta = SummaryDelta()
+        delta.add_student_history(db, current_user.company_id, student.id, moved_from, sign=-1)
+        delta.add_student_history(db, current_user.company_id, student.id, data.department_id)
+        counts = delta.apply(db, current_user.company_id)
+
     student.name = data.name
     student.roll_number = data.roll_number
     student.department_id = data.department_id
+    etags.bump(db, current_user.company_id, etags.STUDENTS)
+    db.flush()
+    db.refresh(student)  # the new department, for the response
     db.commit()
-    db.refresh(student)
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    if moved_from != data.department_id:
+        events.publish(current_user.company_id, events.members_event([data.department_id], [moved_from]))
+    if counts:
+        events.publish(current_user.company_id, events.attendance_event(counts))
     return _student_response(student)
 
 
 @router.delete("/{student_id}", status_code=204)
 def delete_student(
     student_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
 ):
     student = (
         db.query(Student)
@@ -112,5 +265,18 @@ def delete_student(
     )
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
+
+    # The student's marks cascade away with them; take them out of the rollup too
+    delta = SummaryDelta()
+    delta.add_student_history(db, current_user.company_id, student.id, student.department_id, sign=-1)
+    counts = delta.apply(db, current_user.company_id)
+    department_id = student.department_id
+
     db.delete(student)
+    etags.bump(db, current_user.company_id, etags.STUDENTS)
     db.commit()
+    archive.delete_students(current_user.company_id, [student_id])
+    response_cache.invalidate(current_user.company_id, response_cache.DASHBOARD)
+    events.publish(current_user.company_id, events.members_event(removed=[department_id]))
+    if counts:
+        events.publish(current_user.company_id, events.attendance_event(counts))
@@ -36,6 +36,11 @@ class TokenResponse(BaseModel):
     user: "UserResponse"
 
 
+class StreamTokenResponse(BaseModel):
+    token: str
+    expires_in: int
+
+
 class UserResponse(BaseModel):
     id: int
     name: str
@@ -92,6 +97,13 @@ class DepartmentResponse(BaseModel):
         from_attributes = True
 
 
+# --- Import Schemas ---
+
+class ImportRowError(BaseModel):
+    row: int  # 1-based data row; the CSV header is not counted
+    error: str
+
+
 # --- Employee Schemas ---
 
 class EmployeeCreate(BaseModel):
@@ -113,6 +125,11 @@ class EmployeeResponse(BaseModel):
         from_attributes = True
 
 
+class EmployeeImportResult(BaseModel):
+    created: List[EmployeeResponse]  # each with its generated_password
+    errors: List[ImportRowError]
+
+
 # --- Student Schemas ---
 
 class StudentCreate(BaseModel):
@@ -140,6 +157,17 @@ class StudentResponse(BaseModel):
         from_attributes = True
 
 
+class StudentPage(BaseModel):
+    items: List[StudentResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None  # only computed for the first page
+
+
+class StudentImportResult(BaseModel):
+    created: int
+    errors: List[ImportRowError]
+
+
 # --- Attendance Schemas ---
 
 class AttendanceRecord(BaseModel):
@@ -150,6 +178,27 @@ class AttendanceRecord(BaseModel):
 class AttendanceBulkCreate(BaseModel):
     date: date
     records: List[AttendanceRecord]
+    department_id: Optional[int] = None  # limit the overwrite to one department
+    expected_version: Optional[int] = None
+
+
+class AttendanceChange(BaseModel):
+    student_id: int
+    status: Optional[AttendanceStatus] = None  # None clears the mark
+
+
+class AttendanceChangeSet(BaseModel):
+    date: date
+    changes: List[AttendanceChange]
+    department_id: Optional[int] = None
+    expected_version: Optional[int] = None
+
+
+class AttendanceChangeResult(BaseModel):
+    date: date
+    version: int
+    updated: int
+    removed: int
 
 
 class AttendanceResponse(BaseModel):
@@ -163,6 +212,11 @@ class AttendanceResponse(BaseModel):
         from_attributes = True
 
 
+class AttendancePage(BaseModel):
+    items: List[AttendanceResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+
 # --- Dashboard Schemas ---
 
 class DashboardStats(BaseModel):
@@ -177,3 +231,69 @@ class WeeklyData(BaseModel):
     present: int
     absent: int
     total: int
+
+
+# --- Analytics Schemas ---
+
+class StudentAnalytics(BaseModel):
+    student_id: int
+    name: str
+    roll_number: str
+    department_id: Optional[int] = None
+    department_name: Optional[str] = None
+    present: int
+    absent: int
+    attendance_rate: Optional[float] = None  # None when never marked in the range
+    current_absence_streak: int
+    longest_absence_streak: int
+    last_seen: Optional[date] = None
+
+
+class MonthHeatmap(BaseModel):
+    """Parallel arrays, one entry per member with marks; bit d-1 stands for day d."""
+    month: date
+    days: int
+    student_ids: List[int]
+    present_bits: List[int]
+    absent_bits: List[int]
+
+
+class MonthBits(BaseModel):
+    month: date
+    present_bits: int
+    absent_bits: int
+
+
+class StudentYearHeatmap(BaseModel):
+    student_id: int
+    year: int
+    months: List[MonthBits]  # months without marks are omitted
+
+
+class YearHeatmap(BaseModel):
+    """Per-day counts from Jan 1 of ``year``; index i is day i of the year."""
+    year: int
+    department_id: Optional[int] = None
+    present: List[int]
+    absent: List[int]
+
+
+# --- Diagnostics Schemas ---
+class SlowQueryResponse(BaseModel):
+    at: datetime
+    duration_ms: float
+    statement: str
+    parameters: Optional[str] = None
+    engine: str
+    method: Optional[str] = None
+    route: Optional[str] = None
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    at: datetime
+    method: str
+    route: str
+    status: int
+    duration_ms: float
+    samples: int
@@ -0,0 +1,208 @@
+"""The tenant catalog: which companies exist and where each one's data lives.
+
+By default every company shares DATABASE_URL and the catalog is simply the
+companies table. With TENANT_DATABASE_URL set, each company has a database of
+its own (see database.get_shard) and DATABASE_URL holds only the tenants table:
+company name -> id for login, owner emails for signup, and the database URL of
+companies that were moved off the template. Other users' emails stay in their
+company's database only, so signup checks only owner emails across tenants.
+
+    python tenants.py list
+    python tenants.py split --source sqlite:///./attendance.db   # shared database -> one per company
+    python tenants.py move --company-id 3 --to sqlite:////mnt/big/company_3.db
+
+A company's database is self-contained: back it up by copying its file (or
+dumping its database) while the others keep running.
+"""
+import argparse
+import os
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import SHARDED, Base, CatalogSession, use_company
+from models import Company, Tenant, User, UserRole
+
+# Rows per INSERT while copying a company between databases
+COPY_BATCH_SIZE = 5000
+
+
+def find_company_id(db: Session, name: str) -> Optional[int]:
+    """The id of the company called ``name``; looked up in ``db`` unless sharded."""
+    if not SHARDED:
+        return db.query(Company.id).filter(Company.name == name).scalar()
+    with CatalogSession() as catalog:
+        return catalog.query(Tenant.id).filter(Tenant.name == name).scalar()
+
+
+def company_ids() -> List[int]:
+    model = Tenant if SHARDED else Company
+    with CatalogSession() as catalog:
+        return [company_id for (company_id,) in catalog.query(model.id).order_by(model.id)]
+
+
+def _taken(detail: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=detail)
+
+
+def _register(name: str, owner_email: str) -> int:
+    with CatalogSession() as catalog:
+        if catalog.query(Tenant.id).filter(Tenant.name == name).first():
+            raise _taken("Company name already registered")
+        if catalog.query(Tenant.id).filter(Tenant.owner_email == owner_email).first():
+            raise _taken("Email already registered")
+        tenant = Tenant(name=name, owner_email=owner_email)
+        catalog.add(tenant)
+        try:
+            catalog.commit()
+        except IntegrityError:
+            raise _taken("Company name already registered")
+        return tenant.id
+
+
+def create_company(db: Session, name: str, owner_email: str, **fields) -> Company:
+    """Add a company whose first admin signs up as owner_email, and route ``db`` to it.
+
+    Company names are unique across tenants. owner_email may not belong to any
+    user of the shared database; when sharded, the catalog only knows owner
+    emails, so it may not be another company's owner. When sharded the company
+    is registered in the catalog first, which allocates its id; if the caller's
+    commit fails, it should call remove_company(company.id).
+    """
+    company_id = None
+    if SHARDED:
+        company_id = _register(name, owner_email)
+        use_company(company_id)
+    else:
+        if db.query(Company.id).filter(Company.name == name).first():
+            raise _taken("Company name already registered")
+        if db.query(User.id).filter(User.email == owner_email).first():
+            raise _taken("Email already registered")
+    company = Company(id=company_id, name=name, **fields)
+    db.add(company)
+    try:
+        db.flush()
+    except Exception:
+        if company_id is not None:
+            remove_company(company_id)
+        raise
+    use_company(company.id)
+    return company
+
+
+def remove_company(company_id: int):
+    """Drop a company's catalog entry (its database, if any, is left alone)."""
+    if not SHARDED:
+        return
+    with CatalogSession() as catalog:
+        catalog.query(Tenant).filter(Tenant.id == company_id).delete()
+        catalog.commit()
+
+
+# --- Copying between databases ---
+def _engine(url: str) -> Engine:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:"):
+        os.makedirs(os.path.dirname(os.path.abspath(parsed.database)), exist_ok=True)
+    return create_engine(url)
+
+
+def _reset_sequences(conn, tables):
+    """PostgreSQL: explicit ids do not advance the id sequences."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        if "id" in table.c:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1)) FROM {table.name}"
+            ))
+
+
+def copy_company(source: Engine, target: Engine, company_id: int) -> int:
+    """Copy one company's rows into another database; returns the number of rows copied."""
+    from migrations import upgrade
+
+    upgrade(target)
+    copied = 0
+    with source.connect() as src, target.begin() as dst:
+        if dst.execute(select(Company.id).where(Company.id == company_id)).first():
+            raise SystemExit(f"company {company_id} already exists in the target database")
+        for table in Base.metadata.sorted_tables:
+            key = table.c.id if table.name == "companies" else table.c.get("company_id")
+            if key is None:
+                continue  # schema_migrations: the target has its own
+            result = src.execution_options(yield_per=COPY_BATCH_SIZE).execute(
+                select(table).where(key == company_id)
+            )
+            for rows in result.partitions():
+                dst.execute(insert(table), [dict(row._mapping) for row in rows])
+                copied += len(rows)
+        _reset_sequences(dst, Base.metadata.sorted_tables)
+    return copied
+
+
+def split(source_url: str):
+    """Give every company of a shared database its own database and catalog entry."""
+    from database import engine, get_shard
+
+    source = _engine(source_url)
+    with source.connect() as src:
+        companies = src.execute(select(Company.id, Company.name).order_by(Company.id)).all()
+        owners = dict(src.execute(
+            select(User.company_id, User.email).where(User.role == UserRole.admin).order_by(User.id.desc())
+        ).all())  # the first admin of each company wins
+    for company_id, name in companies:
+        with CatalogSession() as catalog:
+            if catalog.get(Tenant, company_id) is not None:
+                print(f"company {company_id}: already split")
+                continue
+            catalog.add(Tenant(id=company_id, name=name, owner_email=owners.get(company_id, "")))
+            catalog.commit()
+        copied = copy_company(source, get_shard(company_id).engine, company_id)
+        print(f"company {company_id}: copied {copied} rows")
+    with engine.begin() as conn:
+        _reset_sequences(conn, [Tenant.__table__])
+
+
+def move(company_id: int, target_url: str):
+    """Copy a company to another database and point the catalog at it."""
+    from database import get_shard
+
+    copied = copy_company(get_shard(company_id).engine, _engine(target_url), company_id)
+    with CatalogSession() as catalog:
+        catalog.get(Tenant, company_id).database_url = target_url
+        catalog.commit()
+    print(f"company {company_id}: copied {copied} rows; restart the API workers to switch, "
+          "then remove the old database")
+
+
+def main():
+    from database import engine, shard_url
+    from migrations import upgrade_primary
+
+    parser = argparse.ArgumentParser(description="Manage the per-company databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="companies and their databases")
+    split_cmd = commands.add_parser("split", help="copy a shared database into one database per company")
+    split_cmd.add_argument("--source", required=True, help="URL of the shared database")
+    move_cmd = commands.add_parser("move", help="move one company to another database")
+    move_cmd.add_argument("--company-id", type=int, required=True)
+    move_cmd.add_argument("--to", required=True, help="URL of the new (empty) database")
+    args = parser.parse_args()
+
+    if not SHARDED:
+        parser.error("set TENANT_DATABASE_URL first; DATABASE_URL is then the catalog")
+    upgrade_primary(engine)
+    if args.command == "list":
+        for company_id in company_ids():
+            print(f"company {company_id}: {make_url(shard_url(company_id)).render_as_string(hide_password=True)}")
+    elif args.command == "split":
+        split(args.source)
+    else:
+        move(args.company_id, args.to)
+
+
+if __name__ == "__main__":
+    main()
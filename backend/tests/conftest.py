@@ -0,0 +1,61 @@
+"""Shared fixtures: one scratch database per test session, companies signed up per test.
+
+The app opens its databases when it is imported, so the environment is set
+here, before any test module imports main.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix="attendance-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/attendance.db"
+os.environ["ASYNC_DATABASE_URL"] = ""
+# Kept when set, so the sharded run of test_tenants.py can pass its own
+os.environ["TENANT_DATABASE_URL"] = os.environ.get("TENANT_DATABASE_URL", "")
+os.environ["ARCHIVE_DIR"] = os.path.join(WORK_DIR, "archive")
+# Hash passwords inline instead of spawning a process pool
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+import main  # noqa: E402
+
+_companies = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def signup(client):
+    """Sign up a fresh company; returns (company_id, auth headers) for its admin."""
+
+    def signup():
+        n = next(_companies)
+        r = client.post("/api/auth/signup", json={
+            "name": "Admin", "email": f"admin{n}@test.io", "password": "secret",
+            "company_name": f"Company {n}",
+        })
+        assert r.status_code == 200, r.text
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        return client.get("/api/auth/me", headers=headers).json()["company_id"], headers
+
+    return signup
+
+
+@pytest.fixture
+def company(client, signup):
+    """A signed-up company with one department of three students."""
+    company_id, headers = signup()
+    department_id = client.post("/api/departments/", json={"name": "Grade 1"}, headers=headers).json()["id"]
+    student_ids = [
+        client.post("/api/students/", json={
+            "name": f"Student {i}", "roll_number": f"R{i}", "department_id": department_id,
+        }, headers=headers).json()["id"]
+        for i in range(3)
+    ]
+    return {"id": company_id, "headers": headers, "department_id": department_id, "student_ids": student_ids}
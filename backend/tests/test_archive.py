@@ -0,0 +1,112 @@
+"""Archiving old marks and rebuilding the rollups must not change what the API reports."""
+from datetime import date
+
+import pytest
+
+import archive
+import response_cache
+import rollups
+from database import SessionLocal, company_scope
+from models import Attendance
+
+CUTOFF = date(2024, 1, 1)
+DAYS = [date(2022, 12, 30), date(2023, 1, 2), date(2023, 5, 1), date.today()]
+
+
+@pytest.fixture
+def marked(client, company):
+    """Four days of marks, three of them before CUTOFF."""
+    for n, day in enumerate(DAYS):
+        records = [
+            {"student_id": s, "status": "present" if (s + n) % 3 else "absent"}
+            for s in company["student_ids"]
+        ]
+        r = client.post("/api/attendance/", json={"date": str(day), "records": records}, headers=company["headers"])
+        assert r.status_code == 201, r.text
+    return company
+
+
+def _history(client, headers, **params):
+    items, params = [], dict(params, limit=2)
+    while True:
+        page = client.get("/api/attendance/history", params=params, headers=headers).json()
+        items += page["items"]
+        if not page["next_cursor"]:
+            return items
+        params["cursor"] = page["next_cursor"]
+
+
+def _snapshot(client, company):
+    headers = company["headers"]
+    get = lambda path, **params: client.get(path, params=params, headers=headers)  # noqa: E731
+    return {
+        "history": _history(client, headers),
+        "history_filtered": _history(client, headers, student_id=company["student_ids"][1], status="absent"),
+        "by_date": get("/api/attendance/", date="2023-01-02").json(),
+        "export_csv": get("/api/attendance/export").text,
+        "export_ndjson": get("/api/attendance/export", department_id=company["department_id"], format="ndjson").text,
+        "analytics": get("/api/analytics/students", start="2022-12-01", end="2023-06-01").json(),
+        "dashboard": get("/api/dashboard/stats").json(),
+        "year_heatmap": get("/api/analytics/heatmap/year", year=2023).json(),
+        "month_heatmap": get("/api/analytics/heatmap/month", month="2023-01").json(),
+    }
+
+
+def _hot_rows(company_id):
+    with company_scope(company_id), SessionLocal() as db:
+        return db.query(Attendance).filter(Attendance.company_id == company_id).count()
+
+
+def test_archive_keeps_reads_identical(client, marked):
+    before = _snapshot(client, marked)
+    with company_scope(marked["id"]):
+        moved = archive.archive_company(marked["id"], CUTOFF)
+
+    assert moved == 3 * len(marked["student_ids"])
+    assert _hot_rows(marked["id"]) == len(marked["student_ids"])
+    assert _snapshot(client, marked) == before
+
+
+def test_archived_dates_refuse_writes(client, marked):
+    with company_scope(marked["id"]):
+        archive.archive_company(marked["id"], CUTOFF)
+    headers, student_id = marked["headers"], marked["student_ids"][0]
+
+    r = client.post("/api/attendance/", json={
+        "date": "2023-01-02", "records": [{"student_id": student_id, "status": "present"}],
+    }, headers=headers)
+    assert r.status_code == 409
+    r = client.patch("/api/attendance/", json={
+        "date": "2023-01-02", "changes": [{"student_id": student_id, "status": None}],
+    }, headers=headers)
+    assert r.status_code == 409
+
+
+def test_rebuild_after_archive_keeps_rollups(client, marked):
+    with company_scope(marked["id"]):
+        archive.archive_company(marked["id"], CUTOFF)
+    before = _snapshot(client, marked)
+
+    with company_scope(marked["id"]), SessionLocal() as db:
+        rollups.rebuild_summary(db, marked["id"])
+        rollups.rebuild_month_bits(db, marked["id"])
+        db.commit()
+    response_cache.invalidate(marked["id"], response_cache.DASHBOARD)
+
+    assert _snapshot(client, marked) == before
+
+
+def test_history_pages_ignore_hot_marks_below_the_cutoff(client, marked):
+    with company_scope(marked["id"]):
+        archive.archive_company(marked["id"], CUTOFF)
+    before = _history(client, marked["headers"])
+    # A mark left below the cutoff (archive invariant broken) must not be paged twice
+    with company_scope(marked["id"]), SessionLocal() as db:
+        db.add(Attendance(
+            student_id=marked["student_ids"][0], company_id=marked["id"], date=date(2023, 1, 3), status="present",
+        ))
+        db.commit()
+
+    after = _history(client, marked["headers"])
+    assert after == before
+    assert len({i["id"] for i in after}) == len(after)
@@ -0,0 +1,221 @@
+"""Attendance writes: optimistic concurrency on the sheet (expected_version / X-Attendance-Version)
+and the rollups kept alongside the marks."""
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+import rollups
+from aggregates import daily_counts
+from database import SessionLocal, company_scope
+from models import AttendanceMonth, AttendanceSheet
+from routers.attendance import VERSION_HEADER
+
+DAY = str(date(2024, 3, 4))
+
+
+def _marks(company, status="present"):
+    return [{"student_id": s, "status": status} for s in company["student_ids"]]
+
+
+def test_save_returns_advancing_version(client, company):
+    headers = company["headers"]
+    assert client.get("/api/attendance/", params={"date": DAY}, headers=headers).headers[VERSION_HEADER] == "0"
+
+    r = client.post("/api/attendance/", json={"date": DAY, "records": _marks(company)}, headers=headers)
+    assert r.status_code == 201, r.text
+    assert r.headers[VERSION_HEADER] == "1"
+
+    r = client.post("/api/attendance/", json={
+        "date": DAY, "records": _marks(company, "absent"), "expected_version": 1,
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    assert r.headers[VERSION_HEADER] == "2"
+    assert client.get("/api/attendance/", params={"date": DAY}, headers=headers).headers[VERSION_HEADER] == "2"
+
+
+def test_stale_overwrite_is_rejected(client, company):
+    headers = company["headers"]
+    client.post("/api/attendance/", json={"date": DAY, "records": _marks(company)}, headers=headers)
+    # Two clients load version 1; the first save wins
+    r = client.post("/api/attendance/", json={
+        "date": DAY, "records": _marks(company, "absent"), "expected_version": 1,
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+
+    r = client.post("/api/attendance/", json={
+        "date": DAY, "records": _marks(company), "expected_version": 1,
+    }, headers=headers)
+    assert r.status_code == 409
+    statuses = {m["status"] for m in client.get("/api/attendance/", params={"date": DAY}, headers=headers).json()}
+    assert statuses == {"absent"}
+
+
+def test_stale_change_set_is_rejected(client, company):
+    headers = company["headers"]
+    client.post("/api/attendance/", json={"date": DAY, "records": _marks(company)}, headers=headers)
+    first = company["student_ids"][0]
+
+    r = client.patch("/api/attendance/", json={
+        "date": DAY, "changes": [{"student_id": first, "status": "absent"}], "expected_version": 1,
+    }, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["version"] == 2
+
+    r = client.patch("/api/attendance/", json={
+        "date": DAY, "changes": [{"student_id": first, "status": None}], "expected_version": 1,
+    }, headers=headers)
+    assert r.status_code == 409
+    marks = client.get("/api/attendance/", params={"date": DAY}, headers=headers).json()
+    assert {m["student_id"]: m["status"] for m in marks}[first] == "absent"
+
+
+def test_first_save_with_a_version_conflicts(client, company):
+    # The client thought the sheet already existed; nothing is written
+    r = client.post("/api/attendance/", json={
+        "date": DAY, "records": _marks(company), "expected_version": 3,
+    }, headers=company["headers"])
+    assert r.status_code == 409
+    assert client.get("/api/attendance/", params={"date": DAY}, headers=company["headers"]).json() == []
+
+
+
+class _MissedSheet:
+    """The first UPDATE's result, as seen before a concurrent first save committed the sheet."""
+
+    def scalar(self):
+        return None
+
+
+def _race_first_save(company, day, expected_version):
+    """_bump_version where another save creates the sheet between its UPDATE and its INSERT."""
+    from routers.attendance import _bump_version
+
+    with company_scope(company["id"]), SessionLocal() as db:
+        db.add(AttendanceSheet(company_id=company["id"], date=day, version=1))
+        db.commit()
+        execute, calls = db.execute, []
+
+        def execute_missing_the_sheet_once(*args, **kwargs):
+            calls.append(args)
+            return _MissedSheet() if len(calls) == 1 else execute(*args, **kwargs)
+
+        db.execute = execute_missing_the_sheet_once
+        try:
+            return _bump_version(db, company["id"], day, expected_version)
+        finally:
+            db.rollback()
+
+
+def test_unconditional_save_goes_after_a_concurrent_first_save(company):
+    assert _race_first_save(company, date(2024, 3, 5), None) == 2
+
+
+def test_conditional_save_conflicts_with_a_concurrent_first_save(company):
+    with pytest.raises(HTTPException) as raised:
+        _race_first_save(company, date(2024, 3, 6), 0)
+    assert raised.value.status_code == 409
+
+
+# --- Rollups: the incrementally kept counts and bitmaps must equal a rebuild from raw marks ---
+DAYS = [date(2024, 1, 1), date(2024, 1, 31), date(2024, 2, 15)]
+
+
+@pytest.fixture
+def school(client, company):
+    """The company plus a second department with two more students."""
+    headers = company["headers"]
+    second = client.post("/api/departments/", json={"name": "Grade 2"}, headers=headers).json()["id"]
+    company["second_department_id"] = second
+    company["second_student_ids"] = [
+        client.post("/api/students/", json={
+            "name": f"Pupil {i}", "roll_number": f"P{i}", "department_id": second,
+        }, headers=headers).json()["id"]
+        for i in range(2)
+    ]
+    company["all_student_ids"] = company["student_ids"] + company["second_student_ids"]
+    return company
+
+
+def _rollups(db, company):
+    company_id = company["id"]
+    counts = {
+        department_id: daily_counts(db, company_id, DAYS[0], DAYS[-1], department_id)
+        for department_id in (None, company["department_id"], company["second_department_id"])
+    }
+    months = {
+        (r.student_id, r.month): (r.present_bits, r.absent_bits)
+        for r in db.query(AttendanceMonth).filter(AttendanceMonth.company_id == company_id)
+        # A member whose only mark of the month was cleared keeps an empty row
+        if r.present_bits or r.absent_bits
+    }
+    return counts, months
+
+
+def assert_rollups_match_rebuild(company):
+    with company_scope(company["id"]), SessionLocal() as db:
+        kept = _rollups(db, company)
+        rollups.rebuild_summary(db, company["id"])
+        rollups.rebuild_month_bits(db, company["id"])
+        rebuilt = _rollups(db, company)
+        db.rollback()
+    assert kept == rebuilt
+    return kept
+
+
+def _save(client, company, day, statuses, department_id=None):
+    records = [{"student_id": s, "status": st} for s, st in statuses.items()]
+    r = client.post("/api/attendance/", json={
+        "date": str(day), "records": records, "department_id": department_id,
+    }, headers=company["headers"])
+    assert r.status_code == 201, r.text
+
+
+def test_rollups_after_saves(client, school):
+    for n, day in enumerate(DAYS):
+        _save(client, school, day, {s: "present" if (s + n) % 2 else "absent" for s in school["all_student_ids"]})
+    counts, months = assert_rollups_match_rebuild(school)
+    assert sum(c.total for c in counts[None]) == len(DAYS) * len(school["all_student_ids"])
+    assert len(months) == 2 * len(school["all_student_ids"])
+
+
+def test_rollups_after_overwrites(client, school):
+    everyone = school["all_student_ids"]
+    _save(client, school, DAYS[1], {s: "present" for s in everyone})
+    # Flip one department, and drop a member from the other's sheet
+    _save(client, school, DAYS[1], {s: "absent" for s in school["second_student_ids"]},
+          department_id=school["second_department_id"])
+    _save(client, school, DAYS[1], {s: "absent" for s in school["student_ids"][1:]},
+          department_id=school["department_id"])
+    counts, _ = assert_rollups_match_rebuild(school)
+    day = next(c for c in counts[None] if c.day == DAYS[1])
+    assert (day.present, day.absent) == (0, len(everyone) - 1)
+
+
+def test_rollups_after_changes_and_cleared_marks(client, school):
+    first, second, *rest = school["all_student_ids"]
+    for day in DAYS[:2]:
+        _save(client, school, day, {s: "present" for s in school["all_student_ids"]})
+    r = client.patch("/api/attendance/", json={"date": str(DAYS[1]), "changes": [
+        {"student_id": first, "status": "absent"},
+        {"student_id": second, "status": None},
+        {"student_id": rest[0], "status": "present"},  # unchanged
+    ]}, headers=school["headers"])
+    assert r.status_code == 200, r.text
+    _, months = assert_rollups_match_rebuild(school)
+    january = DAYS[0].replace(day=1)
+    assert months[(first, january)] == (rollups.day_bit(DAYS[0]), rollups.day_bit(DAYS[1]))
+    assert months[(second, january)] == (rollups.day_bit(DAYS[0]), 0)
+
+
+def test_rollups_after_a_member_changes_department(client, school):
+    for n, day in enumerate(DAYS):
+        _save(client, school, day, {s: "present" if n % 2 else "absent" for s in school["all_student_ids"]})
+    moved = school["student_ids"][0]
+    r = client.put(f"/api/students/{moved}", json={
+        "name": "Student 0", "roll_number": "R0", "department_id": school["second_department_id"],
+    }, headers=school["headers"])
+    assert r.status_code == 200, r.text
+    counts, _ = assert_rollups_match_rebuild(school)
+    assert all(c.total == 2 for c in counts[school["department_id"]] if c.day in DAYS)
+    assert all(c.total == 3 for c in counts[school["second_department_id"]] if c.day in DAYS)
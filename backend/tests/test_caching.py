@@ -0,0 +1,117 @@
+"""Cached reads must never outlive the write that changes them."""
+from datetime import date
+
+import response_cache
+
+TODAY = str(date.today())
+
+
+def test_dashboard_reflects_attendance_and_member_writes(client, company):
+    headers = company["headers"]
+    stats = client.get("/api/dashboard/stats", headers=headers).json()
+    assert (stats["total_students"], stats["present_today"]) == (3, 0)
+    # Served from the cache until a write invalidates it
+    hits = response_cache.stats()["hits"]
+    assert client.get("/api/dashboard/stats", headers=headers).json() == stats
+    assert response_cache.stats()["hits"] == hits + 1
+    weekly = client.get("/api/dashboard/weekly", headers=headers).json()
+    assert weekly[-1]["present"] == 0
+
+    r = client.post("/api/attendance/", json={
+        "date": TODAY, "records": [{"student_id": s, "status": "present"} for s in company["student_ids"]],
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    assert client.get("/api/dashboard/stats", headers=headers).json()["present_today"] == 3
+    assert client.get("/api/dashboard/weekly", headers=headers).json()[-1]["present"] == 3
+
+    r = client.patch("/api/attendance/", json={
+        "date": TODAY, "changes": [{"student_id": company["student_ids"][0], "status": "absent"}],
+    }, headers=headers)
+    assert r.status_code == 200, r.text
+    stats = client.get("/api/dashboard/stats", headers=headers).json()
+    assert (stats["present_today"], stats["absent_today"]) == (2, 1)
+
+    client.post("/api/students/", json={
+        "name": "Newcomer", "roll_number": "R9", "department_id": company["department_id"],
+    }, headers=headers)
+    assert client.get("/api/dashboard/stats", headers=headers).json()["total_students"] == 4
+    client.delete(f"/api/students/{company['student_ids'][0]}", headers=headers)
+    stats = client.get("/api/dashboard/stats", headers=headers).json()
+    assert (stats["total_students"], stats["absent_today"]) == (3, 0)
+
+
+def test_settings_reflect_the_latest_update(client, company):
+    headers = company["headers"]
+    assert client.get("/api/settings/", headers=headers).json()["theme_id"] == "corporate"
+    hits = response_cache.stats()["hits"]
+    assert client.get("/api/settings/", headers=headers).json()["theme_id"] == "corporate"
+    assert response_cache.stats()["hits"] == hits + 1
+    r = client.put("/api/settings/", json={"theme_id": "medical"}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert client.get("/api/settings/", headers=headers).json()["theme_id"] == "medical"
+
+
+def _etag(client, path, headers, **params):
+    r = client.get(path, params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.headers["ETag"]
+
+
+def _revalidate(client, path, headers, etag, **params):
+    return client.get(path, params=params, headers={**headers, "If-None-Match": etag}).status_code
+
+
+def test_member_writes_change_the_etags(client, company):
+    headers = company["headers"]
+    students = _etag(client, "/api/students/", headers)
+    sheet = _etag(client, "/api/attendance/", headers, date=TODAY)
+    assert _revalidate(client, "/api/students/", headers, students) == 304
+    assert _revalidate(client, "/api/attendance/", headers, sheet, date=TODAY) == 304
+
+    r = client.put(f"/api/students/{company['student_ids'][0]}", json={
+        "name": "Renamed", "roll_number": "R0", "department_id": company["department_id"],
+    }, headers=headers)
+    assert r.status_code == 200, r.text
+    assert _revalidate(client, "/api/students/", headers, students) == 200
+    # The sheet embeds member names
+    assert _revalidate(client, "/api/attendance/", headers, sheet, date=TODAY) == 200
+
+    students = _etag(client, "/api/students/", headers)
+    client.post("/api/students/", json={"name": "Newcomer", "roll_number": "R9"}, headers=headers)
+    assert _revalidate(client, "/api/students/", headers, students) == 200
+
+    students = _etag(client, "/api/students/", headers)
+    client.delete(f"/api/students/{company['student_ids'][1]}", headers=headers)
+    assert _revalidate(client, "/api/students/", headers, students) == 200
+
+
+def test_department_writes_change_the_etags(client, company):
+    headers = company["headers"]
+    departments = _etag(client, "/api/departments/", headers)
+    students = _etag(client, "/api/students/", headers)
+    assert _revalidate(client, "/api/departments/", headers, departments) == 304
+
+    r = client.put(f"/api/departments/{company['department_id']}", json={"name": "Grade One"}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert _revalidate(client, "/api/departments/", headers, departments) == 200
+    # Members carry their department's name
+    assert _revalidate(client, "/api/students/", headers, students) == 200
+
+    departments = _etag(client, "/api/departments/", headers)
+    client.post("/api/departments/", json={"name": "Grade 2"}, headers=headers)
+    assert _revalidate(client, "/api/departments/", headers, departments) == 200
+
+
+def test_settings_update_changes_the_etag(client, company):
+    headers = company["headers"]
+    settings = _etag(client, "/api/settings/", headers)
+    assert _revalidate(client, "/api/settings/", headers, settings) == 304
+    client.put("/api/settings/", json={"theme_id": "medical"}, headers=headers)
+    assert _revalidate(client, "/api/settings/", headers, settings) == 200
+
+
+def test_etags_are_per_company(client, company, signup):
+    _, other = signup()
+    students = _etag(client, "/api/students/", company["headers"])
+    client.post("/api/students/", json={"name": "Elsewhere", "roll_number": "E1"}, headers=other)
+    assert _revalidate(client, "/api/students/", company["headers"], students) == 304
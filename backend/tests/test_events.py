@@ -0,0 +1,40 @@
+"""Event stream authentication: only short-lived stream tokens may travel in the URL."""
+import events
+from routers import events as events_router
+
+
+def test_login_token_is_refused_in_the_query_string(client, signup):
+    _, headers = signup()
+    login_token = headers["Authorization"].removeprefix("Bearer ")
+    assert client.get("/api/events/", params={"token": login_token}).status_code == 401
+
+
+def test_stream_token_only_opens_streams(client, signup, monkeypatch):
+    # End the stream right after its first line, so the response completes
+    monkeypatch.setattr(events_router, "STREAM_MAX_SECONDS", 0)
+    _, headers = signup()
+    r = client.post("/api/events/token", headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["expires_in"] <= 60
+    stream_token = r.json()["token"]
+
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {stream_token}"}).status_code == 401
+    r = client.get("/api/events/", params={"token": stream_token})
+    assert r.status_code == 200
+    assert r.text.startswith("retry:")
+
+
+def test_stream_token_needs_a_login(client):
+    assert client.post("/api/events/token").status_code in (401, 403)
+
+
+def test_publish_failures_are_logged_and_counted(monkeypatch, caplog):
+    def fail(company_id, event):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(events.broker, "publish", fail)
+    failures = events.PUBLISH_FAILURES._values.get((), 0)
+    events.publish(1, {"type": "refresh"})
+
+    assert events.PUBLISH_FAILURES._values[()] == failures + 1
+    assert "could not publish refresh event for company 1" in caplog.text
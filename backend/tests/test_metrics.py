@@ -0,0 +1,38 @@
+"""Statement timing on the instrumented engines."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from database import engine
+
+
+def _observed(label):
+    return sum(metrics.QUERY_SECONDS._values.get((label,), [0])[:-1])
+
+
+def test_failed_statements_are_timed_and_leave_no_state_behind():
+    seen = []
+    metrics.on_query(lambda statement, parameters, seconds, label: seen.append(statement))
+    try:
+        before = _observed("sync")
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert not conn.info.get("metrics_query_start")
+            conn.execute(text("SELECT 1"))
+            assert not conn.info.get("metrics_query_start")
+    finally:
+        metrics._query_listeners.pop()
+
+    assert _observed("sync") == before + 2
+    assert seen == ["SELECT * FROM no_such_table", "SELECT 1"]
+
+
+def test_pools_without_the_private_checkout_hook_are_left_alone():
+    class Pool:
+        pass
+
+    pool = Pool()
+    metrics._time_checkouts(pool, "test")
+    assert not hasattr(pool, "_do_get")
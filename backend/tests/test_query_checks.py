@@ -0,0 +1,17 @@
+"""The query-plan and query-count checks, so an index or N+1 regression fails the test run.
+
+Both modules drive the app through their own scenario; their printed report is
+shown by pytest when a check fails.
+"""
+
+
+def test_router_queries_use_an_index():
+    import query_plans
+
+    assert query_plans.main_check() == 0
+
+
+def test_endpoint_query_counts_do_not_grow_with_the_data():
+    import query_scaling
+
+    assert query_scaling.main_check() == 0
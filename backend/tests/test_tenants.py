@@ -0,0 +1,89 @@
+"""One company can neither see nor change another company's data.
+
+The same tests run a second time in a subprocess with TENANT_DATABASE_URL set,
+so they also cover the one-database-per-company layout.
+"""
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+from database import TENANT_DATABASE_URL, shard_url
+
+TODAY = str(date.today())
+
+
+@pytest.fixture
+def two_companies(client, company, signup):
+    other_id, other_headers = signup()
+    r = client.post("/api/attendance/", json={
+        "date": TODAY, "records": [{"student_id": s, "status": "present"} for s in company["student_ids"]],
+    }, headers=company["headers"])
+    assert r.status_code == 201, r.text
+    r = client.post("/api/employees/", json={"name": "Teacher", "email": f"teacher{company['id']}@test.io"}, headers=company["headers"])
+    assert r.status_code == 201, r.text
+    return company, {"id": other_id, "headers": other_headers}
+
+
+def test_lists_show_only_own_company(client, two_companies):
+    owner, other = two_companies
+    headers = other["headers"]
+    assert client.get("/api/students/", headers=headers).json()["items"] == []
+    assert client.get("/api/departments/", headers=headers).json() == []
+    assert client.get("/api/attendance/history", headers=headers).json()["items"] == []
+    assert client.get("/api/attendance/", params={"date": TODAY}, headers=headers).json() == []
+    assert client.get("/api/attendance/export", headers=headers).text.splitlines()[1:] == []
+    assert client.get("/api/dashboard/stats", headers=headers).json()["total_students"] == 0
+    assert client.get("/api/employees/", headers=headers).json() == []
+    assert client.get("/api/settings/", headers=headers).json()["id"] == other["id"]
+    # The owner still sees its own
+    assert len(client.get("/api/attendance/history", headers=owner["headers"]).json()["items"]) == 3
+    assert len(client.get("/api/employees/", headers=owner["headers"]).json()) == 1
+
+
+def test_cannot_touch_another_companys_records(client, two_companies):
+    owner, other = two_companies
+    headers, student_id = other["headers"], owner["student_ids"][0]
+
+    r = client.put(f"/api/students/{student_id}", json={"name": "Taken", "roll_number": "X"}, headers=headers)
+    assert r.status_code == 404
+    assert client.delete(f"/api/students/{student_id}", headers=headers).status_code == 404
+    assert client.get(f"/api/analytics/heatmap/students/{student_id}", params={"year": 2024}, headers=headers).status_code == 404
+    r = client.put(f"/api/departments/{owner['department_id']}", json={"name": "Taken"}, headers=headers)
+    assert r.status_code == 404
+    assert client.delete(f"/api/departments/{owner['department_id']}", headers=headers).status_code == 404
+
+    r = client.post("/api/attendance/", json={
+        "date": TODAY, "records": [{"student_id": student_id, "status": "absent"}],
+    }, headers=headers)
+    assert r.status_code in (400, 404)
+    r = client.patch("/api/attendance/", json={
+        "date": TODAY, "changes": [{"student_id": student_id, "status": None}],
+    }, headers=headers)
+    assert r.status_code in (400, 404)
+
+    names = {s["name"] for s in client.get("/api/students/", headers=owner["headers"]).json()["items"]}
+    assert names == {"Student 0", "Student 1", "Student 2"}
+    marks = client.get("/api/attendance/", params={"date": TODAY}, headers=owner["headers"]).json()
+    assert {m["status"] for m in marks} == {"present"}
+
+
+@pytest.mark.skipif(not TENANT_DATABASE_URL, reason="single-database run")
+def test_each_company_has_its_own_database(two_companies):
+    owner, other = two_companies
+    assert shard_url(owner["id"]) != shard_url(other["id"])
+    for company in (owner, other):
+        path = shard_url(company["id"]).removeprefix("sqlite:///")
+        assert os.path.exists(path)
+
+
+@pytest.mark.skipif(bool(TENANT_DATABASE_URL), reason="already the sharded run")
+def test_isolation_holds_with_a_database_per_company(tmp_path):
+    env = dict(os.environ, TENANT_DATABASE_URL=f"sqlite:///{tmp_path}/company_{{company_id}}.db")
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", __file__],
+        cwd=os.path.dirname(os.path.dirname(__file__)), env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
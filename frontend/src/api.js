@@ -38,15 +38,27 @@ export const login = (data) => api.post('/api/auth/login', data);
 export const getMe = () => api.get('/api/auth/me');
 
 // --- Students ---
-export const getStudents = () => api.get('/api/students/');
+// params: { q, department_id, cursor, limit } → { items, next_cursor, total }
+export const getStudents = (params) => api.get('/api/students/', { params });
 export const createStudent = (data) => api.post('/api/students/', data);
 export const updateStudent = (id, data) => api.put(`/api/students/${id}`, data);
 export const deleteStudent = (id) => api.delete(`/api/students/${id}`);
+// file: CSV (header row) or JSON array with name, roll_number, department | department_id
+// → { created, errors: [{ row, error }] }
+export const importStudents = (file) => {
+    const form = new FormData();
+    form.append('file', file);
+    return api.post('/api/students/import', form, { headers: { 'Content-Type': 'multipart/form-data' } });
+};
 
 // --- Attendance ---
 export const markAttendance = (data) => api.post('/api/attendance/', data);
+export const applyAttendanceChanges = (data) => api.patch('/api/attendance/', data);
 export const getAttendanceByDate = (date) => api.get('/api/attendance/', { params: { date } });
-export const getAttendanceHistory = () => api.get('/api/attendance/history');
+// params: { cursor, limit, start, end, department_id, student_id, status } → { items, next_cursor }
+export const getAttendanceHistory = (params) => api.get('/api/attendance/history', { params });
+// params: { format: 'csv' | 'ndjson', start, end, department_id, status } → file download (Blob)
+export const exportAttendance = (params) => api.get('/api/attendance/export', { params, responseType: 'blob' });
 
 // --- Dashboard ---
 export const getDashboardStats = () => api.get('/api/dashboard/stats');
@@ -66,5 +78,35 @@ export const updateSettings = (data) => api.put('/api/settings/', data);
 export const getEmployees = () => api.get('/api/employees/');
 export const createEmployee = (data) => api.post('/api/employees/', data);
 export const deleteEmployee = (id) => api.delete(`/api/employees/${id}`);
+// file: CSV or JSON with name, email, department | department_id → { created: [...], errors }
+export const importEmployees = (file) => {
+    const form = new FormData();
+    form.append('file', file);
+    return api.post('/api/employees/import', form, { headers: { 'Content-Type': 'multipart/form-data' } });
+};
+
+// --- Analytics ---
+// params: { start, end, department_id, sort, order: 'asc' | 'desc', limit }
+export const getStudentAnalytics = (params) => api.get('/api/analytics/students', { params });
+// Bitmaps: bit d-1 of present_bits / absent_bits is day d of the month
+export const getMonthHeatmap = (params) => api.get('/api/analytics/heatmap/month', { params }); // { month: 'YYYY-MM', department_id }
+export const getStudentYearHeatmap = (id, year) => api.get(`/api/analytics/heatmap/students/${id}`, { params: { year } });
+export const getYearHeatmap = (params) => api.get('/api/analytics/heatmap/year', { params }); // { year, department_id }
+
+// --- Diagnostics (admin) ---
+export const getSlowQueries = (params) => api.get('/api/diagnostics/slow-queries', { params }); // { limit }
+export const getProfiles = () => api.get('/api/diagnostics/profiles');
+// Folded stacks as text; open in speedscope or flamegraph.pl
+export const getProfile = (id) => api.get(`/api/diagnostics/profiles/${id}`, { responseType: 'text' });
+
+// --- Events ---
+// Server-sent events for the company. EventSource cannot send headers, so the URL carries a
+// one-minute stream-only token (never the login token, which would end up in access logs).
+// Messages: { type: 'attendance', counts: [[department_id, 'YYYY-MM-DD', d_present, d_absent]] }
+//           { type: 'members', counts: [[department_id, d_members]] } | { type: 'refresh' }
+export const openEventStream = async () => {
+    const { data } = await api.post('/api/events/token');
+    return new EventSource(`${API_URL}/api/events/?token=${encodeURIComponent(data.token)}`);
+};
 
 export default api;
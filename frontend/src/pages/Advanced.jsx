@@ -1,11 +1,11 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { getEmployees, createEmployee, deleteEmployee, getDepartments } from '../api';
+import { getEmployees, createEmployee, deleteEmployee, getDepartments, importEmployees, getStudentAnalytics } from '../api';
 import { useTheme } from '../context/ThemeContext';
 import { toast } from 'react-hot-toast';
 import {
     Zap, Plus, Trash2, Loader, Users, Mail, User, Building,
-    Eye, EyeOff, Copy, X
+    Eye, EyeOff, Copy, X, Upload, TrendingDown
 } from 'lucide-react';
 
 export default function Advanced() {
@@ -25,6 +25,12 @@ export default function Advanced() {
     });
     const departments = deptData?.data || [];
 
+    const { data: absenteeData } = useQuery({
+        queryKey: ['analytics', 'absentees'],
+        queryFn: () => getStudentAnalytics({ sort: 'current_absence_streak', order: 'desc', limit: 10 }),
+    });
+    const absentees = (absenteeData?.data || []).filter(s => s.current_absence_streak > 0);
+
     const deleteMutation = useMutation({
         mutationFn: deleteEmployee,
         onSuccess: () => {
@@ -34,6 +40,38 @@ export default function Advanced() {
         onError: () => toast.error('Failed to delete'),
     });
 
+    const fileInput = useRef(null);
+    const importMutation = useMutation({
+        mutationFn: importEmployees,
+        onSuccess: ({ data }) => {
+            queryClient.invalidateQueries(['employees']);
+            if (data.created.length) {
+                // Generated passwords are only returned once; hand them over as a file
+                const rows = data.created.map(e => [e.name, e.email, e.generated_password]
+                    .map(v => `"${String(v).replace(/"/g, '""')}"`).join(','));
+                const blob = new Blob([['name,email,password', ...rows].join('\n')], { type: 'text/csv' });
+                const link = document.createElement('a');
+                link.href = URL.createObjectURL(blob);
+                link.download = 'employee_credentials.csv';
+                link.click();
+                URL.revokeObjectURL(link.href);
+            }
+            toast.success(`Created ${data.created.length} employee accounts. Credentials downloaded.`);
+            if (data.errors.length) {
+                const shown = data.errors.slice(0, 5).map(e => `Row ${e.row}: ${e.error}`).join('\n');
+                const more = data.errors.length > 5 ? `\n…and ${data.errors.length - 5} more` : '';
+                toast.error(`${data.errors.length} rows skipped\n${shown}${more}`, { duration: 8000 });
+            }
+        },
+        onError: (err) => toast.error(err.response?.data?.detail || 'Import failed'),
+    });
+
+    const handleImport = (e) => {
+        const file = e.target.files?.[0];
+        e.target.value = '';
+        if (file) importMutation.mutate(file);
+    };
+
     const handleDelete = (id, name) => {
         toast((t) => (
             <div style={{ display: 'flex', flexDirection: 'column', gap: 10 }}>
@@ -54,9 +92,19 @@ export default function Advanced() {
                     <h1><Zap size={22} style={{ verticalAlign: 'middle', marginRight: 8 }} /> Advanced</h1>
                     <p>Manage employee login accounts for your organization</p>
                 </div>
-                <button className="btn btn-primary" onClick={() => setShowModal(true)}>
-                    <Plus size={15} /> Create Employee Account
-                </button>
+                <div style={{ display: 'flex', gap: 8 }}>
+                    <input ref={fileInput} type="file" accept=".csv,.json" style={{ display: 'none' }} onChange={handleImport} />
+                    <button className="btn btn-ghost" style={{ border: '1px solid var(--border)' }}
+                        onClick={() => fileInput.current?.click()} disabled={importMutation.isPending}
+                        title="CSV or JSON with name, email and department columns">
+                        {importMutation.isPending
+                            ? <><Loader size={14} className="spin" /> Importing...</>
+                            : <><Upload size={14} /> Import</>}
+                    </button>
+                    <button className="btn btn-primary" onClick={() => setShowModal(true)}>
+                        <Plus size={15} /> Create Employee Account
+                    </button>
+                </div>
             </div>
 
             <div className="card">
@@ -114,6 +162,44 @@ export default function Advanced() {
                 )}
             </div>
 
+            <div className="card" style={{ marginTop: 20 }}>
+                <h3 style={{ marginTop: 0, display: 'flex', alignItems: 'center', gap: 8 }}>
+                    <TrendingDown size={16} /> Longest current absence streaks (last 30 days)
+                </h3>
+                {absentees.length === 0 ? (
+                    <p style={{ color: 'var(--text-muted)', margin: 0 }}>No one is on an absence streak.</p>
+                ) : (
+                    <div className="table-wrapper">
+                        <table>
+                            <thead>
+                                <tr>
+                                    <th>Name</th>
+                                    <th>ID</th>
+                                    <th>Department</th>
+                                    <th>Attendance</th>
+                                    <th>Current streak</th>
+                                    <th>Longest streak</th>
+                                    <th>Last seen</th>
+                                </tr>
+                            </thead>
+                            <tbody>
+                                {absentees.map(s => (
+                                    <tr key={s.student_id}>
+                                        <td style={{ fontWeight: 600 }}>{s.name}</td>
+                                        <td style={{ color: 'var(--text-secondary)' }}>{s.roll_number}</td>
+                                        <td>{s.department_name || <span style={{ color: 'var(--text-muted)' }}>—</span>}</td>
+                                        <td>{s.attendance_rate ?? 0}%</td>
+                                        <td style={{ color: 'var(--red)', fontWeight: 600 }}>{s.current_absence_streak}</td>
+                                        <td>{s.longest_absence_streak}</td>
+                                        <td style={{ color: 'var(--text-secondary)' }}>{s.last_seen || 'Never'}</td>
+                                    </tr>
+                                ))}
+                            </tbody>
+                        </table>
+                    </div>
+                )}
+            </div>
+
             {showModal && (
                 <CreateEmployeeModal
                     departments={departments}
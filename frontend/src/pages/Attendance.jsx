@@ -1,8 +1,8 @@
-import React, { useState, useEffect } from 'react';
-import { getStudents, markAttendance, getAttendanceByDate } from '../api';
+import React, { useState, useEffect, useMemo } from 'react';
+import { getStudents, applyAttendanceChanges, getAttendanceByDate, getDepartments } from '../api';
 import { useTheme } from '../context/ThemeContext';
 import { CalendarDays, CheckCircle, XCircle, Save, Loader, ClipboardCheck } from 'lucide-react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { toast } from 'react-hot-toast';
 
 export default function Attendance() {
@@ -14,12 +14,35 @@ export default function Attendance() {
 
     const [date, setDate] = useState(new Date().toISOString().split('T')[0]);
     const [statuses, setStatuses] = useState({});
+    const [saved, setSaved] = useState({});
+    const [deptFilter, setDeptFilter] = useState('');
 
-    const { data: studentsData, isLoading: loadingStudents } = useQuery({
-        queryKey: ['students'],
-        queryFn: getStudents,
+    const { data: deptData } = useQuery({
+        queryKey: ['departments'],
+        queryFn: getDepartments,
     });
-    const students = studentsData?.data || [];
+    const departments = deptData?.data || [];
+
+    // The roster is paged from the server; more pages load on demand
+    const {
+        data: studentsData,
+        isLoading: loadingStudents,
+        fetchNextPage,
+        hasNextPage,
+        isFetchingNextPage,
+    } = useInfiniteQuery({
+        queryKey: ['students', '', deptFilter],
+        queryFn: ({ pageParam }) => getStudents({
+            department_id: deptFilter || undefined,
+            cursor: pageParam || undefined,
+        }),
+        initialPageParam: null,
+        getNextPageParam: (lastPage) => lastPage.data.next_cursor ?? undefined,
+    });
+    const students = useMemo(
+        () => studentsData?.pages.flatMap(p => p.data.items) ?? [],
+        [studentsData],
+    );
 
     const { data: historyData, isLoading: loadingHistory } = useQuery({
         queryKey: ['attendance', date],
@@ -27,17 +50,21 @@ export default function Attendance() {
         enabled: students.length > 0,
     });
 
+    // A (re)loaded date resets edits to what is stored
     useEffect(() => {
-        if (!students.length) return;
-        const history = historyData?.data || [];
-        const map = {};
-        if (history.length > 0) {
-            history.forEach(r => { map[r.student_id] = r.status; });
+        const stored = {};
+        (historyData?.data || []).forEach(r => { stored[r.student_id] = r.status; });
+        setSaved(stored);
+        setStatuses(stored);
+    }, [historyData]);
+
+    // Newly loaded roster pages default to present without touching existing edits
+    useEffect(() => {
+        setStatuses(prev => {
+            const map = { ...prev };
             students.forEach(s => { if (!map[s.id]) map[s.id] = 'present'; });
-        } else {
-            students.forEach(s => { map[s.id] = 'present'; });
-        }
-        setStatuses(map);
+            return map;
+        });
     }, [students, historyData]);
 
     const loading = loadingStudents || loadingHistory;
@@ -47,26 +74,40 @@ export default function Attendance() {
     };
 
     const mutation = useMutation({
-        mutationFn: (records) => markAttendance({ date, records }),
+        // Only send marks that differ from what is stored; the server rejects the
+        // save with 409 if someone else changed this date since we loaded it
+        mutationFn: (changes) => applyAttendanceChanges({
+            date,
+            changes,
+            department_id: deptFilter ? Number(deptFilter) : undefined,
+            expected_version: Number(historyData?.headers?.['x-attendance-version'] ?? 0),
+        }),
         onSuccess: () => {
             queryClient.invalidateQueries(['attendance']);
             queryClient.invalidateQueries(['dashboard']);
             toast.success('Attendance saved successfully!');
         },
-        onError: () => {
-            toast.error('Failed to save attendance.');
+        onError: (err) => {
+            if (err.response?.status === 409) {
+                queryClient.invalidateQueries(['attendance', date]);
+                toast.error('Attendance was changed by someone else. Reloaded — please review and save again.');
+            } else {
+                toast.error('Failed to save attendance.');
+            }
         }
     });
 
     const handleSubmit = () => {
-        const records = students.map(s => ({ student_id: s.id, status: statuses[s.id] }));
-        mutation.mutate(records);
+        const changes = students
+            .filter(s => statuses[s.id] !== saved[s.id])
+            .map(s => ({ student_id: s.id, status: statuses[s.id] }));
+        mutation.mutate(changes);
     };
 
     const markAll = (status) => {
         const updated = {};
         students.forEach(s => { updated[s.id] = status; });
-        setStatuses(updated);
+        setStatuses(prev => ({ ...prev, ...updated }));
     };
 
     const presentCount = Object.values(statuses).filter(v => v === 'present').length;
@@ -82,6 +123,11 @@ export default function Attendance() {
                     <p>Toggle status for each {occupation?.memberLabel?.toLowerCase() ?? 'member'}</p>
                 </div>
                 <div style={{ display: 'flex', alignItems: 'center', gap: 10, flexWrap: 'wrap' }}>
+                    <select className="input" style={{ width: 'auto', minWidth: 160 }}
+                        value={deptFilter} onChange={e => setDeptFilter(e.target.value)}>
+                        <option value="">All {groupLabel.toLowerCase()}s</option>
+                        {departments.map(d => <option key={d.id} value={d.id}>{d.name}</option>)}
+                    </select>
                     {/* Date picker */}
                     <div style={{
                         display: 'flex', alignItems: 'center', gap: 8,
@@ -163,7 +209,7 @@ export default function Attendance() {
                                                     {s.roll_number}
                                                 </span>
                                             </td>
-                                            <td style={{ color: 'var(--text-secondary)' }}>{s.department}</td>
+                                            <td style={{ color: 'var(--text-secondary)' }}>{s.department_name ?? '—'}</td>
                                             <td>
                                                 <button
                                                     className={`toggle-btn ${isPresent ? 'toggle-present' : 'toggle-absent'}`}
@@ -177,6 +223,14 @@ export default function Attendance() {
                                 })}
                             </tbody>
                         </table>
+                        {hasNextPage && (
+                            <div style={{ display: 'flex', justifyContent: 'center', padding: '14px 0' }}>
+                                <button className="btn btn-ghost" style={{ fontSize: '0.78rem', border: '1px solid var(--border)' }}
+                                    onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+                                    {isFetchingNextPage ? <><Loader size={13} className="spin" /> Loading...</> : `Load more ${memberLabelPlural.toLowerCase()}`}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>
@@ -1,6 +1,6 @@
-import React from 'react';
-import { useQuery } from '@tanstack/react-query';
-import { getDashboardStats, getWeeklyData, getAttendanceHistory } from '../api';
+import React, { useEffect, useState } from 'react';
+import { useQuery, useInfiniteQuery, useQueryClient } from '@tanstack/react-query';
+import { getDashboardStats, getWeeklyData, getAttendanceHistory, exportAttendance, openEventStream } from '../api';
 import { useTheme } from '../context/ThemeContext';
 import {
     BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Legend
@@ -31,28 +31,110 @@ const CustomTooltip = ({ active, payload, label }) => {
     return null;
 };
 
-// CSV export helper
-function exportCSV(history, occupation) {
-    const idLabel = occupation?.idLabel ?? 'ID';
-    const groupLabel = occupation?.groupLabel ?? 'Group';
-    const header = ['Date', 'Name', idLabel, groupLabel, 'Status'];
-    const rows = history.map(rec => [
-        rec.date,
-        rec.student?.name ?? '',
-        rec.student?.roll_number ?? '',
-        rec.student?.department ?? '',
-        rec.status,
-    ]);
-    const csv = [header, ...rows].map(r => r.map(v => `"${v}"`).join(',')).join('\n');
-    const blob = new Blob([csv], { type: 'text/csv' });
-    const url = URL.createObjectURL(blob);
+// CSV export — the server streams every record, not just the loaded pages
+async function downloadCSV() {
+    const res = await exportAttendance({ format: 'csv' });
+    const match = /filename="([^"]+)"/.exec(res.headers['content-disposition'] ?? '');
+    const url = URL.createObjectURL(res.data);
     const a = document.createElement('a');
     a.href = url;
-    a.download = `attendance_${new Date().toISOString().split('T')[0]}.csv`;
+    a.download = match?.[1] ?? `attendance_${new Date().toISOString().split('T')[0]}.csv`;
     a.click();
     URL.revokeObjectURL(url);
 }
 
+const isoDate = (d) =>
+    `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+
+const percentage = (present, total) => (total > 0 ? Math.round((present / total) * 1000) / 10 : 0);
+
+// Delay before reopening a dropped event stream
+const RECONNECT_MS = 3000;
+
+// Apply pushed deltas to the cached dashboard queries instead of refetching them
+function useDashboardEvents() {
+    const queryClient = useQueryClient();
+
+    useEffect(() => {
+        let source = null;
+        let retry = null;
+        let stopped = false;
+        const updateStats = (fn) =>
+            queryClient.setQueryData(['dashboard', 'stats'], (old) => old && { ...old, data: fn(old.data) });
+
+        const onMessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.type === 'attendance') {
+                const today = new Date();
+                const todayIso = isoDate(today);
+                let present = 0, absent = 0;
+                const weeklyDeltas = {};
+                event.counts.forEach(([, day, dp, da]) => {
+                    if (day === todayIso) {
+                        present += dp;
+                        absent += da;
+                    }
+                    const daysAgo = Math.round((new Date(todayIso) - new Date(day)) / 86400000);
+                    const prev = weeklyDeltas[daysAgo] ?? [0, 0];
+                    weeklyDeltas[daysAgo] = [prev[0] + dp, prev[1] + da];
+                });
+                updateStats((stats) => ({
+                    ...stats,
+                    present_today: stats.present_today + present,
+                    absent_today: stats.absent_today + absent,
+                    attendance_percentage: percentage(stats.present_today + present, stats.total_students),
+                }));
+                queryClient.setQueryData(['dashboard', 'weekly'], (old) => old && {
+                    ...old,
+                    data: old.data.map((entry, i) => {
+                        const delta = weeklyDeltas[old.data.length - 1 - i];
+                        return delta ? { ...entry, present: entry.present + delta[0], absent: entry.absent + delta[1] } : entry;
+                    }),
+                });
+                queryClient.invalidateQueries({ queryKey: ['attendance', 'history'] });
+            } else if (event.type === 'members') {
+                const added = event.counts.reduce((sum, [, n]) => sum + n, 0);
+                updateStats((stats) => ({
+                    ...stats,
+                    total_students: stats.total_students + added,
+                    attendance_percentage: percentage(stats.present_today, stats.total_students + added),
+                }));
+            } else {
+                queryClient.invalidateQueries({ queryKey: ['dashboard'] });
+                queryClient.invalidateQueries({ queryKey: ['attendance', 'history'] });
+            }
+        };
+        // Stream tokens expire within a minute, so EventSource's own reconnect (same URL) would be
+        // refused: every reconnect asks for a new token instead
+        const reconnect = () => {
+            if (!stopped) retry = setTimeout(connect, RECONNECT_MS);
+        };
+        const connect = async () => {
+            try {
+                source = await openEventStream();
+            } catch {
+                reconnect();
+                return;
+            }
+            if (stopped) {
+                source.close();
+                return;
+            }
+            source.onmessage = onMessage;
+            source.onerror = () => {
+                source.close();
+                reconnect();
+            };
+        };
+        connect();
+        return () => {
+            stopped = true;
+            clearTimeout(retry);
+            source?.close();
+        };
+    }, [queryClient]);
+}
+
 const cardVariants = {
     hidden: { opacity: 0, y: 20 },
     visible: (i) => ({
@@ -64,6 +146,8 @@ const cardVariants = {
 
 export default function Dashboard() {
     const { occupation } = useTheme();
+    const [exporting, setExporting] = useState(false);
+    useDashboardEvents();
 
     const { data: statsData, isLoading: loadingStats } = useQuery({
         queryKey: ['dashboard', 'stats'],
@@ -73,9 +157,17 @@ export default function Dashboard() {
         queryKey: ['dashboard', 'weekly'],
         queryFn: getWeeklyData,
     });
-    const { data: historyData, isLoading: loadingHistory } = useQuery({
+    const {
+        data: historyData,
+        isLoading: loadingHistory,
+        fetchNextPage,
+        hasNextPage,
+        isFetchingNextPage,
+    } = useInfiniteQuery({
         queryKey: ['attendance', 'history'],
-        queryFn: getAttendanceHistory,
+        queryFn: ({ pageParam }) => getAttendanceHistory(pageParam ? { cursor: pageParam } : {}),
+        initialPageParam: null,
+        getNextPageParam: (lastPage) => lastPage.data.next_cursor ?? undefined,
     });
 
     const loading = loadingStats || loadingWeekly || loadingHistory;
@@ -91,7 +183,7 @@ export default function Dashboard() {
 
     const stats = statsData?.data;
     const weekly = weeklyData?.data ?? [];
-    const history = historyData?.data ?? [];
+    const history = historyData?.pages.flatMap(p => p.data.items) ?? [];
 
     const statCards = [
         { icon: Users, label: `Total ${occupation?.memberLabelPlural ?? 'Members'}`, value: stats?.total_students ?? 0, color: 'var(--blue)', bg: 'var(--blue-bg)' },
@@ -200,9 +292,15 @@ export default function Dashboard() {
                         <button
                             className="btn btn-ghost"
                             style={{ display: 'flex', alignItems: 'center', gap: 6, fontSize: '0.78rem', border: '1px solid var(--border)' }}
-                            onClick={() => exportCSV(history, occupation)}
+                            disabled={exporting}
+                            onClick={() => {
+                                setExporting(true);
+                                downloadCSV().finally(() => setExporting(false));
+                            }}
                         >
-                            <Download size={13} /> Export CSV
+                            {exporting
+                                ? <><Loader size={13} className="spin" /> Exporting...</>
+                                : <><Download size={13} /> Export CSV</>}
                         </button>
                     )}
                 </div>
@@ -268,6 +366,18 @@ export default function Dashboard() {
                                 </div>
                             );
                         })}
+                        {hasNextPage && (
+                            <button
+                                className="btn btn-ghost"
+                                style={{ alignSelf: 'center', fontSize: '0.78rem', border: '1px solid var(--border)' }}
+                                onClick={() => fetchNextPage()}
+                                disabled={isFetchingNextPage}
+                            >
+                                {isFetchingNextPage
+                                    ? <><Loader size={13} className="spin" /> Loading...</>
+                                    : 'Load older records'}
+                            </button>
+                        )}
                     </div>
                 )}
             </div>
@@ -1,8 +1,8 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useTheme } from '../context/ThemeContext';
-import { Plus, Trash2, Pencil, Search, Loader, Users, X } from 'lucide-react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { getStudents, createStudent, updateStudent, deleteStudent, getDepartments } from '../api';
+import { Plus, Trash2, Pencil, Search, Loader, Users, X, Upload } from 'lucide-react';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { getStudents, createStudent, updateStudent, deleteStudent, getDepartments, importStudents } from '../api';
 import { useForm } from 'react-hook-form';
 import { zodResolver } from '@hookform/resolvers/zod';
 import * as z from 'zod';
@@ -27,6 +27,8 @@ const itemVariants = {
 export default function Students() {
     const { theme } = useTheme();
     const [search, setSearch] = useState('');
+    const [query, setQuery] = useState('');
+    const [deptFilter, setDeptFilter] = useState('');
     const queryClient = useQueryClient();
     const [showAdd, setShowAdd] = useState(false);
     const [editTarget, setEditTarget] = useState(null);
@@ -36,11 +38,30 @@ export default function Students() {
     const idLabel = theme?.idLabel ?? 'ID';
     const groupLabel = theme?.groupLabel ?? 'Department';
 
-    const { data: studentsData, isLoading: loading } = useQuery({
-        queryKey: ['students'],
-        queryFn: getStudents,
+    // Search runs on the server (name / ID prefix); wait for typing to pause
+    useEffect(() => {
+        const t = setTimeout(() => setQuery(search.trim()), 250);
+        return () => clearTimeout(t);
+    }, [search]);
+
+    const {
+        data: studentsData,
+        isLoading: loading,
+        fetchNextPage,
+        hasNextPage,
+        isFetchingNextPage,
+    } = useInfiniteQuery({
+        queryKey: ['students', query, deptFilter],
+        queryFn: ({ pageParam }) => getStudents({
+            q: query || undefined,
+            department_id: deptFilter || undefined,
+            cursor: pageParam || undefined,
+        }),
+        initialPageParam: null,
+        getNextPageParam: (lastPage) => lastPage.data.next_cursor ?? undefined,
     });
-    const students = studentsData?.data || [];
+    const students = studentsData?.pages.flatMap(p => p.data.items) ?? [];
+    const total = studentsData?.pages[0]?.data.total ?? students.length;
 
     const { data: deptData } = useQuery({
         queryKey: ['departments'],
@@ -48,15 +69,6 @@ export default function Students() {
     });
     const departments = deptData?.data || [];
 
-    const filtered = students.filter(s => {
-        const q = search.toLowerCase();
-        return (
-            s.name.toLowerCase().includes(q) ||
-            s.roll_number.toLowerCase().includes(q) ||
-            (s.department_name || '').toLowerCase().includes(q)
-        );
-    });
-
     const deleteMutation = useMutation({
         mutationFn: deleteStudent,
         onSuccess: () => {
@@ -67,6 +79,29 @@ export default function Students() {
         onError: () => toast.error(`Failed to delete ${memberLabel.toLowerCase()}.`),
     });
 
+    // Bulk roster upload; rows that fail validation are reported, the rest are added
+    const fileInput = useRef(null);
+    const importMutation = useMutation({
+        mutationFn: importStudents,
+        onSuccess: ({ data }) => {
+            queryClient.invalidateQueries(['students']);
+            queryClient.invalidateQueries(['dashboard']);
+            toast.success(`Imported ${data.created} ${memberLabelPlural.toLowerCase()}.`);
+            if (data.errors.length) {
+                const shown = data.errors.slice(0, 5).map(e => `Row ${e.row}: ${e.error}`).join('\n');
+                const more = data.errors.length > 5 ? `\n…and ${data.errors.length - 5} more` : '';
+                toast.error(`${data.errors.length} rows skipped\n${shown}${more}`, { duration: 8000 });
+            }
+        },
+        onError: (err) => toast.error(err.response?.data?.detail || 'Import failed.'),
+    });
+
+    const handleImport = (e) => {
+        const file = e.target.files?.[0];
+        e.target.value = '';
+        if (file) importMutation.mutate(file);
+    };
+
     const handleDelete = (id, name) => {
         toast((t) => (
             <div style={{ display: 'flex', flexDirection: 'column', gap: 10 }}>
@@ -85,27 +120,42 @@ export default function Students() {
                 <div>
                     <div className="accent-line" />
                     <h1>{memberLabelPlural}</h1>
-                    <p>{students.length} {memberLabelPlural.toLowerCase()} enrolled</p>
+                    <p>{total} {memberLabelPlural.toLowerCase()} {query || deptFilter ? 'found' : 'enrolled'}</p>
+                </div>
+                <div style={{ display: 'flex', gap: 8 }}>
+                    <input ref={fileInput} type="file" accept=".csv,.json" style={{ display: 'none' }} onChange={handleImport} />
+                    <button className="btn btn-ghost" style={{ border: '1px solid var(--border)' }}
+                        onClick={() => fileInput.current?.click()} disabled={importMutation.isPending}
+                        title="CSV or JSON with name, roll_number and department columns">
+                        {importMutation.isPending
+                            ? <><Loader size={14} className="spin" /> Importing...</>
+                            : <><Upload size={14} /> Import</>}
+                    </button>
+                    <button className="btn btn-primary" onClick={() => setShowAdd(true)}>
+                        <Plus size={15} /> Add {memberLabel}
+                    </button>
                 </div>
-                <button className="btn btn-primary" onClick={() => setShowAdd(true)}>
-                    <Plus size={15} /> Add {memberLabel}
-                </button>
             </div>
 
             <div className="card" style={{ padding: '11px 16px', marginBottom: 14, display: 'flex', alignItems: 'center', gap: 10 }}>
                 <Search size={15} color="var(--text-muted)" />
                 <input className="input" style={{ border: 'none', background: 'transparent', padding: 0, boxShadow: 'none' }}
-                    placeholder={`Search by name, ${idLabel}, or ${groupLabel}...`}
+                    placeholder={`Search by name or ${idLabel}...`}
                     value={search} onChange={e => setSearch(e.target.value)} />
+                <select className="input" style={{ width: 'auto', minWidth: 160 }}
+                    value={deptFilter} onChange={e => setDeptFilter(e.target.value)}>
+                    <option value="">All {groupLabel.toLowerCase()}s</option>
+                    {departments.map(d => <option key={d.id} value={d.id}>{d.name}</option>)}
+                </select>
             </div>
 
             <div className="card">
                 {loading ? (
                     <div className="loader"><Loader size={18} className="spin" /> Loading {memberLabelPlural.toLowerCase()}...</div>
-                ) : filtered.length === 0 ? (
+                ) : students.length === 0 ? (
                     <div className="empty-state">
                         <Users size={40} />
-                        <p>{search ? `No matching ${memberLabelPlural.toLowerCase()} found.` : `No ${memberLabelPlural.toLowerCase()} yet. Add your first!`}</p>
+                        <p>{query || deptFilter ? `No matching ${memberLabelPlural.toLowerCase()} found.` : `No ${memberLabelPlural.toLowerCase()} yet. Add your first!`}</p>
                     </div>
                 ) : (
                     <div className="table-wrapper">
@@ -121,7 +171,7 @@ export default function Students() {
                                 </tr>
                             </thead>
                             <motion.tbody variants={listVariants} initial="hidden" animate="show">
-                                {filtered.map((s, i) => (
+                                {students.map((s, i) => (
                                     <motion.tr key={s.id} variants={itemVariants}>
                                         <td style={{ color: 'var(--text-muted)', fontSize: '0.8rem' }}>{i + 1}</td>
                                         <td style={{ fontWeight: 600 }}>{s.name}</td>
@@ -147,6 +197,14 @@ export default function Students() {
                                 ))}
                             </motion.tbody>
                         </table>
+                        {hasNextPage && (
+                            <div style={{ display: 'flex', justifyContent: 'center', padding: '14px 0' }}>
+                                <button className="btn btn-ghost" style={{ fontSize: '0.78rem', border: '1px solid var(--border)' }}
+                                    onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+                                    {isFetchingNextPage ? <><Loader size={13} className="spin" /> Loading...</> : 'Load more'}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>